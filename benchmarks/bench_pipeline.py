@@ -0,0 +1,180 @@
+"""Time and peak memory of the feature pipeline on synthetic data, with baselines.
+
+Each stage of build_features runs on tables from benchmarks.synthetic at
+several scales (seasons x teams x games per team), so nothing is downloaded
+or scraped:
+
+    python -m benchmarks.bench_pipeline                    # compare to baselines
+    python -m benchmarks.bench_pipeline --save             # record new baselines
+    python -m benchmarks.bench_pipeline --scales small --tolerance 0.5
+
+Baselines are kept per machine in benchmarks/baselines.json, keyed by
+scale and stage; the file is not committed, timings from another machine
+mean nothing. A stage is flagged when its time or peak memory is more
+than ``tolerance`` above the baseline (and above a small absolute noise
+floor); the exit status is 1 if any stage is flagged. A stage without a
+baseline cannot be compared: it is marked in the report and the exit
+status is 2, so a fresh checkout does not pass silently. Run with --save
+once to record the baselines.
+"""
+import argparse
+import json
+import logging
+import os
+from pathlib import Path
+import sys
+import tempfile
+
+from benchmarks.bench_prepare_data import measure
+from benchmarks.synthetic import tables, write_project
+from src.features.build_features import (
+    calc_advanced_stats, calc_seed_diff, calc_season_statistics, clean_kp_data,
+    main as build_features, prepare_data, win_ratio_14_days,
+)
+from src.features.cache import ArtifactCache
+from src.features.feature_store import TeamFeatureStore
+
+logger = logging.getLogger(__name__)
+
+# (seasons, teams, games per team); "medium" is about the size of the Kaggle data
+SCALES = {
+    "small": (5, 120, 20),
+    "medium": (18, 350, 30),
+    "large": (36, 700, 30),
+}
+BASELINE_PATH = Path(__file__).resolve().parent / "baselines.json"
+TOLERANCE = 0.25
+MIN_SECONDS = 0.01
+MIN_BYTES = 2 ** 20
+
+
+def _end_to_end(root):
+    """build_features.main in a synthetic project, with an empty cache every run."""
+    def run(_):
+        cwd = os.getcwd()
+        os.chdir(root)
+        try:
+            with tempfile.TemporaryDirectory() as cache_dir:
+                build_features(cache=ArtifactCache(cache_dir))
+        finally:
+            os.chdir(cwd)
+    return run
+
+
+def stages(data, root):
+    """(name, func, input) of every benchmarked stage, inputs precomputed."""
+    regular_data = prepare_data(data['MRegularSeasonDetailedResults'])
+    tourney_data = prepare_data(data['MNCAATourneyDetailedResults'])
+    frames = [
+        calc_season_statistics(regular_data),
+        win_ratio_14_days(regular_data),
+        clean_kp_data(data['kenpom'], data['MTeamSpellings'], data['MTeams']),
+        calc_seed_diff(data['MNCAATourneySeeds'].copy()),
+    ]
+    return [
+        ("prepare_data", prepare_data, data['MRegularSeasonDetailedResults']),
+        ("calc_advanced_stats", calc_advanced_stats, data['MRegularSeasonDetailedResults']),
+        ("calc_season_statistics", calc_season_statistics, regular_data),
+        ("win_ratio_14_days", win_ratio_14_days, regular_data),
+        ("clean_kp_data", lambda d: clean_kp_data(*d),
+         (data['kenpom'], data['MTeamSpellings'], data['MTeams'])),
+        ("attach_features", lambda d: TeamFeatureStore.from_frames(frames).attach(d), tourney_data),
+        ("end_to_end", _end_to_end(root), None),
+    ]
+
+
+def run_scale(scale, repeat=3, seed=0):
+    """{stage: {"seconds": best wall time, "peak": traced peak bytes}} at one scale."""
+    n_seasons, n_teams, games_per_team = SCALES[scale]
+    data = tables(n_seasons, n_teams, games_per_team, seed)
+    logger.info(f"{scale}: {len(data['MRegularSeasonDetailedResults'])} regular season games")
+    results = {}
+    with tempfile.TemporaryDirectory() as root:
+        write_project(root, n_seasons, n_teams, games_per_team, seed)
+        for name, func, arg in stages(data, root):
+            seconds, peak = measure(func, arg, repeat=1 if name == "end_to_end" else repeat)
+            results[name] = {"seconds": seconds, "peak": peak}
+    return results
+
+
+def load_baselines(path=BASELINE_PATH):
+    path = Path(path)
+    return json.loads(path.read_text()) if path.exists() else {}
+
+
+def save_baselines(results, path=BASELINE_PATH):
+    """Merges results ({scale: {stage: ...}}) into the baseline file."""
+    baselines = load_baselines(path)
+    for scale, stage_results in results.items():
+        baselines.setdefault(scale, {}).update(stage_results)
+    Path(path).write_text(json.dumps(baselines, indent=2, sort_keys=True) + "\n")
+    return path
+
+
+def regressions(results, baselines, tolerance=TOLERANCE):
+    """(scale, stage, metric, value, baseline) of every measurement over tolerance."""
+    flagged = []
+    for scale, stage_results in results.items():
+        for stage, result in stage_results.items():
+            base = baselines.get(scale, {}).get(stage)
+            if base is None:
+                continue
+            for metric, floor in [("seconds", MIN_SECONDS), ("peak", MIN_BYTES)]:
+                value, ref = result[metric], base[metric]
+                if value > ref * (1 + tolerance) and value - ref > floor:
+                    flagged.append((scale, stage, metric, value, ref))
+    return flagged
+
+
+def missing_baselines(results, baselines):
+    """(scale, stage) of every measurement without a baseline."""
+    return [(scale, stage) for scale, stage_results in results.items()
+            for stage in stage_results if stage not in baselines.get(scale, {})]
+
+
+def report(results, baselines):
+    for scale, stage_results in results.items():
+        print(f"{scale} {SCALES[scale]}")
+        for stage, result in stage_results.items():
+            line = f"{stage:>24}: {result['seconds']:8.3f} s  peak {result['peak'] / 2**20:8.1f} MiB"
+            base = baselines.get(scale, {}).get(stage)
+            if base is not None:
+                line += (f"  ({result['seconds'] / base['seconds']:5.2f}x time,"
+                         f" {result['peak'] / max(base['peak'], 1):5.2f}x memory)")
+            else:
+                line += "  (no baseline)"
+            print(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scales", nargs="+", choices=list(SCALES), default=list(SCALES))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--baselines", default=str(BASELINE_PATH))
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    parser.add_argument("--save", action="store_true", help="record the results as the new baselines")
+    args = parser.parse_args(argv)
+
+    results = {scale: run_scale(scale, args.repeat) for scale in args.scales}
+    baselines = load_baselines(args.baselines)
+    report(results, baselines)
+
+    if args.save:
+        save_baselines(results, args.baselines)
+        print(f"Saved baselines to {args.baselines}")
+        return 0
+    flagged = regressions(results, baselines, args.tolerance)
+    for scale, stage, metric, value, ref in flagged:
+        print(f"REGRESSION {scale}/{stage} {metric}: {value:.4g} vs baseline {ref:.4g}")
+    if flagged:
+        return 1
+    missing = missing_baselines(results, baselines)
+    for scale, stage in missing:
+        print(f"NO BASELINE {scale}/{stage} in {args.baselines}, record one with --save")
+    return 2 if missing else 0
+
+
+if __name__ == "__main__":
+    log_fmt = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    logging.basicConfig(level=logging.WARNING, format=log_fmt)
+    sys.exit(main())
@@ -0,0 +1,61 @@
+"""Time and peak memory of prepare_data vs the previous copy/concat/sort version.
+
+Run from the project root after the Kaggle files are in data/external:
+
+    python -m benchmarks.bench_prepare_data
+"""
+from pathlib import Path
+import time
+import tracemalloc
+
+import pandas as pd
+
+from src.features.build_features import calc_advanced_stats, prepare_data
+
+
+def legacy_prepare_data(df):
+    """prepare_data as it was before the interleaved rewrite."""
+    df = calc_advanced_stats(df)
+    winners = df.copy()
+    losers = df.copy()
+    winners.columns.values[6] = 'location'
+    losers.columns.values[6] = 'location'
+    losers.loc[losers['location'] == 'H', 'location'] = 'A'
+    losers.loc[losers['location'] == 'A', 'location'] = 'H'
+    winners.columns = winners.columns.str.replace("W", "T1_").str.replace("L", "T2_")
+    losers.columns = losers.columns.str.replace("W", "T2_").str.replace("L", "T1_")
+    output = pd.concat([winners, losers]).sort_index().reset_index(drop=True)
+    output.loc[output.location=='N','location'] = '0'
+    output.loc[output.location=='H','location'] = '1'
+    output.loc[output.location=='A','location'] = '-1'
+    output.location = output.location.astype(int)
+    output['T1_PointDiff'] = output['T1_Score'] - output['T2_Score']
+    return output
+
+
+def measure(func, df, repeat=3):
+    """Best wall time and peak traced memory (bytes) of func(df)."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(df)
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    func(df)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return min(times), peak
+
+
+def main(path=None):
+    path = path or Path().resolve() / "data" / "external" / "MRegularSeasonDetailedResults.csv"
+    df = pd.read_csv(path)
+    print(f"{len(df)} games")
+    for name, func in [("legacy", legacy_prepare_data), ("prepare_data", prepare_data)]:
+        seconds, peak = measure(func, df)
+        print(f"{name:>14}: {seconds:7.3f} s  peak {peak / 2**20:8.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+"""Synthetic Kaggle/kenpom tables for offline benchmarks.
+
+Every team-season gets a strength; box scores are drawn around it so that
+the tables have realistic sizes, dtypes and value ranges (possessions,
+shooting splits, FGM3 <= FGM, no ties). Kenpom rows use team names that
+go through the same cleaning rules as the scraped ones (rank suffixes,
+"St." abbreviations).
+
+    from benchmarks.synthetic import write_project
+    write_project("/tmp/ncaa", n_seasons=18, n_teams=350, games_per_team=30)
+"""
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+FIRST_SEASON = 2003
+FIRST_TEAM_ID = 1101
+BOX_COLUMNS = ['FGM', 'FGA', 'FGM3', 'FGA3', 'FTM', 'FTA', 'OR', 'DR',
+               'Ast', 'TO', 'Stl', 'Blk', 'PF']
+REGIONS = "WXYZ"
+
+
+def team_names(n_teams):
+    """Kaggle style team names (letters only); every fourth one is a "St" school."""
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    names = []
+    for k in range(n_teams):
+        word = letters[k % 26] + letters[k // 26 % 26] + letters[k // 676 % 26]
+        names.append(f"Synth {word.title()}" + (" St" if k % 4 == 0 else ""))
+    return names
+
+
+def strengths(n_seasons, n_teams, seed=0):
+    """(n_seasons, n_teams) team strengths, persistent across seasons."""
+    rng = np.random.default_rng(seed)
+    base = rng.normal(size=n_teams)
+    return base + 0.5 * rng.normal(size=(n_seasons, n_teams))
+
+
+def _box_scores(rng, n, strength_diff):
+    """Box score columns of one side of n games."""
+    poss = rng.normal(68, 5, n)
+    fga = np.maximum(rng.normal(poss * 0.85, 4), 30).astype(np.int64)
+    fga3 = rng.binomial(fga, 0.36)
+    fgm3 = rng.binomial(fga3, np.clip(0.34 + 0.02 * strength_diff, 0.2, 0.5))
+    fgm2 = rng.binomial(fga - fga3, np.clip(0.50 + 0.03 * strength_diff, 0.3, 0.7))
+    fta = rng.poisson(20, n)
+    fgm = fgm2 + fgm3
+    return {
+        'FGM': fgm, 'FGA': fga, 'FGM3': fgm3, 'FGA3': fga3,
+        'FTM': rng.binomial(fta, 0.7), 'FTA': fta,
+        'OR': rng.poisson(10, n), 'DR': rng.poisson(24, n),
+        'Ast': rng.binomial(fgm, 0.55), 'TO': rng.poisson(13, n),
+        'Stl': rng.poisson(6, n), 'Blk': rng.poisson(3.5, n), 'PF': rng.poisson(18, n),
+    }
+
+
+def games(rng, season, team_a, team_b, strength, days, neutral=False):
+    """Detailed results rows for games between team offsets a and b."""
+    n = len(team_a)
+    diff = strength[team_a] - strength[team_b]
+    a = _box_scores(rng, n, diff)
+    b = _box_scores(rng, n, -diff)
+    score_a = 2 * a['FGM'] + a['FGM3'] + a['FTM']
+    score_b = 2 * b['FGM'] + b['FGM3'] + b['FTM']
+    # no ties: the home side of a tied game makes one more free throw in OT
+    tied = score_a == score_b
+    a['FTM'] = a['FTM'] + tied
+    a['FTA'] = a['FTA'] + tied
+    score_a = score_a + tied
+
+    a_won = score_a > score_b
+    out = {'Season': np.full(n, season), 'DayNum': days}
+    out['WTeamID'] = FIRST_TEAM_ID + np.where(a_won, team_a, team_b)
+    out['WScore'] = np.where(a_won, score_a, score_b)
+    out['LTeamID'] = FIRST_TEAM_ID + np.where(a_won, team_b, team_a)
+    out['LScore'] = np.where(a_won, score_b, score_a)
+    if neutral:
+        out['WLoc'] = np.full(n, 'N')
+    else:
+        # team a is at home in 90% of the games:
+        home = rng.random(n) < 0.9
+        out['WLoc'] = np.where(~home, 'N', np.where(a_won, 'H', 'A'))
+    out['NumOT'] = tied.astype(np.int64) + (rng.random(n) < 0.03)
+    for col in BOX_COLUMNS:
+        out['W' + col] = np.where(a_won, a[col], b[col])
+    for col in BOX_COLUMNS:
+        out['L' + col] = np.where(a_won, b[col], a[col])
+    return pd.DataFrame(out)
+
+
+def regular_season(n_seasons=18, n_teams=350, games_per_team=30, seed=0, strength=None):
+    """MRegularSeasonDetailedResults-like table."""
+    rng = np.random.default_rng(seed)
+    strength = strengths(n_seasons, n_teams, seed) if strength is None else strength
+    frames = []
+    for s in range(n_seasons):
+        n = n_teams * games_per_team // 2
+        team_a = rng.integers(0, n_teams, n)
+        team_b = (team_a + rng.integers(1, n_teams, n)) % n_teams
+        days = np.sort(rng.integers(0, 133, n))
+        frames.append(games(rng, FIRST_SEASON + s, team_a, team_b, strength[s], days))
+    return pd.concat(frames, ignore_index=True)
+
+
+def tourney_seeds(n_seasons, strength):
+    """MNCAATourneySeeds-like table: the 68 strongest teams, with play-ins
+    at two 16 seeds and two 11 seeds."""
+    rows = []
+    labels = [(seed, "") for seed in range(1, 17) for _ in REGIONS]
+    labels = [(r, seed, sfx) for (seed, sfx), r in zip(labels, REGIONS * 16)]
+    # extra teams for the play-ins:
+    labels += [("W", 16, "b"), ("X", 16, "b"), ("Y", 11, "b"), ("Z", 11, "b")]
+    for s in range(n_seasons):
+        order = np.argsort(-strength[s])[:len(labels)]
+        for (region, seed, suffix), team in zip(labels, order):
+            playin = (region, seed) in {("W", 16), ("X", 16), ("Y", 11), ("Z", 11)}
+            suffix = suffix or ("a" if playin else "")
+            rows.append({'Season': FIRST_SEASON + s, 'Seed': f"{region}{seed:02d}{suffix}",
+                         'TeamID': FIRST_TEAM_ID + int(team)})
+    return pd.DataFrame(rows)
+
+
+def tourney_results(seeds, strength, seed=0):
+    """MNCAATourneyDetailedResults-like table: 67 neutral site games per season."""
+    rng = np.random.default_rng(seed + 1)
+    frames = []
+    for s, season_seeds in seeds.groupby('Season'):
+        teams = season_seeds['TeamID'].to_numpy() - FIRST_TEAM_ID
+        a = rng.integers(0, len(teams), 67)
+        b = (a + rng.integers(1, len(teams), 67)) % len(teams)
+        days = np.sort(rng.integers(134, 155, 67))
+        frames.append(games(rng, s, teams[a], teams[b], strength[s - FIRST_SEASON], days,
+                            neutral=True))
+    return pd.concat(frames, ignore_index=True)
+
+
+def kenpom(n_seasons, strength, seeds, seed=0):
+    """Scraped kenpom.com-like table (kp_data output)."""
+    rng = np.random.default_rng(seed + 2)
+    names = team_names(strength.shape[1])
+    frames = []
+    for s in range(n_seasons):
+        season = FIRST_SEASON + s
+        seed_of = {t - FIRST_TEAM_ID: int(sd[1:3]) for t, sd in
+                   zip(seeds.loc[seeds['Season'] == season, 'TeamID'],
+                       seeds.loc[seeds['Season'] == season, 'Seed'])}
+        st = strength[s]
+        adj_o = 105 + 6 * st + rng.normal(0, 2, len(st))
+        adj_d = 105 - 6 * st + rng.normal(0, 2, len(st))
+        team = [names[k].replace(" St", " St.") + (f" {seed_of[k]}" if k in seed_of else "")
+                for k in range(len(st))]
+        frame = pd.DataFrame({
+            'Team': team, 'Conf': rng.choice(['ACC', 'B10', 'SEC', 'WCC', 'MVC'], len(st)),
+            'W-L': [f"{w}-{30 - w}" for w in rng.integers(5, 30, len(st))],
+            'AdjEM': adj_o - adj_d, 'AdjO': adj_o, 'AdjD': adj_d,
+            'AdjT': rng.normal(68, 3, len(st)), 'Luck': rng.normal(0, 0.04, len(st)),
+            'Strength of Schedule_AdjEM': rng.normal(0, 6, len(st)),
+            'Strength of Schedule_OppO': rng.normal(105, 3, len(st)),
+            'Strength of Schedule_OppD': rng.normal(105, 3, len(st)),
+            'NCSOS_AdjEM': rng.normal(0, 5, len(st)),
+            'Season': season,
+        })
+        frame = frame.sort_values('AdjEM', ascending=False, ignore_index=True)
+        frame.insert(0, 'Rk', np.arange(1, len(frame) + 1))
+        frames.append(frame)
+    return pd.concat(frames, ignore_index=True)
+
+
+def team_tables(n_teams):
+    """(MTeams, MTeamSpellings)-like tables."""
+    names = team_names(n_teams)
+    ids = FIRST_TEAM_ID + np.arange(n_teams)
+    teams = pd.DataFrame({'TeamID': ids, 'TeamName': names})
+    spellings = pd.DataFrame({
+        'TeamNameSpelling': [n.lower() for n in names] + [n.lower().replace(" st", " state")
+                                                          for n in names if n.endswith(" St")],
+        'TeamID': np.concatenate([ids, [i for i, n in zip(ids, names) if n.endswith(" St")]]),
+    })
+    return teams, spellings
+
+
+def tables(n_seasons=18, n_teams=350, games_per_team=30, seed=0):
+    """All synthetic input tables, keyed by their Kaggle file name."""
+    strength = strengths(n_seasons, n_teams, seed)
+    seeds = tourney_seeds(n_seasons, strength)
+    teams, spellings = team_tables(n_teams)
+    return {
+        'MRegularSeasonDetailedResults': regular_season(n_seasons, n_teams, games_per_team, seed, strength),
+        'MNCAATourneyDetailedResults': tourney_results(seeds, strength, seed),
+        'MNCAATourneySeeds': seeds,
+        'MTeams': teams,
+        'MTeamSpellings': spellings,
+        'kenpom': kenpom(n_seasons, strength, seeds, seed),
+    }
+
+
+def write_project(root, n_seasons=18, n_teams=350, games_per_team=30, seed=0):
+    """Writes the tables as a project data folder (data/external, data/raw)."""
+    root = Path(root)
+    external = root / "data" / "external"
+    raw = root / "data" / "raw"
+    for d in (external, raw, root / "data" / "processed", root / "data" / "interim"):
+        d.mkdir(parents=True, exist_ok=True)
+    for name, df in tables(n_seasons, n_teams, games_per_team, seed).items():
+        if name == 'kenpom':
+            df.to_csv(raw / "kenpom.csv", index=False)
+        elif name == 'MTeamSpellings':
+            df.to_csv(external / f"{name}.csv", index=False, encoding="ISO-8859-1")
+        else:
+            df.to_csv(external / f"{name}.csv", index=False)
+    return root
@@ -1,15 +1,21 @@
+from contextlib import nullcontext
 import logging
+import os
+
+from src import instrument, pipeline
+
 # must run makefile.bat to download kaggle files first!
-# Then run this to build to features set
+# Then run this to scrape kenpom and build the features set. Only the stages
+# whose code or inputs changed since the last run are rerun (see src/pipeline.py):
+#
+#     python makefile.py [--jobs N] [--force STAGE ...] [--with elo]
+#
+# Set NCAA_TRACE=<path.json> to record per-stage timings (see src/instrument.py).
 
 if __name__ == "__main__":
     log_fmt = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
     logging.basicConfig(level=logging.INFO, format=log_fmt)
 
-    # pulls kenpom data and saves in external:
-    from src.data import make_dataset
-    make_dataset.main()
-
-    # uses kaggle data in "raw" and kenpom in "external", cleans and builds features.
-    from src.features import build_features
-    build_features.main()
\ No newline at end of file
+    trace_path = os.environ.get("NCAA_TRACE")
+    with instrument.tracing(trace_path) if trace_path else nullcontext():
+        pipeline.main()
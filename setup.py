@@ -2,7 +2,7 @@ from setuptools import find_packages, setup
 
 setup(
     name='src',
-    packages=find_packages(),
+    packages=find_packages(exclude=['benchmarks', 'benchmarks.*']),
     version='0.1.0',
     description='Kaggle March Madness Competition Entry',
     author='Matan Freedman',
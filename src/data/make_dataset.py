@@ -1,30 +1,110 @@
 # -*- coding: utf-8 -*-
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+import hashlib
+import json
 from pathlib import Path
 import os
+import threading
 
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
 import pandas as pd
 import requests
 
-def scrape_kp_season(season):
-    """Scrapes kenpom data for a season from kenpom.com
-    
+from src import instrument
+from src.data import storage
+from src.data.team_names import TeamNameIndex
+
+KP_URL = "http://www.kenpom.com/index.php?y={season}"
+KP_SEASONS = range(2003, 2022)
+
+_thread_local = threading.local()
+
+
+def _session():
+    """One requests session per worker thread."""
+    if not hasattr(_thread_local, "session"):
+        _thread_local.session = requests.Session()
+    return _thread_local.session
+
+
+def _season_finished(season):
+    """A season's ratings stop changing once the tournament is over."""
+    return date.today() > date(int(season), 4, 30)
+
+
+def fetch_kp_season(season, cache_dir=None, offline=False):
+    """Fetches the raw kenpom.com html for a season, using an on-disk cache.
+
+    The cache holds ``<season>.html`` and ``<season>.json`` (ETag and sha256
+    of the body). Finished seasons are served from the cache without touching
+    the network, the current season is revalidated with ``If-None-Match``.
+
     Parameters
     ----------
     season : int/str
+    cache_dir : Path, optional
+        where responses are cached. No caching if None.
+    offline : bool
+        only read from the cache, raises FileNotFoundError on a miss.
     """
     logger = logging.getLogger(__name__)
+
+    html_path = meta_path = None
+    meta = {}
+    if cache_dir is not None:
+        cache_dir = Path(cache_dir)
+        html_path = cache_dir / f"{season}.html"
+        meta_path = cache_dir / f"{season}.json"
+        if html_path.exists() and meta_path.exists():
+            meta = json.loads(meta_path.read_text())
+            if offline or _season_finished(season):
+                logger.debug(f"Season {season} served from cache")
+                return html_path.read_bytes()
+
+    if offline:
+        raise FileNotFoundError(f"No cached kenpom page for season {season}")
+
+    headers = {}
+    if meta.get("etag"):
+        headers["If-None-Match"] = meta["etag"]
+
     logger.info(f"Scraping season: {season}")
+    response = _session().get(KP_URL.format(season=season), headers=headers)
+    if response.status_code == 304:
+        logger.debug(f"Season {season} not modified")
+        return html_path.read_bytes()
+    response.raise_for_status()
+
+    content = response.content
+    if html_path is not None:
+        digest = hashlib.sha256(content).hexdigest()
+        if digest != meta.get("sha256"):
+            cache_dir.mkdir(parents=True, exist_ok=True)
+            html_path.write_bytes(content)
+        meta = {"etag": response.headers.get("ETag"), "sha256": digest}
+        meta_path.write_text(json.dumps(meta))
+    return content
+
+
+def parse_kp_table(html):
+    """Parses the kenpom ratings table into a DataFrame.
+
+    Cells are collected column by column in a single pass over the rows and
+    the frame is built once at the end.
+
+    Parameters
+    ----------
+    html : str/bytes
+        page source of kenpom.com/index.php
+    """
+    soup = BeautifulSoup(html, features="html.parser",
+                         parse_only=SoupStrainer("table", attrs={'id': 'ratings-table'}))
 
-    # request data:
-    url = f"http://www.kenpom.com/index.php?y={season}"
-    html = requests.get(url)
-    soup = BeautifulSoup(html.content, features="html.parser")
-    
     # find table and parse:
     table = soup.find("table", attrs= {'id':'ratings-table'})
-    
+
     # 2 rows of headers that repeat throughout table:
     headings1 = [th.get_text() for th in table.find("tr", attrs={"class":"thead1"}).find_all("th")]
     headings2 = [th.get_text() for th in table.find("tr", attrs={"class":"thead2"}).find_all("th")]
@@ -32,40 +112,103 @@ def scrape_kp_season(season):
     headings[-4:-1] = [headings1[-2] + "_" + h for h in headings[-4:-1]]
     headings[-1] = headings1[-1] + "_" + headings[-1]
 
-    # initialize dataframe, loop and append
-    kp_data = pd.DataFrame(columns=headings)
-    tables = table.find_all("tbody")
-    for table in tables:
-        for row in table.find_all("tr"):
-            row_data = [td.get_text() for td in  row.find_all("td") if td not in row.find_all(class_="td-right")]
-            dataset = list(zip(headings, row_data))
-            kp_data = kp_data.append(dict(dataset), ignore_index=True)
-    
+    # one list per column, rank cells ("td-right") are skipped:
+    n_cols = len(headings)
+    columns = [[] for _ in headings]
+    for tbody in table.find_all("tbody"):
+        for row in tbody.find_all("tr"):
+            cells = [td.get_text() for td in row.find_all("td")
+                     if "td-right" not in (td.get("class") or ())]
+            # repeated header rows have no cells:
+            if not cells:
+                continue
+            cells = cells[:n_cols] + [None] * (n_cols - len(cells))
+            for column, cell in zip(columns, cells):
+                column.append(cell)
+
+    kp_data = pd.DataFrame(dict(zip(headings, columns)), columns=headings)
     # still caught some empty rows:
-    kp_data = kp_data.dropna(how='all').reset_index(drop=True)
+    return kp_data.dropna(how='all').reset_index(drop=True)
+
+
+def scrape_kp_season(season, cache_dir=None, offline=False):
+    """Scrapes kenpom data for a season from kenpom.com
     
+    Parameters
+    ----------
+    season : int/str
+    cache_dir : Path, optional
+        response cache, see fetch_kp_season
+    offline : bool
+        only use cached responses
+    """
+    with instrument.stage("fetch_kp_season", season=season) as rec:
+        html = fetch_kp_season(season, cache_dir=cache_dir, offline=offline)
+        rec.set(bytes_read=len(html))
+    with instrument.stage("parse_kp_table", season=season) as rec:
+        kp_data = parse_kp_table(html)
+        rec.set(rows_out=len(kp_data))
     kp_data['Season'] = season
     return kp_data
 
 
-def kp_data():
+def kp_data(seasons=KP_SEASONS, max_workers=8, cache_dir=None, offline=False):
     """Scrapes KP data from 2003-2021
+
+    Seasons are fetched concurrently on a bounded thread pool and returned in
+    season order.
+
+    Parameters
+    ----------
+    seasons : iterable of int
+    max_workers : int
+        number of concurrent requests
+    cache_dir : Path, optional
+        response cache, see fetch_kp_season
+    offline : bool
+        only use cached responses
     """
     logger = logging.getLogger(__name__)
     logger.info("Scraping Pomeroy Basketball Ratings.")
 
-    # initialize kp data and loop thru seasons.
-    kenpom_df = pd.DataFrame()
-    for season in range(2003, 2022):
-        logger.debug(f"Season: {season}")
-        df = scrape_kp_season(season)
-        kenpom_df = kenpom_df.append(df)
+    seasons = list(seasons)
+    parent = instrument.current()
 
-    return kenpom_df
-    
+    def scrape(season):
+        with instrument.stage("scrape_kp_season", parent=parent, season=season):
+            return scrape_kp_season(season, cache_dir=cache_dir, offline=offline)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        frames = list(pool.map(scrape, seasons))
+
+    return pd.concat(frames)
+
+
+def kenpom_names_report(kenpom_df, teams, spellings, index_path=None):
+    """Scraped names that did not resolve exactly to a TeamID (see TeamNameIndex.report).
+
+    The index is loaded from and saved to index_path if given. Logs a warning
+    when names are unresolved.
+    """
+    logger = logging.getLogger(__name__)
+    if index_path is None:
+        index = TeamNameIndex.from_tables(teams, spellings)
+    else:
+        index = TeamNameIndex.load_or_build(teams, spellings, index_path)
+    index.resolve(kenpom_df["Team"])
+    if index_path is not None:
+        index.save(index_path)
+    if len(index.unresolved()):
+        logger.warning(f"{len(index.unresolved())} kenpom names unresolved: {index.unresolved()}")
+    return index.report()
 
 
 def main():
+    with instrument.stage("make_dataset"):
+        _make_dataset()
+
+
+def _make_dataset():
     logger = logging.getLogger(__name__)
 
     proj_path = Path().resolve()
@@ -76,11 +219,32 @@ def main():
     if not os.path.exists(proj_path / "data" / "processed"):
         os.makedirs(proj_path / "data" / "processed")
 
-    kenpom_df = kp_data()
+    with instrument.stage("kp_data") as rec:
+        kenpom_df = kp_data(cache_dir=raw_data_path / "kenpom_cache")
+        rec.set(rows_out=len(kenpom_df))
     kp_path = raw_data_path / "kenpom.csv"
-    kenpom_df.to_csv(kp_path, index=False)
+    with instrument.stage("write_kenpom_csv") as rec:
+        kenpom_df.to_csv(kp_path, index=False)
+        rec.set(rows_in=len(kenpom_df), bytes_written=instrument.file_size(kp_path))
     logger.info("KP data done.")
 
+    # check the scraped names against the Kaggle team tables:
+    external = proj_path / "data" / "external"
+    interim = proj_path / "data" / "interim"
+    with instrument.stage("resolve_team_names") as rec:
+        report = kenpom_names_report(
+            kenpom_df,
+            storage.read_table(external / "MTeams.csv"),
+            storage.read_table(external / "MTeamSpellings.csv", encoding="ISO-8859-1"),
+            index_path=interim / "team_names.json")
+        report.to_csv(interim / "kenpom_names_report.csv", index=False)
+        rec.set(rows_in=len(kenpom_df), rows_out=len(report))
+
+    # binary copies of the kaggle and kenpom csv files:
+    with instrument.stage("convert_raw") as rec:
+        paths = storage.convert_raw(proj_path / "data")
+        rec.set(files=len(paths), bytes_written=sum(instrument.file_size(p) for p in paths))
+
 
 if __name__ == '__main__':
     log_fmt = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
@@ -0,0 +1,133 @@
+"""Binary columnar storage for the raw and processed tables.
+
+CSV inputs are converted once to uncompressed Feather files with compact
+dtypes (int16 seasons, days, team IDs and box score counts, float32 stats),
+which are read with column projection: only the requested columns are
+touched in the (memory-mapped) file. Converting them to pandas still copies
+those columns into the frame, so a load costs the size of the selected
+columns at their stored dtypes; the saving comes from the compact dtypes and
+the projection, not from sharing memory with the file.
+
+Processed tables (tourney_data, which the models train on) keep float64
+floats; only their integer columns are compacted.
+"""
+import logging
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from pyarrow import feather
+
+logger = logging.getLogger(__name__)
+
+INT16 = np.iinfo(np.int16)
+
+
+def compact_dtypes(df, float32=True):
+    """Downcasts a frame to int16 integers and (unless float32=False) float32 floats.
+
+    Seasons, days, team IDs and box score counts all fit in int16. Nothing
+    goes below int16 so that expressions like ``100 * Ast`` cannot overflow.
+    """
+    out = {}
+    for col in df.columns:
+        s = df[col]
+        if pd.api.types.is_integer_dtype(s) and not pd.api.types.is_bool_dtype(s):
+            fits = len(s) == 0 or (s.min() >= INT16.min and s.max() <= INT16.max)
+            out[col] = s.astype(np.int16) if fits else s
+        elif float32 and pd.api.types.is_float_dtype(s):
+            out[col] = s.astype(np.float32)
+        else:
+            out[col] = s
+    return pd.DataFrame(out, index=df.index)
+
+
+def feather_path(csv_path):
+    """Where the binary copy of a csv lives: data/<folder>/x.csv -> data/interim/x.feather"""
+    csv_path = Path(csv_path)
+    return csv_path.parents[1] / "interim" / (csv_path.stem + ".feather")
+
+
+def write_table(df, path, compact=True, float32=True):
+    """Writes an uncompressed (memory-mappable) Feather file with compact dtypes.
+
+    float32=False keeps float64 floats and only compacts the integers.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if compact:
+        df = compact_dtypes(df, float32)
+    df = df.reset_index(drop=True)
+    feather.write_feather(df, path, compression="uncompressed")
+    return path
+
+
+def convert_csv(csv_path, **read_kwargs):
+    """Converts a csv to Feather next to data/interim unless it is up to date."""
+    csv_path = Path(csv_path)
+    path = feather_path(csv_path)
+    if path.exists() and path.stat().st_mtime >= csv_path.stat().st_mtime:
+        return path
+    logger.info(f"Converting {csv_path.name} to feather")
+    return write_table(pd.read_csv(csv_path, **read_kwargs), path)
+
+
+def convert_raw(data_dir):
+    """Converts all Kaggle (external) and scraped (raw) csv files once.
+
+    Parameters
+    ----------
+    data_dir : Path to the data folder
+    """
+    paths = []
+    for csv_path in sorted((Path(data_dir) / "external").glob("*.csv")) + \
+            sorted((Path(data_dir) / "raw").glob("*.csv")):
+        # the Kaggle spellings file is not utf-8:
+        encoding = "ISO-8859-1" if "Spellings" in csv_path.name else None
+        paths.append(convert_csv(csv_path, encoding=encoding))
+    return paths
+
+
+def read_feather(path, columns=None, memory_map=True):
+    """Reads a Feather file limited to `columns`.
+
+    The file is memory-mapped so that only the selected columns are read,
+    but the returned frame holds its own copy of them.
+    """
+    table = feather.read_table(path, columns=columns, memory_map=memory_map)
+    return table.to_pandas()
+
+
+def read_table(csv_path, columns=None, **read_kwargs):
+    """Reads a csv input through its binary copy, converting it on first use.
+
+    Parameters
+    ----------
+    csv_path : Path of the original csv
+    columns : list of str, optional
+        column projection, only these columns are read
+    read_kwargs : passed to pd.read_csv for the conversion
+    """
+    return read_feather(convert_csv(csv_path, **read_kwargs), columns=columns)
+
+
+def write_processed(df, path):
+    """Saves a processed table as `<path>.feather`.
+
+    Integers are compacted, floats stay float64 so that the models train on
+    the full precision features.
+    """
+    return write_table(df, Path(path).with_suffix(".feather"), float32=False)
+
+
+def read_processed(path, columns=None):
+    """Loads a processed table (e.g. data/processed/tourney_data).
+
+    Parameters
+    ----------
+    path : Path with or without the .feather suffix
+    columns : list of str, optional
+        column projection, e.g. the features of one model
+    """
+    return read_feather(Path(path).with_suffix(".feather"), columns=columns)
+
@@ -0,0 +1,165 @@
+"""Resolution of scraped team names (kenpom.com) to Kaggle TeamIDs.
+
+TeamNameIndex is built once from MTeams.csv and MTeamSpellings.csv. It maps
+normalized spellings to TeamIDs in a dict. Scraped names are normalized
+with the precompiled KP_RULES. Names that still do not match fall back to
+a close spelling (difflib). Every raw name seen so far is remembered with
+its TeamID, so a table of thousands of rows only touches each distinct
+name once. The index, including those resolutions, can be saved as JSON
+and is rebuilt when the team tables or the rules change.
+"""
+import difflib
+import hashlib
+import json
+import logging
+import re
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# applied in order, like Series.replace(regex=...) in the original
+# clean_kp_data: a rule only applies to names its pattern matched before
+# any rule ran.
+KP_RULES = [
+    (r"\s?[0-9]", ""),
+    (r"(\s{1}st\.?$)", " state"),
+    (r"-", " "),
+    (r"\(", ""),
+    (r"\)", ""),
+    (r"\**", ""),
+    (r"ut rio grande valley", "texas rio grande valley"),
+    (r"texas a&m corpus chris", "a&m corpus chris"),
+    (r"southwest missouri state", "sw missouri state"),
+    (r"texas a&m corpus christi", "a&m corpus christi"),
+    (r"cal st. bakersfield", "cal state bakersfield"),
+    (r"st. francis pa", "st francis pa"),
+    (r"troy state", "troy"),
+]
+_COMPILED = [(re.compile(pattern), repl) for pattern, repl in KP_RULES]
+
+FUZZY_CUTOFF = 0.9
+
+
+def normalize(name):
+    """Lower-cased name with KP_RULES applied."""
+    name = name.lower()
+    matched = [rx.search(name) is not None for rx, _ in _COMPILED]
+    for (rx, repl), hit in zip(_COMPILED, matched):
+        if hit:
+            name = rx.sub(repl, name)
+    return name
+
+
+def _fingerprint(teams, spellings):
+    h = hashlib.sha256()
+    h.update(repr(KP_RULES).encode())
+    for frame in (teams[['TeamName', 'TeamID']], spellings[['TeamNameSpelling', 'TeamID']]):
+        h.update(frame.to_csv(index=False).encode())
+    return h.hexdigest()
+
+
+class TeamNameIndex:
+    """Normalized spelling -> TeamID, plus the resolution of every raw name seen.
+
+    Parameters
+    ----------
+    names : dict of normalized spelling -> TeamID
+    fingerprint : hash of the team tables and rules the index was built from
+    resolved : dict of raw name -> [TeamID or None, "exact" | "fuzzy" | "missing"]
+    """
+
+    def __init__(self, names, fingerprint=None, resolved=None):
+        self.names = names
+        self.fingerprint = fingerprint
+        self.resolved = {} if resolved is None else resolved
+        self._keys = None
+
+    @classmethod
+    def from_tables(cls, teams, spellings):
+        """Builds the index from MTeams and MTeamSpellings.
+
+        Team names and spellings are lower-cased with "-" as a space; the
+        first TeamID of a spelling wins.
+        """
+        all_names = pd.concat([
+            teams[['TeamName', 'TeamID']],
+            spellings[['TeamNameSpelling', 'TeamID']].rename(columns={'TeamNameSpelling': 'TeamName'}),
+        ])
+        keys = all_names['TeamName'].str.lower().str.replace("-", " ", regex=False)
+        names = {}
+        for key, team_id in zip(keys, all_names['TeamID']):
+            names.setdefault(key, int(team_id))
+        return cls(names, _fingerprint(teams, spellings))
+
+    @classmethod
+    def load(cls, path):
+        data = json.loads(Path(path).read_text())
+        return cls(data["names"], data["fingerprint"], data["resolved"])
+
+    def save(self, path):
+        Path(path).write_text(json.dumps({"fingerprint": self.fingerprint,
+                                          "names": self.names,
+                                          "resolved": self.resolved}))
+        return path
+
+    @classmethod
+    def load_or_build(cls, teams, spellings, path):
+        """The index saved at path, rebuilt (and saved) if the tables or rules changed."""
+        path = Path(path)
+        fingerprint = _fingerprint(teams, spellings)
+        if path.exists():
+            index = cls.load(path)
+            if index.fingerprint == fingerprint:
+                return index
+            logger.info("Team tables changed, rebuilding the name index")
+        index = cls.from_tables(teams, spellings)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        index.save(path)
+        return index
+
+    def _resolve_one(self, raw):
+        key = normalize(raw)
+        if key in self.names:
+            return [self.names[key], "exact"]
+        if self._keys is None:
+            self._keys = list(self.names)
+        close = difflib.get_close_matches(key, self._keys, n=1, cutoff=FUZZY_CUTOFF)
+        if close:
+            logger.info(f"Resolved '{raw}' to '{close[0]}' by fuzzy match")
+            return [self.names[close[0]], "fuzzy"]
+        return [None, "missing"]
+
+    def resolve(self, raw_names):
+        """TeamIDs of raw names, as a float array with NaN for unresolved ones.
+
+        Only names not seen before are normalized and looked up.
+        """
+        codes, uniques = pd.factorize(pd.Series(raw_names), sort=False)
+        ids = np.empty(len(uniques))
+        for k, raw in enumerate(uniques):
+            entry = self.resolved.get(raw)
+            if entry is None:
+                entry = self.resolved[raw] = self._resolve_one(raw)
+            ids[k] = np.nan if entry[0] is None else entry[0]
+        out = np.full(len(codes), np.nan)
+        found = codes >= 0
+        out[found] = ids[codes[found]]
+        return out
+
+    def report(self):
+        """Every raw name resolved so far that did not match exactly.
+
+        Returns
+        -------
+        DataFrame with Name, Normalized, TeamID and Match ("fuzzy" or "missing")
+        """
+        rows = [(raw, normalize(raw), team_id, how)
+                for raw, (team_id, how) in self.resolved.items() if how != "exact"]
+        return pd.DataFrame(rows, columns=["Name", "Normalized", "TeamID", "Match"])
+
+    def unresolved(self):
+        """Raw names that could not be resolved."""
+        return [raw for raw, (_, how) in self.resolved.items() if how == "missing"]
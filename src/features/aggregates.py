@@ -0,0 +1,146 @@
+"""Per-team segment reductions over game rows.
+
+Rows are sorted once by (Season, TeamID, DayNum) so that every team-season
+is a contiguous segment, and each aggregate is a single ``reduceat`` style
+reduction over those segments instead of one groupby per function.
+
+Supported aggregate names: ``mean``, ``std``, ``median``, ``min``, ``max``,
+``last<N>`` (mean of the last N games) and ``ewm<span>`` (exponentially
+weighted mean with pandas' ``span`` and ``adjust=True`` weights, as of the
+last game). NaNs are skipped like in pandas.
+"""
+import re
+
+import numpy as np
+
+
+def team_segments(seasons, team_ids, days):
+    """Sorts rows by (Season, TeamID, DayNum) and finds the team-season segments.
+
+    Returns
+    -------
+    order : row order that sorts the input
+    starts : first sorted row of each segment
+    counts : rows per segment
+    """
+    order = np.lexsort((days, team_ids, seasons))
+    s = seasons[order]
+    t = team_ids[order]
+    new_segment = np.empty(len(order), dtype=bool)
+    new_segment[:1] = True
+    new_segment[1:] = (s[1:] != s[:-1]) | (t[1:] != t[:-1])
+    starts = np.flatnonzero(new_segment)
+    counts = np.diff(np.append(starts, len(order)))
+    return order, starts, counts
+
+
+def sorted_columns(frame, columns, order):
+    """Stacks frame columns in sorted row order into a column-major float block."""
+    values = np.empty((len(order), len(columns)), order="F")
+    for j, col in enumerate(columns):
+        values[:, j] = frame[col].to_numpy()[order]
+    return values
+
+
+def _sum(values, starts):
+    return np.add.reduceat(values, starts, axis=0)
+
+
+def _mean(values, valid, starts):
+    if valid is None:
+        counts = np.diff(np.append(starts, len(values)))
+        return _sum(values, starts) / counts[:, None]
+    return _sum(np.where(valid, values, 0.0), starts) / _sum(valid, starts)
+
+
+def _std(values, valid, starts, counts):
+    mean = _mean(values, valid, starts)
+    dev = values - np.repeat(mean, counts, axis=0)
+    if valid is None:
+        n = counts[:, None]
+    else:
+        dev = np.where(valid, dev, 0.0)
+        n = _sum(valid, starts)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.sqrt(_sum(dev * dev, starts) / (n - 1))
+
+
+def _median(values, starts, counts):
+    # segments padded with NaN to the longest one, sorted row-wise (NaN last):
+    width = counts.max()
+    offsets = np.arange(width)
+    inside = offsets[None, :] < counts[:, None]
+    idx = np.where(inside, starts[:, None] + offsets[None, :], 0)
+    rows = np.arange(len(starts))
+    out = np.empty((len(starts), values.shape[1]))
+    for j in range(values.shape[1]):
+        padded = np.where(inside, values[idx, j], np.nan)
+        padded.sort(axis=1)
+        n = (~np.isnan(padded)).sum(axis=1)
+        lo = np.maximum((n - 1) // 2, 0)
+        hi = np.maximum(n // 2, 0)
+        out[:, j] = np.where(n > 0, (padded[rows, lo] + padded[rows, hi]) / 2, np.nan)
+    return out
+
+
+def _weighted_mean(values, valid, starts, weights):
+    weights = weights[:, None]
+    if valid is None:
+        return _sum(values * weights, starts) / _sum(weights, starts)
+    weights = weights * valid
+    return _sum(np.where(valid, values, 0.0) * weights, starts) / _sum(weights, starts)
+
+
+def _age(starts, counts):
+    """Games played after each row within its segment (0 for the last game)."""
+    end = np.repeat(starts + counts, counts)
+    return end - 1 - np.arange(end.size)
+
+
+def _last_n(values, valid, starts, counts, n):
+    weights = (_age(starts, counts) < n).astype(np.float64)
+    return _weighted_mean(values, valid, starts, weights)
+
+
+def _ewm(values, valid, starts, counts, span):
+    alpha = 2.0 / (span + 1.0)
+    weights = (1.0 - alpha) ** _age(starts, counts)
+    return _weighted_mean(values, valid, starts, weights)
+
+
+def segment_aggregate(values, starts, counts, func):
+    """Reduces sorted rows per segment.
+
+    Parameters
+    ----------
+    values : 2-D float array, rows sorted by team_segments (see sorted_columns)
+    starts, counts : segments from team_segments
+    func : aggregate name, see module docstring
+    """
+    nan_cols = np.isnan(values).any(axis=0)
+    if nan_cols.any() and not nan_cols.all():
+        # only mask the few columns that have NaNs:
+        out = np.empty((len(starts), values.shape[1]))
+        out[:, ~nan_cols] = segment_aggregate(values[:, ~nan_cols], starts, counts, func)
+        out[:, nan_cols] = segment_aggregate(values[:, nan_cols], starts, counts, func)
+        return out
+
+    valid = ~np.isnan(values) if nan_cols.any() else None
+    with np.errstate(invalid="ignore", divide="ignore"):
+        if func == "mean":
+            return _mean(values, valid, starts)
+        if func == "std":
+            return _std(values, valid, starts, counts)
+        if func == "median":
+            return _median(values, starts, counts)
+        if func == "min":
+            return np.fmin.reduceat(values, starts, axis=0)
+        if func == "max":
+            return np.fmax.reduceat(values, starts, axis=0)
+        match = re.fullmatch(r"last(\d+)", func)
+        if match:
+            return _last_n(values, valid, starts, counts, int(match.group(1)))
+        match = re.fullmatch(r"ewm(\d+(?:\.\d+)?)", func)
+        if match:
+            return _ewm(values, valid, starts, counts, float(match.group(1)))
+    raise ValueError(f"Unknown aggregate: {func}")
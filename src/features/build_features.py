@@ -5,146 +5,224 @@ import numpy as np
 
 import logging
 
+from src import instrument
+from src.data.storage import read_table, write_processed
+from src.data.team_names import TeamNameIndex
+from src.features.aggregates import segment_aggregate, sorted_columns, team_segments
+from src.features.cache import ArtifactCache
+from src.features.feature_store import TeamFeatureStore
+from src.features.ratings import efficiency_ratings
+from src.features.rolling import RollingWindows
+
 logger = logging.getLogger(__name__)
 logger.info("Building features")
 
 def prepare_data(df):
     """Prepares the regular and tournament datasets.
+
+    Every game becomes two rows, the winner's view (T1 = winner) followed by
+    the loser's view (T1 = loser). Each output column is filled straight from
+    the source arrays by interleaving the W and L columns, so the game table
+    is never copied, concatenated or sorted.
     
     Parameter
     ---------
     df : pandas DataFrame using the tournament/regular season CSV files
     """
-    # calc advanced stats:
-    df = calc_advanced_stats(df)
-
-    # copies:
-    winners = df.copy()
-    losers = df.copy()
-
-    # reset WLoc column:
-    winners.columns.values[6] = 'location'
-    losers.columns.values[6] = 'location'
+    # calc advanced stats (new columns only, df itself is not copied):
+    stats = advanced_stats(df)
+    source = {c: df[c].to_numpy() for c in df.columns}
+    source.update({c: stats[c].to_numpy() for c in stats.columns})
+    n = len(df)
+
+    def interleave(winner_view, loser_view):
+        out = np.empty(2 * n, dtype=np.result_type(winner_view, loser_view))
+        out[0::2] = winner_view
+        out[1::2] = loser_view
+        return out
+
+    output = {}
+    for col, values in source.items():
+        if col == 'WLoc':
+            winner_loc = np.where(values == 'H', 1, np.where(values == 'A', -1, 0))
+            # the loser's view has always been coded 1 for any non-neutral game:
+            loser_loc = np.where(values == 'N', 0, 1)
+            output['location'] = interleave(winner_loc, loser_loc)
+        elif col[0] == 'W':
+            output["T1_" + col[1:]] = interleave(values, source['L' + col[1:]])
+        elif col[0] == 'L':
+            output["T2_" + col[1:]] = interleave(values, source['W' + col[1:]])
+        else:
+            output[col] = interleave(values, values)
+
+    output = pd.DataFrame(output)
 
-    # switch H/A in losers df:
-    losers.loc[losers['location'] == 'H', 'location'] = 'A'
-    losers.loc[losers['location'] == 'A', 'location'] = 'H'
-
-    # replace W and L with appropriate prefix:
-    winners.columns = winners.columns.str.replace("W", "T1_").str.replace("L", "T2_")
-    losers.columns = losers.columns.str.replace("W", "T2_").str.replace("L", "T1_")
-
-    # combine:
-    output = pd.concat([winners, losers]).sort_index().reset_index(drop=True)
-    
-    # change location preprocessing:
-    output.loc[output.location=='N','location'] = '0'
-    output.loc[output.location=='H','location'] = '1'
-    output.loc[output.location=='A','location'] = '-1'
-    output.location = output.location.astype(int)
-    
     # calc point diff:
     output['T1_PointDiff'] = output['T1_Score'] - output['T2_Score']
     
     return output
 
 def calc_advanced_stats(data):
-    df = data.copy()
-    logger.info("Calculating advanced stats")
+    """Returns a copy of data with the advanced stats columns added."""
+    return pd.concat([data, advanced_stats(data)], axis=1)
+
+# Advanced stats registry: (name, expression, output).
+# Expressions take the team (t) and opponent (o) inputs; any raw box score
+# column (FGM, OR, ...) or earlier entry is available as an attribute and is
+# computed once for W and L together. output is "team" for a W/L column pair,
+# "game" for a single game-level column and None for shared subexpressions.
+ADVANCED_STATS = [
     # Points Winning/Losing Team
-    logger.debug("W/LPts")
-    df['WPts'] = 2*df['WFGM'] + df['WFGM3'] + df['WFTM']
-    df['LPts'] = 2 * df['LFGM'] + df['LFGM3'] + df['LFTM']
-
-    #Calculate Winning/losing Team Possesion Feature
-    logger.debug("Pos")
-    wPos = 0.96*(df['WFGA'] + df['WTO'] + 0.44*df['WFTA'] - df['WOR'])
-    lPos = 0.96*(df.LFGA + df.LTO + 0.44*df.LFTA - df.LOR)
-    #two teams use almost the same number of possessions in a game
-    #(plus/minus one or two - depending on how quarters end)
-    #so let's just take the average
-    df['Pos'] = (wPos+lPos)/2
-
-    #Offensive efficiency (OffRtg) = 100 x (Points / Possessions)
-    logger.debug("W/L Offensive ratings")
-    df['WOffRtg'] = 100 * (df.WPts / df.Pos)
-    df['LOffRtg'] = 100 * (df.LPts / df.Pos)
-    #Defensive efficiency (DefRtg) = 100 x (Opponent points / Opponent possessions)
-    logger.debug("Defensive ratings")
-    df['WDefRtg'] = df.LOffRtg
-    df['LDefRtg'] = df.WOffRtg
-    #Net Rating = Off.Rtg - Def.Rtg
-    df['WNetRtg'] = df.WOffRtg - df.WDefRtg
-    df['LNetRtg'] = df.LOffRtg - df.LDefRtg
-                         
-    #Assist Ratio : Percentage of team possessions that end in assists
-    df['WAstR'] =  100 * df.WAst / (df.WFGA + 0.44*df.WFTA + df.WAst + df.WTO)
-    df['LAstR'] = 100 * df.LAst / (df.LFGA + 0.44*df.LFTA + df.LAst + df.LTO)
-    #Turnover Ratio: Number of turnovers of a team per 100 possessions used.
-    #(TO * 100) / (FGA + (FTA * 0.44) + AST + TO)
-    df['WTOR'] = 100 * df.WTO / (df.WFGA + 0.44*df.WFTA + df.WAst + df.WTO)
-    df['LTOR'] = 100 * df.LTO / (df.LFGA + 0.44*df.LFTA + df.LAst + df.LTO)
-                        
-    #The Shooting Percentage : Measure of Shooting Efficiency (FGA/FGA3, FTA)
-    df['WTSP'] = 100 * df.WPts / (2 * (df.WFGA + 0.44 * df.WFTA))
-    df['LTSP'] = 100 * df.LPts / (2 * (df.LFGA + 0.44 * df.LFTA))
-    #eFG% : Effective Field Goal Percentage adjusting for the fact that 3pt shots are more valuable 
-    df['WeFGP'] = (df.WFGM + 0.5 * df.WFGM3) / df.WFGA     
-    df['LeFGP'] = (df.LFGM + 0.5 * df.LFGM3) / df.LFGA  
-    #FTA Rate : How good a team is at drawing fouls.
-    df['WFTAR'] = df.WFTA / df.WFGA
-    df['LFTAR'] = df.LFTA / df.LFGA
-                            
-    #OREB% : Percentage of team offensive rebounds
-    df['WORP'] = df.WOR / (df.WOR + df.LDR)
-    df['LORP'] = df.LOR / (df.LOR + df.WDR)
-    #DREB% : Percentage of team defensive rebounds
-    df['WDRP'] = df.WDR / (df.WDR + df.LOR)
-    df['LDRP'] = df.LDR / (df.LDR + df.WOR)                                     
-    #REB% : Percentage of team total rebounds
-    df['WRP'] = (df.WDR + df.WOR) / (df.WDR + df.WOR + df.LDR + df.LOR)
-    df['LRP'] = (df.LDR + df.LOR) / (df.WDR + df.WOR + df.LDR + df.LOR)
-    logger.info("Done advanced stats")
-    return df
+    ("Pts", lambda t, o: 2*t.FGM + t.FGM3 + t.FTM, "team"),
+    # Possessions of each team, the game uses their average
+    ("Poss", lambda t, o: 0.96*(t.FGA + t.TO + 0.44*t.FTA - t.OR), None),
+    ("Pos", lambda t, o: (t.Poss + o.Poss)/2, "game"),
+    # Offensive/Defensive efficiency = 100 x (Points / Possessions)
+    ("OffRtg", lambda t, o: 100 * (t.Pts / t.Pos), "team"),
+    ("DefRtg", lambda t, o: o.OffRtg, "team"),
+    ("NetRtg", lambda t, o: t.OffRtg - t.DefRtg, "team"),
+    # True shooting attempts and plays used
+    ("TSA", lambda t, o: t.FGA + 0.44*t.FTA, None),
+    ("Plays", lambda t, o: t.TSA + t.Ast + t.TO, None),
+    # Assist Ratio : Percentage of team possessions that end in assists
+    ("AstR", lambda t, o: 100 * t.Ast / t.Plays, "team"),
+    # Turnover Ratio: Number of turnovers of a team per 100 possessions used.
+    ("TOR", lambda t, o: 100 * t.TO / t.Plays, "team"),
+    # The Shooting Percentage : Measure of Shooting Efficiency (FGA/FGA3, FTA)
+    ("TSP", lambda t, o: 100 * t.Pts / (2 * t.TSA), "team"),
+    # eFG% : Effective Field Goal Percentage adjusting for the fact that 3pt shots are more valuable
+    ("eFGP", lambda t, o: (t.FGM + 0.5 * t.FGM3) / t.FGA, "team"),
+    # FTA Rate : How good a team is at drawing fouls.
+    ("FTAR", lambda t, o: t.FTA / t.FGA, "team"),
+    # OREB%/DREB%/REB% : Percentage of team offensive/defensive/total rebounds
+    ("ORP", lambda t, o: t.OR / (t.OR + o.DR), "team"),
+    ("DRP", lambda t, o: t.DR / (t.DR + o.OR), "team"),
+    ("Reb", lambda t, o: t.DR + t.OR, None),
+    ("RP", lambda t, o: t.Reb / (t.Reb + o.Reb), "team"),
+]
+
+
+class _StackedStats:
+    """Lazily evaluated ADVANCED_STATS over (2, n) arrays, row 0 = W, row 1 = L.
+
+    The opponent view shares the same values and only flips the rows, so each
+    raw input and each subexpression is materialised once.
+    """
 
-def calc_season_statistics(regular_data):
-    """Calc season statistics using Kaggle data
+    def __init__(self, data, values=None, flip=False):
+        self._data = data
+        self._values = {} if values is None else values
+        self._flip = flip
+        self._exprs = {name: expr for name, expr, _ in ADVANCED_STATS}
+
+    @property
+    def opponent(self):
+        return _StackedStats(self._data, self._values, not self._flip)
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        values = self._values.get(name)
+        if values is None:
+            if name in self._exprs:
+                team = self if not self._flip else self.opponent
+                values = self._exprs[name](team, team.opponent)
+            else:
+                values = np.stack([self._data['W' + name].to_numpy(),
+                                   self._data['L' + name].to_numpy()])
+            self._values[name] = values
+        return values[::-1] if self._flip else values
+
+
+def advanced_stats(data):
+    """Calculates the W/L advanced stats as a new frame aligned with data.
+
+    All float stats are written into one pre-allocated block; integer stats
+    (points) keep their integer dtype.
     """
-    logger.info("Calculating season statistics")
+    logger.info("Calculating advanced stats")
+    stats = _StackedStats(data)
+
+    columns = []
+    for name, _, output in ADVANCED_STATS:
+        if output == "team":
+            values = getattr(stats, name)
+            columns += [('W' + name, values[0]), ('L' + name, values[1])]
+        elif output == "game":
+            columns.append((name, getattr(stats, name)[0]))
+
+    float_cols = [(c, v) for c, v in columns if v.dtype.kind == 'f']
+    block = np.empty((len(data), len(float_cols)))
+    for i, (_, values) in enumerate(float_cols):
+        block[:, i] = values
+    out = pd.DataFrame(block, columns=[c for c, _ in float_cols], index=data.index, copy=False)
+    for loc, (col, values) in enumerate(columns):
+        if values.dtype.kind != 'f':
+            out.insert(loc, col, values)
 
+    logger.info("Done advanced stats")
+    return out
+
+def boxscore_columns(regular_data):
+    """Game columns that are aggregated into season statistics."""
     exclude_cols = ['TeamID', 'Score', 'Loc']
     exclude_cols2 = ["Season", "DayNum", "NumOT", "location"]
-    boxscore_cols = [c for c in regular_data.columns if c[3:] not in exclude_cols and c not in exclude_cols2]
+    return [c for c in regular_data.columns if c[3:] not in exclude_cols and c not in exclude_cols2]
 
-    funcs = [np.mean]
+def calc_season_statistics(regular_data, funcs=("mean",)):
+    """Calc season statistics using Kaggle data
 
-    # team and opponent regular season stats:
-    season_statistics = regular_data.groupby(["Season", 'T1_TeamID'])[boxscore_cols].agg(funcs).reset_index()
-    T1_season_stats = season_statistics.copy()
-    T2_season_stats = season_statistics.copy()
+    All aggregates are computed in one pass over the rows sorted by
+    (Season, TeamID, DayNum), see src.features.aggregates. The T1_ and T2_
+    frames are two labellings of the same value block.
 
-    T1_season_stats.columns = [''.join(col).strip() for col in T1_season_stats.columns.values]
-    T1_season_stats.columns = T1_season_stats.columns.str.replace("T2_", "T1_opponent_")
+    Parameters
+    ----------
+    regular_data : output of prepare_data
+    funcs : aggregate names, e.g. ("mean", "std", "last5", "ewm10"). Columns are
+        named <stat><func>, e.g. T1_FGMmean, T1_opponent_FGMlast5.
+    """
+    logger.info("Calculating season statistics")
 
-    T2_season_stats.columns = [''.join(col).strip() for col in T2_season_stats.columns.values]
-    T2_season_stats.columns = ["T2_" + s.replace("T1_", "").replace("T2_", "opponent_") for s in T2_season_stats.columns]
+    boxscore_cols = boxscore_columns(regular_data)
 
-    T1_season_stats.columns.values[0] = 'Season'
-    T2_season_stats.columns.values[0] = 'Season'
+    # team and opponent regular season stats:
+    seasons = regular_data['Season'].to_numpy()
+    team_ids = regular_data['T1_TeamID'].to_numpy()
+    order, starts, counts = team_segments(seasons, team_ids, regular_data['DayNum'].to_numpy())
+    values = sorted_columns(regular_data, boxscore_cols, order)
+
+    block = np.empty((len(starts), len(boxscore_cols) * len(funcs)))
+    for k, func in enumerate(funcs):
+        block[:, k::len(funcs)] = segment_aggregate(values, starts, counts, func)
+
+    names = [col + func for col in boxscore_cols for func in funcs]
+    T1_names = [s.replace("T2_", "T1_opponent_") for s in names]
+    T2_names = ["T2_" + s.replace("T1_", "").replace("T2_", "opponent_") for s in names]
+
+    T1_season_stats = pd.DataFrame(block, columns=T1_names, copy=False)
+    T2_season_stats = pd.DataFrame(block, columns=T2_names, copy=False)
+    for stats, team_col in [(T1_season_stats, 'T1_TeamID'), (T2_season_stats, 'T2_TeamID')]:
+        stats.insert(0, 'Season', seasons[order][starts])
+        stats.insert(1, team_col, team_ids[order][starts])
     return T1_season_stats, T2_season_stats
 
-def win_ratio_14_days(regular_data):
+def win_ratio_14_days(regular_data, asof=133, days=14):
     """Calculates win ratio column from prior 14 days
+
+    Uses the window engine in src.features.rolling: the window is the `days`
+    days before `asof` (day 133 is the first day after the regular season,
+    so the default covers DayNum 119-132). Teams without games in the window
+    are left out.
     """
     logger.info("Calculating 14 day win ratio")
-    # Calc prior 2 weeks win %
-    last14_days_T1 = regular_data.loc[regular_data['DayNum']>118].reset_index(drop=True)
-    last14_days_T1['win'] = np.where(last14_days_T1['T1_PointDiff'] > 0, 1, 0)
-    last14_days_T1 = last14_days_T1.groupby(['Season', 'T1_TeamID'])['win'].mean().reset_index(name='T1_win_ratio_14d')
-
-    last14_days_T2 = regular_data.loc[regular_data['DayNum']>118].reset_index(drop=True)
-    last14_days_T2['win'] = np.where(last14_days_T2['T1_PointDiff'] < 0, 1, 0)
-    last14_days_T2 = last14_days_T2.groupby(['Season', 'T2_TeamID'])['win'].mean().reset_index(name='T2_win_ratio_14d')
+    window = f"{days}d"
+    last14_days_T1 = RollingWindows(regular_data, stats=["win_ratio"]).team_features(asof, [window])
+    last14_days_T1 = last14_days_T1.loc[last14_days_T1[f'T1_games_{window}'] > 0]
+    last14_days_T1 = last14_days_T1[['Season', 'T1_TeamID', f'T1_win_ratio_{window}']].reset_index(drop=True)
+    last14_days_T1.columns = ['Season', 'T1_TeamID', 'T1_win_ratio_14d']
+
+    last14_days_T2 = last14_days_T1.rename(columns={'T1_TeamID': 'T2_TeamID', 'T1_win_ratio_14d': 'T2_win_ratio_14d'})
     return last14_days_T1, last14_days_T2
 
 def calc_seed_diff(seeds):
@@ -159,37 +237,27 @@ def calc_seed_diff(seeds):
 
     return seeds_T1, seeds_T2
 
-def clean_kp_data(kp_data_raw, spellings, teams):
+def clean_kp_data(kp_data_raw, spellings, teams, index_path=None):
     """Cleans the kenpom data
+
+    Team names are resolved to TeamIDs through a TeamNameIndex, saved at
+    index_path if given.
     """
     logger = logging.getLogger(__name__)
-    to_replace = {
-        "\s?[0-9]":"",
-        "(\s{1}st\.?$)": " state",
-        "-": " ",
-        "\(": "",
-        "\)": "",
-        "\**": "",
-        "ut rio grande valley": "texas rio grande valley",
-        "texas a&m corpus chris": "a&m corpus chris",
-        "southwest missouri state":"sw missouri state",
-        "texas a&m corpus christi": "a&m corpus christi",
-        "cal st. bakersfield": "cal state bakersfield",
-        "st. francis pa":"st francis pa",
-        "troy state": "troy",
-    }
-    kenpom_df = kp_data_raw.copy()
-    kenpom_df['TeamName'] = kenpom_df['Team'].str.lower()
-    kenpom_df['TeamName'] = kenpom_df['TeamName'].replace(regex=to_replace)
+    if index_path is None:
+        index = TeamNameIndex.from_tables(teams, spellings)
+    else:
+        index = TeamNameIndex.load_or_build(teams, spellings, index_path)
 
-    spellings['TeamName'] = spellings['TeamNameSpelling']
-    all_team_names = teams[['TeamName', 'TeamID']].append(spellings[['TeamName', 'TeamID']])
-    all_team_names['TeamName'] = all_team_names['TeamName'].str.lower()
-    all_team_names['TeamName'] = all_team_names['TeamName'].str.replace("-", " ")
-    all_team_names = all_team_names.drop_duplicates()
-
-    kenpom_df = pd.merge(kenpom_df, all_team_names, on='TeamName', how='left')
-    logger.debug(f"{kenpom_df['TeamID'].isna().sum()} missing ID's")
+    kenpom_df = kp_data_raw.copy()
+    team_ids = index.resolve(kenpom_df['Team'])
+    missing = np.isnan(team_ids)
+    kenpom_df['TeamID'] = team_ids if missing.any() else team_ids.astype(np.int64)
+    if index_path is not None:
+        index.save(index_path)
+    logger.debug(f"{missing.sum()} missing ID's")
+    if missing.any():
+        logger.info(f"Unresolved kenpom names: {index.unresolved()}")
 
     kp_cols = ['Season', 'TeamID',
         'Rk', 'AdjEM', 'AdjO', 'AdjD', 'AdjT', 'Luck',
@@ -208,91 +276,142 @@ def clean_kp_data(kp_data_raw, spellings, teams):
     T2_kp.columns.values[0] = 'Season'
     return T1_kp, T2_kp
 
-def build_test_data(data):
+def feature_steps(data_dir, kp_path, cache):
+    """Declares the cached intermediate tables shared by main and build_test_data.
+
+    Parameters
+    ----------
+    data_dir : Path to the data folder
+    kp_path : Path to the scraped kenpom csv
+    cache : ArtifactCache
+    """
+    external = data_dir / "external"
+    regular_results = cache.source(external / 'MRegularSeasonDetailedResults.csv', reader=read_table)
+    seeds = cache.source(external / 'MNCAATourneySeeds.csv', reader=read_table)
+    teams = cache.source(external / "MTeams.csv", reader=read_table)
+    spellings = cache.source(external / "MTeamSpellings.csv", reader=read_table, encoding = "ISO-8859-1")
+    kp_data_raw = cache.source(kp_path, reader=read_table)
+
+    regular_data = cache.step(prepare_data, regular_results)
+    return {
+        "kp": cache.step(clean_kp_data, kp_data_raw, spellings, teams,
+                         index_path=str(data_dir / "interim" / "team_names.json")),
+        "season_stats": cache.step(calc_season_statistics, regular_data),
+        "win_ratio": cache.step(win_ratio_14_days, regular_data),
+        "seeds": cache.step(calc_seed_diff, seeds),
+        "ratings": cache.step(efficiency_ratings, regular_data),
+    }
+
+
+# block order of the feature store, which sets the column order:
+FEATURE_BLOCKS = ("season_stats", "win_ratio", "kp", "seeds", "ratings")
+
+
+def build_feature_store(steps):
+    """Loads the team-season tables from feature_steps into a TeamFeatureStore.
+
+    Block order sets the column order: season stats, 14 day win ratio,
+    kenpom, seeds, efficiency ratings (T1_ then T2_ for each).
+    """
+    return TeamFeatureStore.from_frames([steps[name].load() for name in FEATURE_BLOCKS])
+
+
+def store_meta(steps, season):
+    """What an in-season store is built from: the step keys of its blocks
+    (raw file digests, params and code) and the season it follows."""
+    return {"steps": {name: steps[name].key for name in FEATURE_BLOCKS}, "season": int(season)}
+
+
+def current_feature_store(data_dir, steps, season):
+    """The store predictions for season are made from.
+
+    During a season src.features.incremental keeps
+    data/processed/team_features.npz current with the day's results. It is
+    used when it follows season and was seeded from the same step keys as
+    steps; otherwise (no such file, a new raw file, edited feature code,
+    another season) the store is built from steps.
+    """
+    path = data_dir / "processed" / "team_features.npz"
+    if path.exists():
+        if TeamFeatureStore.read_meta(path) == store_meta(steps, season):
+            logger.info(f"Using the in-season feature store {path}")
+            return TeamFeatureStore.load(path)
+        logger.warning(f"The in-season feature store {path} was not built from the current "
+                       f"inputs of season {season}, building the store from them instead")
+    return build_feature_store(steps)
+
+
+def attach_features(tourney_data, *frames):
+    """Attaches the team-season features to prepared tourney games.
+
+    Parameters
+    ----------
+    tourney_data : output of prepare_data
+    frames : T1_, T2_ frame pairs in build_feature_store block order (season
+        stats, 14 day win ratio, kenpom, seeds, efficiency ratings)
+    """
+    store = TeamFeatureStore.from_frames(list(zip(frames[0::2], frames[1::2])))
+    tourney_data = store.attach(tourney_data)
+    tourney_data['SeedDiff'] = tourney_data['T1_seed'] - tourney_data['T2_seed']
+    return tourney_data
+
+
+def build_test_data(data, cache=None):
     proj_dir = Path().resolve().parents[0]
     data_dir = proj_dir / "data" 
-    seeds = pd.read_csv(data_dir / "external" / 'MNCAATourneySeeds.csv')
-    regular_results = pd.read_csv(data_dir / "external" / 'MRegularSeasonDetailedResults.csv')
-    teams = pd.read_csv(data_dir / "external" / "MTeams.csv")
-    spellings = pd.read_csv(data_dir / "external" / "MTeamSpellings.csv", encoding = "ISO-8859-1")
+    if cache is None:
+        cache = ArtifactCache(data_dir / "interim" / "cache")
 
-    # load kenpom exteral data:
+    # load/compute intermediate tables (cached):
     kp_path = proj_dir / "data" / "raw" / "kenpom.csv"
-    kp_data_raw = pd.read_csv(kp_path)
-
-    # clean kp data:
-    T1_kp, T2_kp = clean_kp_data(kp_data_raw, spellings, teams)
-
-    #  prepare tourney and regular season data:
-    regular_data = prepare_data(regular_results)
-    
-    # feature eng:
-    # season statistics:
-    T1_season_stats, T2_season_stats = calc_season_statistics(regular_data)
-    last14_days_T1, last14_days_T2 = win_ratio_14_days(regular_data)
-    seeds_T1, seeds_T2 = calc_seed_diff(seeds)
+    steps = feature_steps(data_dir, kp_path, cache)
+    store = build_feature_store(steps)
 
     # combine:
-    feature_set = data.merge(T1_season_stats, on=['Season', 'T1_TeamID'], how='left')
-    feature_set = feature_set.merge(T2_season_stats, on=['Season', 'T2_TeamID'], how='left')
-    feature_set = pd.merge(feature_set, last14_days_T1, on=['Season', 'T1_TeamID'], how='left')
-    feature_set = pd.merge(feature_set, last14_days_T2, on=['Season', 'T2_TeamID'], how='left')
-    feature_set = feature_set.merge(T1_kp, on=['Season', 'T1_TeamID'], how='left')
-    feature_set = feature_set.merge(T2_kp, on=['Season', 'T2_TeamID'], how='left')
-    feature_set = pd.merge(feature_set, seeds_T1, on=['Season', 'T1_TeamID'], how='left')
-    feature_set = pd.merge(feature_set, seeds_T2, on=['Season', 'T2_TeamID'], how='left')
+    feature_set = store.attach(data)
     feature_set['SeedDiff'] = feature_set['T1_seed'] - feature_set['T2_seed']
     return feature_set
 
 
-def main():
+def main(cache=None):
     logger = logging.getLogger(__name__)
     logger.info("Building features")
 
     # use kenpom and kaggle data to create dataset
     proj_dir = Path().resolve()
     data_dir = proj_dir / "data" 
+    if cache is None:
+        cache = ArtifactCache(data_dir / "interim" / "cache")
 
     logger.debug(proj_dir)
 
-    # load kaggle data:
-    tourney_results = pd.read_csv(data_dir / "external" / "MNCAATourneyDetailedResults.csv")
-    seeds = pd.read_csv(data_dir / "external" / 'MNCAATourneySeeds.csv')
-    regular_results = pd.read_csv(data_dir / "external" / 'MRegularSeasonDetailedResults.csv')
-    teams = pd.read_csv(data_dir / "external" / "MTeams.csv")
-    spellings = pd.read_csv(data_dir / "external" / "MTeamSpellings.csv", encoding = "ISO-8859-1")
-
-    # load kenpom exteral data:
-    kp_path = proj_dir / "data" / "raw" / "kenpom.csv"
-    kp_data_raw = pd.read_csv(kp_path)
-
-    # clean kp data:
-    T1_kp, T2_kp = clean_kp_data(kp_data_raw, spellings, teams)
-
-    #  prepare tourney and regular season data:
-    regular_data = prepare_data(regular_results)
-    tourney_data = prepare_data(tourney_results)
-
-    # feature eng:
-    # season statistics:
-    T1_season_stats, T2_season_stats = calc_season_statistics(regular_data)
-    last14_days_T1, last14_days_T2 = win_ratio_14_days(regular_data)
-    seeds_T1, seeds_T2 = calc_seed_diff(seeds)
-
-    # combine:
-    tourney_data = pd.merge(tourney_data, T1_season_stats, on=['Season', 'T1_TeamID'], how='left')
-    tourney_data = pd.merge(tourney_data, T2_season_stats, on=['Season', 'T2_TeamID'], how='left')
-    tourney_data = pd.merge(tourney_data, last14_days_T1, on=['Season', 'T1_TeamID'], how='left')
-    tourney_data = pd.merge(tourney_data, last14_days_T2, on=['Season', 'T2_TeamID'], how='left')
-    tourney_data = tourney_data.merge(T1_kp, on=['Season', 'T1_TeamID'], how='left')
-    tourney_data = tourney_data.merge(T2_kp, on=['Season', 'T2_TeamID'], how='left')
-    tourney_data = pd.merge(tourney_data, seeds_T1, on=['Season', 'T1_TeamID'], how='left')
-    tourney_data = pd.merge(tourney_data, seeds_T2, on=['Season', 'T2_TeamID'], how='left')
-    tourney_data['SeedDiff'] = tourney_data['T1_seed'] - tourney_data['T2_seed']
-
-    # save
-    logger.info("Saving tourney_data to processed folder")
-    tourney_data.to_csv(data_dir / "processed" / "tourney_data.csv", index=False)
+    with instrument.stage("build_features"):
+        # load/compute intermediate tables (cached):
+        kp_path = proj_dir / "data" / "raw" / "kenpom.csv"
+        steps = feature_steps(data_dir, kp_path, cache)
+        with instrument.stage("build_feature_store"):
+            store = build_feature_store(steps)
+
+        #  prepare tourney data:
+        tourney_results = cache.source(data_dir / "external" / "MNCAATourneyDetailedResults.csv", reader=read_table)
+        tourney_data = cache.step(prepare_data, tourney_results).load()
+
+        # combine:
+        with instrument.stage("attach_features") as rec:
+            rec.set(rows_in=len(tourney_data))
+            tourney_data = store.attach(tourney_data)
+            tourney_data['SeedDiff'] = tourney_data['T1_seed'] - tourney_data['T2_seed']
+            rec.set(rows_out=len(tourney_data))
+
+        # save
+        logger.info("Saving tourney_data to processed folder")
+        with instrument.stage("write_processed") as rec:
+            path = write_processed(tourney_data, data_dir / "processed" / "tourney_data")
+            # csv kept for the older notebooks:
+            tourney_data.to_csv(data_dir / "processed" / "tourney_data.csv", index=False)
+            rec.set(rows_in=len(tourney_data),
+                    bytes_written=instrument.file_size(path)
+                    + instrument.file_size(data_dir / "processed" / "tourney_data.csv"))
     
 if __name__ == "__main__":
     log_fmt = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
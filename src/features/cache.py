@@ -0,0 +1,273 @@
+"""Content-addressed cache for intermediate feature tables.
+
+Every table is keyed by a hash of its inputs (raw file contents or the keys
+of upstream tables), the function's parameters and the function's code
+version, and stored on disk as Feather files. Steps are lazy: nothing is read
+or computed until ``load()`` is called, and an upstream step is only
+evaluated when a downstream key misses.
+"""
+import hashlib
+import inspect
+import json
+import logging
+import os
+from pathlib import Path
+import types
+
+import pandas as pd
+from pyarrow import feather
+
+from src import instrument
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+
+
+def content_hash(*parts):
+    """sha256 of the string forms of parts, e.g. a function name, its params
+    and the keys or file digests of its inputs."""
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(str(part).encode())
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def code_version(func, _seen=None):
+    """Hash of a function's source and of the module level names it uses.
+
+    Module level functions and classes it calls (e.g. ``calc_advanced_stats``
+    for ``prepare_data``) are hashed recursively, as are module level
+    constants and containers it reads (e.g. ``ADVANCED_STATS``, a list of
+    lambdas): editing any of them changes the version, editing an unrelated
+    function in the same module does not.
+    """
+    _seen = set() if _seen is None else _seen
+    _seen.add(id(func))
+    try:
+        source = inspect.getsource(func)
+    except (OSError, TypeError):
+        source = func.__qualname__
+    parts = [source]
+    module_globals = getattr(func, "__globals__", {})
+    for name in sorted(_code_names(func.__code__)):
+        if name in module_globals:
+            version = _global_version(module_globals[name], func.__module__, _seen)
+            if version is not None:
+                parts.append(f"{name}={version}")
+    return content_hash(*parts)
+
+
+def _code_names(code):
+    """Global names a code object and the lambdas and comprehensions in it use."""
+    names = set(code.co_names)
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType):
+            names |= _code_names(const)
+    return names
+
+
+def _global_version(ref, module, _seen):
+    """Version of a module level object, None if it is not part of the code.
+
+    Functions and classes only count when defined in module (imported ones
+    are keyed by their own steps); containers are hashed element-wise,
+    functions inside them by their code; plain constants by repr.
+    """
+    if id(ref) in _seen:
+        return "<recursive>"
+    if isinstance(ref, types.FunctionType):
+        if ref.__module__ != module:
+            return None
+        return code_version(ref, _seen)
+    if isinstance(ref, type):
+        if ref.__module__ != module:
+            return None
+        _seen.add(id(ref))
+        methods = [getattr(m, "fget", m) for m in vars(ref).values()]
+        return content_hash(ref.__qualname__, *[code_version(m, _seen) for m in methods
+                                               if isinstance(m, types.FunctionType) and id(m) not in _seen])
+    if isinstance(ref, (list, tuple, set, frozenset, dict)):
+        _seen.add(id(ref))
+        items = ref.items() if isinstance(ref, dict) else ref
+        versions = [_element_version(item, module, _seen) for item in items]
+        if isinstance(ref, (set, frozenset)):
+            versions.sort()
+        _seen.discard(id(ref))
+        return content_hash(type(ref).__name__, *versions)
+    if ref is None or isinstance(ref, (bool, int, float, complex, str, bytes)):
+        return repr(ref)
+    return None
+
+
+def _element_version(item, module, _seen):
+    """Version of an element of a module level container.
+
+    Imported functions and classes count by name, other objects by type
+    (their repr may hold a memory address).
+    """
+    version = _global_version(item, module, _seen)
+    if version is not None:
+        return version
+    if isinstance(item, (types.FunctionType, type)):
+        return f"{item.__module__}.{item.__qualname__}"
+    return type(item).__qualname__
+
+
+def file_digest(path, memo):
+    """sha256 of a file, memoized on (size, mtime) so big files are read once.
+
+    Parameters
+    ----------
+    path : file
+    memo : dict {resolved path: [size, mtime_ns, digest]}, updated in place;
+        the caller persists it (ArtifactCache, pipeline.PipelineState)
+    """
+    path = Path(path).resolve()
+    stat = path.stat()
+    stamp = [stat.st_size, stat.st_mtime_ns]
+    entry = memo.get(str(path))
+    if entry is not None and entry[:2] == stamp:
+        return entry[2]
+
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    memo[str(path)] = stamp + [h.hexdigest()]
+    return h.hexdigest()
+
+
+class Artifact:
+    """A lazily evaluated table (or tuple of tables) in an ArtifactCache."""
+
+    def __init__(self, cache, key, compute, name, persist=True, path=None):
+        self.cache = cache
+        self.key = key
+        self.name = name
+        self.persist = persist
+        self.path = path
+        self._compute = compute
+
+    def load(self):
+        return self.cache._load(self)
+
+    def __repr__(self):
+        return f"Artifact({self.name}, {self.key[:12]})"
+
+
+class ArtifactCache:
+    """On-disk cache of DataFrames keyed by content, params and code version.
+
+    Parameters
+    ----------
+    cache_dir : Path
+        where artifacts are stored (one ``<key>_<i>.feather`` per table)
+    max_bytes : int
+        size budget, least recently used artifacts are evicted beyond it
+    """
+
+    def __init__(self, cache_dir, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self._memory = {}
+        self._digests_path = self.cache_dir / "file_digests.json"
+        if self._digests_path.exists():
+            self._digests = json.loads(self._digests_path.read_text())
+        else:
+            self._digests = {}
+
+    def file_digest(self, path):
+        """sha256 of a file (see file_digest), memoized in the cache folder."""
+        key = str(Path(path).resolve())
+        entry = self._digests.get(key)
+        digest = file_digest(path, self._digests)
+        # a new entry means the file was hashed:
+        if self._digests.get(key) is not entry:
+            self._digests_path.write_text(json.dumps(self._digests))
+        return digest
+
+    def source(self, path, reader=pd.read_csv, **read_kwargs):
+        """A raw input file. Its key is the hash of the file contents."""
+        key = content_hash("source", self.file_digest(path), sorted(read_kwargs.items()))
+        return Artifact(self, key, lambda: reader(path, **read_kwargs),
+                        name=Path(path).name, persist=False, path=path)
+
+    def step(self, func, *inputs, **params):
+        """``func(*[i.load() for i in inputs], **params)`` as a cached artifact."""
+        key = content_hash(func.__module__, func.__qualname__, code_version(func),
+                    sorted(params.items()), *[i.key for i in inputs])
+
+        def compute():
+            args = [i.load() for i in inputs]
+            instrument.current().set(rows_in=sum(instrument.rows(a) or 0 for a in args))
+            return func(*args, **params)
+
+        return Artifact(self, key, compute, name=func.__name__)
+
+    def _paths(self, key):
+        return sorted(self.cache_dir.glob(f"{key}_*.feather"))
+
+    def _load(self, artifact):
+        key = artifact.key
+        if key in self._memory:
+            return self._memory[key]
+
+        meta_path = self.cache_dir / f"{key}.json"
+        with instrument.stage(artifact.name, key=key[:12]) as rec:
+            # sources are re-read from the raw file, only steps go to disk:
+            if not artifact.persist or not meta_path.exists():
+                logger.debug(f"Computing {artifact}")
+                rec.set(cached=False)
+                if artifact.path is not None:
+                    rec.add(bytes_read=instrument.file_size(artifact.path))
+                value = artifact._compute()
+                if artifact.persist:
+                    self._save(key, value)
+            else:
+                logger.debug(f"Loading {artifact} from cache")
+                rec.set(cached=True)
+                meta = json.loads(meta_path.read_text())
+                paths = [self.cache_dir / f"{key}_{i}.feather" for i in range(meta["n_tables"])]
+                frames = [feather.read_feather(path) for path in paths]
+                rec.add(bytes_read=sum(instrument.file_size(path) for path in paths))
+                value = tuple(frames) if meta["tuple"] else frames[0]
+                os.utime(meta_path)
+            rec.set(rows_out=instrument.rows(value))
+
+        self._memory[key] = value
+        return value
+
+    def _save(self, key, value):
+        frames = value if isinstance(value, tuple) else (value,)
+        for i, df in enumerate(frames):
+            path = self.cache_dir / f"{key}_{i}.feather"
+            feather.write_feather(df, path)
+            instrument.current().add(bytes_written=instrument.file_size(path))
+        meta = {"n_tables": len(frames), "tuple": isinstance(value, tuple)}
+        (self.cache_dir / f"{key}.json").write_text(json.dumps(meta))
+        self.evict()
+
+    def evict(self):
+        """Drops least recently used artifacts until the cache fits max_bytes."""
+        entries = []
+        total = 0
+        for meta_path in self.cache_dir.glob("*.json"):
+            if meta_path == self._digests_path:
+                continue
+            key = meta_path.stem
+            paths = [meta_path] + self._paths(key)
+            size = sum(p.stat().st_size for p in paths)
+            entries.append((meta_path.stat().st_mtime, key, paths, size))
+            total += size
+
+        for _, key, paths, size in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            logger.debug(f"Evicting {key[:12]} ({size} bytes)")
+            for p in paths:
+                p.unlink()
+            self._memory.pop(key, None)
+            total -= size
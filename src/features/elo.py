@@ -0,0 +1,209 @@
+"""Sequential Elo ratings over the game history.
+
+Games are replayed in (Season, DayNum) order with the team state in arrays
+indexed by team, so a replay is a loop over days rather than over rows:
+the games of a day involve distinct teams and are updated together (a team
+playing twice in a day splits the day in two). Every array has a
+leading parameter axis, so a grid of parameter settings is replayed in the
+same pass, e.g. to tune the K-factor:
+
+    elo_sweep(regular_data, k=[10, 20, 30], home=[0, 75, 100])
+
+The update of a game won by w over l is
+
+    diff = R[w] - R[l] + home * location
+    p = 1 / (1 + 10 ** (-diff / 400))
+    R[w] += k * m * (1 - p),  R[l] -= k * m * (1 - p)
+
+with the margin of victory multiplier m = (margin + 3) ** 0.8 / (7.5 +
+0.006 * diff) (1 without mov). Before each new season every rating is
+pulled back towards the mean by the fraction regress.
+"""
+import itertools
+import logging
+
+import numpy as np
+import pandas as pd
+
+from src.features.ratings import season_games
+
+logger = logging.getLogger(__name__)
+
+INITIAL = 1500.0
+PARAMS = {"k": 20.0, "home": 75.0, "mov": True, "regress": 0.25}
+
+
+def _schedule(games):
+    """Batches of games that can be updated together.
+
+    Within a (Season, DayNum) a game goes to the batch after the latest one
+    holding either of its teams, so every team's games keep their order.
+    A team's k-th game of the day (cumcount over Season, DayNum and TeamID
+    in game order) puts its game in batch k or later. Batches are then
+    raised to one past the team's previous game of the day until nothing
+    changes, which only takes more than one pass for chains of teams
+    playing twice on the same day.
+
+    Returns
+    -------
+    order : permutation of the games, batch by batch
+    starts : start of every batch in order, plus the end
+    """
+    season, day = games['Season'], games['DayNum']
+    n = len(season)
+    # two rows per game, winner then loser, in game order:
+    teams = pd.DataFrame({"Season": np.repeat(season, 2), "DayNum": np.repeat(day, 2),
+                          "TeamID": np.column_stack([games['W'], games['L']]).ravel(),
+                          "game": np.repeat(np.arange(n), 2)})
+    by_team = teams.groupby(["Season", "DayNum", "TeamID"], sort=False)["game"]
+    level = by_team.cumcount().to_numpy().reshape(n, 2).max(axis=1)
+    previous = by_team.shift().to_numpy()
+    linked = ~np.isnan(previous)
+    game, previous = teams["game"].to_numpy()[linked], previous[linked].astype(np.int64)
+    while len(game):
+        raised = np.zeros(n, dtype=np.int64)
+        np.maximum.at(raised, game, level[previous] + 1)
+        raised = np.maximum(raised, level)
+        if np.array_equal(raised, level):
+            break
+        level = raised
+
+    order = np.lexsort((level, day, season))
+    key = np.column_stack([season, day, level])[order]
+    starts = np.flatnonzero(np.any(key[1:] != key[:-1], axis=1)) + 1
+    return order, np.concatenate([[0], starts, [len(order)]])
+
+
+def _parameters(k, home, mov, regress):
+    """Broadcasts the parameters against each other into (P, 1) columns."""
+    k, home, mov, regress = np.broadcast_arrays(*[np.asarray(v, dtype=np.float64).ravel()
+                                                 for v in (k, home, mov, regress)])
+    return [v[:, None] for v in (k, home, mov, regress)]
+
+
+def replay(games, k=PARAMS["k"], home=PARAMS["home"], mov=PARAMS["mov"], regress=PARAMS["regress"],
+           asof_days=(), score_from=None):
+    """Replays the games for P parameter settings at once.
+
+    Parameters
+    ----------
+    games : season_games arrays
+    k, home, mov, regress : scalars or length P arrays (broadcast together)
+    asof_days : DayNums at which every season is snapshotted; a snapshot
+        holds the ratings before the games of that day
+    score_from : first season whose games count towards the scores,
+        default the second season (the first starts from flat ratings)
+
+    Returns
+    -------
+    dict with
+    team_ids : (n,) TeamIDs of the rating columns
+    snapshots : {(Season, DayNum): (P, n) ratings}
+    played : {Season: (n,) bool, teams with games in the season}
+    log_loss, brier : (P,) mean scores of the pre-game win probabilities
+    """
+    k, home, mov, regress = _parameters(k, home, mov, regress)
+    order, starts = _schedule(games)
+    games = {key: values[order] for key, values in games.items()}
+    team_ids, team = np.unique(np.concatenate([games['W'], games['L']]), return_inverse=True)
+    m = len(games['W'])
+    w_idx, l_idx = team[:m], team[m:]
+    seasons = games['Season']
+    if score_from is None:
+        score_from = seasons[0] + 1 if m else 0
+    asof_days = sorted(asof_days)
+
+    R = np.full((len(k), len(team_ids)), INITIAL)
+    log_loss = np.zeros(len(k))
+    brier = np.zeros(len(k))
+    n_scored = 0
+    snapshots, played = {}, {}
+
+    def close_season(season, day):
+        # snapshots of the days up to and including day that are still missing:
+        for asof in asof_days:
+            if asof <= day and (season, asof) not in snapshots:
+                snapshots[(season, asof)] = R.copy()
+
+    location, margin = games['location'], games['Margin']
+    batch_seasons = seasons[starts[:-1]].tolist()
+    batch_days = games['DayNum'][starts[:-1]].tolist()
+    for start, stop, season, day in zip(starts[:-1], starts[1:], batch_seasons, batch_days):
+        if season not in played:
+            if played:
+                close_season(list(played)[-1], np.inf)
+                R = INITIAL + (1 - regress) * (R - INITIAL)
+            played[season] = np.zeros(len(team_ids), dtype=bool)
+        close_season(season, day)
+
+        w, l = w_idx[start:stop], l_idx[start:stop]
+        played[season][w] = played[season][l] = True
+        diff = R[:, w] - R[:, l] + home * location[start:stop]
+        p = 1 / (1 + 10 ** (-diff / 400))
+        if season >= score_from:
+            log_loss -= np.log(p).sum(axis=1)
+            brier += ((1 - p) ** 2).sum(axis=1)
+            n_scored += stop - start
+        multiplier = (margin[start:stop] + 3) ** 0.8 / (7.5 + 0.006 * diff)
+        delta = k * np.where(mov > 0, multiplier, 1.0) * (1 - p)
+        R[:, w] += delta
+        R[:, l] -= delta
+    if played:
+        close_season(list(played)[-1], np.inf)
+
+    n_scored = max(n_scored, 1)
+    return {"team_ids": team_ids, "snapshots": snapshots, "played": played,
+            "log_loss": log_loss / n_scored, "brier": brier / n_scored}
+
+
+def elo_history(regular_data, asof_days=(133,), **params):
+    """Elo of every team-season as of each day in asof_days, for one parameter setting.
+
+    Parameters
+    ----------
+    regular_data : output of prepare_data
+    asof_days : DayNums; only games before the day are used
+    params : k, home, mov, regress (default PARAMS)
+
+    Returns
+    -------
+    DataFrame with Season, DayNum (the as-of day), TeamID and Elo
+    """
+    result = replay(season_games(regular_data), asof_days=asof_days, **{**PARAMS, **params})
+    team_ids = result["team_ids"]
+    frames = []
+    for (season, day), R in sorted(result["snapshots"].items()):
+        played = result["played"][season]
+        frames.append(pd.DataFrame({"Season": season, "DayNum": day,
+                                    "TeamID": team_ids[played], "Elo": R[0, played]}))
+    return pd.concat(frames, ignore_index=True)
+
+
+def elo_ratings(regular_data, asof=133, **params):
+    """Elo per team-season as of a day (default: the end of the regular
+    season), as T1_/T2_ frames like clean_kp_data.
+    """
+    logger.info("Calculating Elo ratings")
+    elo = elo_history(regular_data, [asof], **params).drop(columns='DayNum')
+    T1 = elo.rename(columns={c: "T1_" + c for c in elo.columns if c != 'Season'})
+    T2 = elo.rename(columns={c: "T2_" + c for c in elo.columns if c != 'Season'})
+    return T1, T2
+
+
+def elo_sweep(regular_data, k=(PARAMS["k"],), home=(PARAMS["home"],), mov=(PARAMS["mov"],),
+              regress=(PARAMS["regress"],), score_from=None):
+    """Scores every combination of the given parameter values in one replay.
+
+    Returns
+    -------
+    DataFrame with k, home, mov, regress, log_loss and brier of the pre-game
+    win probabilities, best log loss first
+    """
+    grid = pd.DataFrame(list(itertools.product(k, home, mov, regress)),
+                        columns=["k", "home", "mov", "regress"])
+    result = replay(season_games(regular_data), grid["k"], grid["home"], grid["mov"], grid["regress"],
+                    score_from=score_from)
+    grid["log_loss"] = result["log_loss"]
+    grid["brier"] = result["brier"]
+    logger.info(f"Scored {len(grid)} Elo parameter settings")
+    return grid.sort_values("log_loss").reset_index(drop=True)
@@ -0,0 +1,217 @@
+"""Dense (Season, TeamID) feature store.
+
+Seasons and team IDs are small dense integers, so every team-season feature
+lives in one contiguous (season, team, feature) array. Attaching features to
+a set of games is a fancy-index gather for T1, one for T2 and a single
+horizontal stack, instead of a chain of merges that re-hash the keys and
+copy the growing frame each time. Missing team-seasons are tracked with a
+presence mask per block and come out as NaN, like a left merge.
+
+The store can be saved as .npz and its rows replaced block by block, which
+is how src.features.incremental keeps it current during a season.
+"""
+import json
+
+import numpy as np
+import pandas as pd
+
+
+class TeamFeatureStore:
+    """Team-season feature blocks indexed by (season offset, team offset).
+
+    Build it with from_frames; each block is a pair of T1_/T2_ frames as
+    returned by the feature functions (calc_season_statistics,
+    win_ratio_14_days, clean_kp_data, calc_seed_diff).
+    """
+
+    def __init__(self, seasons, team_ids, values, present, blocks, int_columns):
+        self.season0 = int(seasons.min())
+        self.team0 = int(team_ids.min())
+        self.values = values
+        self.present = present
+        self.blocks = blocks
+        self.int_columns = int_columns
+
+    @classmethod
+    def from_frames(cls, frame_pairs):
+        """Builds the store.
+
+        Parameters
+        ----------
+        frame_pairs : list of (T1_frame, T2_frame). The T1 frame is keyed by
+            Season and T1_TeamID, the T2 frame holds the same rows keyed by
+            Season and T2_TeamID. Rows without a TeamID are dropped; for
+            duplicated keys the last row wins.
+        """
+        keyed = []
+        for T1_frame, T2_frame in frame_pairs:
+            T1_cols = [c for c in T1_frame.columns if c not in ('Season', 'T1_TeamID')]
+            T2_cols = [c for c in T2_frame.columns if c not in ('Season', 'T2_TeamID')]
+            frame = T1_frame.dropna(subset=['T1_TeamID'])
+            keyed.append((frame, T1_cols, T2_cols))
+
+        seasons = np.concatenate([f['Season'].to_numpy() for f, _, _ in keyed]).astype(np.int64)
+        team_ids = np.concatenate([f['T1_TeamID'].to_numpy() for f, _, _ in keyed]).astype(np.int64)
+        n_seasons = seasons.max() - seasons.min() + 1
+        n_teams = team_ids.max() - team_ids.min() + 1
+        n_features = sum(len(cols) for _, cols, _ in keyed)
+
+        values = np.full((n_seasons, n_teams, n_features), np.nan)
+        present = np.zeros((n_seasons, n_teams, len(keyed)), dtype=bool)
+        blocks = []
+        int_columns = set()
+        start = 0
+        for b, (frame, T1_cols, T2_cols) in enumerate(keyed):
+            s = frame['Season'].to_numpy().astype(np.int64) - seasons.min()
+            t = frame['T1_TeamID'].to_numpy().astype(np.int64) - team_ids.min()
+            stop = start + len(T1_cols)
+            values[s, t, start:stop] = frame[T1_cols].to_numpy(dtype=np.float64)
+            present[s, t, b] = True
+            blocks.append((slice(start, stop), T1_cols, T2_cols))
+            for T1_col, T2_col in zip(T1_cols, T2_cols):
+                if pd.api.types.is_integer_dtype(frame[T1_col]):
+                    int_columns.update([T1_col, T2_col])
+            start = stop
+        return cls(seasons, team_ids, values, present, blocks, int_columns)
+
+    def _lookup(self, seasons, team_ids):
+        s = np.asarray(seasons, dtype=np.int64) - self.season0
+        t = np.asarray(team_ids, dtype=np.int64) - self.team0
+        inside = (s >= 0) & (s < self.values.shape[0]) & (t >= 0) & (t < self.values.shape[1])
+        s = np.where(inside, s, 0)
+        t = np.where(inside, t, 0)
+
+        rows = self.values[s, t]
+        present = self.present[s, t] & inside[:, None]
+        for b, (cols, _, _) in enumerate(self.blocks):
+            rows[~present[:, b], cols] = np.nan
+        return rows, present
+
+    def gather(self, seasons, team_ids):
+        """Feature rows of (season, team) pairs, NaN where a block is missing."""
+        return self._lookup(seasons, team_ids)[0]
+
+    def _grow(self, seasons, team_ids):
+        """Extends the season and team axes to cover the given keys."""
+        season0 = min(self.season0, int(seasons.min()))
+        team0 = min(self.team0, int(team_ids.min()))
+        season1 = max(self.season0 + self.values.shape[0], int(seasons.max()) + 1)
+        team1 = max(self.team0 + self.values.shape[1], int(team_ids.max()) + 1)
+        if (season0, team0, season1 - season0, team1 - team0) == \
+                (self.season0, self.team0) + self.values.shape[:2]:
+            return
+        values = np.full((season1 - season0, team1 - team0, self.values.shape[2]), np.nan)
+        present = np.zeros(values.shape[:2] + self.present.shape[2:], dtype=bool)
+        s = slice(self.season0 - season0, self.season0 - season0 + self.values.shape[0])
+        t = slice(self.team0 - team0, self.team0 - team0 + self.values.shape[1])
+        values[s, t] = self.values
+        present[s, t] = self.present
+        self.values, self.present = values, present
+        self.season0, self.team0 = season0, team0
+
+    def replace_rows(self, block, seasons, team_ids, T1_frame):
+        """Replaces the rows of one block for a set of team-seasons.
+
+        Parameters
+        ----------
+        block : block index, in from_frames order
+        seasons, team_ids : the team-seasons to replace; those without a row
+            in T1_frame become missing
+        T1_frame : T1_ frame of the block, as from the feature function
+        """
+        cols, T1_cols, _ = self.blocks[block]
+        if [c for c in T1_frame.columns if c not in ('Season', 'T1_TeamID')] != T1_cols:
+            raise ValueError(f"Columns of block {block} do not match the store")
+        seasons = np.asarray(seasons, dtype=np.int64)
+        team_ids = np.asarray(team_ids, dtype=np.int64)
+        frame = T1_frame.dropna(subset=['T1_TeamID'])
+        new_seasons = frame['Season'].to_numpy().astype(np.int64)
+        new_teams = frame['T1_TeamID'].to_numpy().astype(np.int64)
+        if len(seasons) or len(frame):
+            self._grow(np.concatenate([seasons, new_seasons]), np.concatenate([team_ids, new_teams]))
+
+        s, t = seasons - self.season0, team_ids - self.team0
+        self.values[s, t, cols] = np.nan
+        self.present[s, t, block] = False
+        s, t = new_seasons - self.season0, new_teams - self.team0
+        self.values[s, t, cols] = frame[T1_cols].to_numpy(dtype=np.float64)
+        self.present[s, t, block] = True
+
+    def equals(self, other):
+        """True if both stores hold the same blocks and exactly the same values."""
+        if [b[1:] for b in self.blocks] != [b[1:] for b in other.blocks] \
+                or self.int_columns != other.int_columns:
+            return False
+        keys = []
+        for store in (self, other):
+            s, t = np.nonzero(store.present.any(axis=2))
+            keys.append((s + store.season0, t + store.team0))
+        seasons = np.concatenate([keys[0][0], keys[1][0]])
+        team_ids = np.concatenate([keys[0][1], keys[1][1]])
+        rows, present = self._lookup(seasons, team_ids)
+        other_rows, other_present = other._lookup(seasons, team_ids)
+        return np.array_equal(present, other_present) and np.array_equal(rows, other_rows, equal_nan=True)
+
+    def save(self, path, meta=None):
+        """Saves the store as .npz.
+
+        meta : JSON serializable dict stored along, read back with read_meta
+            (e.g. what the store was built from)
+        """
+        np.savez(path, season0=self.season0, team0=self.team0, values=self.values, present=self.present,
+                 bounds=np.array([[cols.start, cols.stop] for cols, _, _ in self.blocks]).reshape(-1, 2),
+                 T1_cols=np.array([c for _, T1_cols, _ in self.blocks for c in T1_cols]),
+                 T2_cols=np.array([c for _, _, T2_cols in self.blocks for c in T2_cols]),
+                 int_columns=np.array(sorted(self.int_columns), dtype=str),
+                 meta=np.array(json.dumps(meta or {})))
+
+    @staticmethod
+    def read_meta(path):
+        """The meta dict a store was saved with, {} if it has none."""
+        with np.load(path) as f:
+            return json.loads(str(f['meta'])) if 'meta' in f.files else {}
+
+    @classmethod
+    def load(cls, path):
+        """Loads a store written by save."""
+        with np.load(path) as f:
+            T1_cols = f['T1_cols'].tolist()
+            T2_cols = f['T2_cols'].tolist()
+            blocks = [(slice(start, stop), T1_cols[start:stop], T2_cols[start:stop])
+                      for start, stop in f['bounds'].tolist()]
+            return cls(np.array([int(f['season0'])]), np.array([int(f['team0'])]), f['values'],
+                       f['present'], blocks, set(f['int_columns'].tolist()))
+
+    def columns(self):
+        """Output column names, in the order of the old merge chain."""
+        names = []
+        for _, T1_cols, T2_cols in self.blocks:
+            names += T1_cols + T2_cols
+        return names
+
+    def attach(self, games):
+        """Adds the T1_ and T2_ features of every block to games.
+
+        Parameters
+        ----------
+        games : DataFrame with Season, T1_TeamID and T2_TeamID
+        """
+        seasons = games['Season'].to_numpy()
+        T1_rows = self.gather(seasons, games['T1_TeamID'].to_numpy())
+        T2_rows = self.gather(seasons, games['T2_TeamID'].to_numpy())
+
+        # T1 block, T2 block, next T1 block, ...
+        out = np.empty((len(games), 2 * self.values.shape[2]))
+        pos = 0
+        for cols, T1_cols, _ in self.blocks:
+            width = len(T1_cols)
+            out[:, pos:pos + width] = T1_rows[:, cols]
+            out[:, pos + width:pos + 2 * width] = T2_rows[:, cols]
+            pos += 2 * width
+
+        features = pd.DataFrame(out, columns=self.columns(), copy=False)
+        # integer features stay integer when nothing is missing:
+        for col in self.int_columns:
+            if not features[col].isna().any():
+                features[col] = features[col].astype(np.int64)
+        return pd.concat([games.reset_index(drop=True), features], axis=1)
@@ -0,0 +1,201 @@
+"""Incremental in-season updates of the team feature store.
+
+During the season new results arrive daily. The season statistics and the
+14 day win ratio of a team only depend on that team's own games, so a day's
+results change the rows of the teams that played and nothing else.
+SeasonState keeps the raw results of the current season; a day's update
+appends the new games, recomputes the season_stats and win_ratio blocks of
+the teams involved with the functions of the full build
+(calc_season_statistics, win_ratio_14_days) on those teams' games only, and
+replaces their rows in the TeamFeatureStore that build_feature_store
+produces. The efficiency ratings are opponent adjusted, so every game moves
+every team of the season; that block is re-solved from all of the season's
+games (one season is a few milliseconds). The store is saved as
+data/processed/team_features.npz with the season and the step keys it was
+seeded from; predict_model and ensemble use it for that season as long as
+those keys still hold (see build_features.current_feature_store). A new raw
+results file or edited feature code needs a new seed.
+
+A team's rows are recomputed from its games rather than kept as running
+sums: the segment sums of calc_season_statistics are not sequential, so only
+the same computation on the same rows gives the same bits. An updated store
+therefore equals a full rebuild exactly, which check() verifies.
+
+    python -m src.features.incremental seed 2021
+    python -m src.features.incremental update data/external/new_results.csv --check
+    python -m src.features.incremental check
+"""
+import argparse
+import logging
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from src.data.storage import read_table
+from src.features.build_features import (
+    FEATURE_BLOCKS, build_feature_store, calc_season_statistics, feature_steps, prepare_data,
+    store_meta, win_ratio_14_days)
+from src.features.ratings import efficiency_ratings
+from src.features.cache import ArtifactCache
+from src.features.feature_store import TeamFeatureStore
+
+logger = logging.getLogger(__name__)
+
+# feature store blocks that depend on the regular season results:
+SEASON_BLOCKS = {"season_stats": calc_season_statistics, "win_ratio": win_ratio_14_days}
+# ... of which a team's rows depend on every game of the season:
+SEASON_WIDE_BLOCKS = {"ratings": efficiency_ratings}
+
+
+class SeasonState:
+    """The raw (W/L) results of one season, in arrival order.
+
+    Parameters
+    ----------
+    season : int
+    results : raw result rows; rows of other seasons are dropped
+    """
+
+    def __init__(self, season, results):
+        self.season = int(season)
+        self.results = results.loc[results['Season'] == self.season].reset_index(drop=True)
+
+    def update(self, new_results):
+        """Appends new raw rows of this season.
+
+        Returns
+        -------
+        team_ids : sorted TeamIDs of the teams that played
+        """
+        new_results = new_results.loc[new_results['Season'] == self.season]
+        self.results = pd.concat([self.results, new_results], ignore_index=True)
+        return np.union1d(new_results['WTeamID'].to_numpy(), new_results['LTeamID'].to_numpy()).astype(np.int64)
+
+    def team_blocks(self, team_ids):
+        """T1_ frames of the season blocks for the given teams, from their games only."""
+        games = self.results.loc[self.results['WTeamID'].isin(team_ids) | self.results['LTeamID'].isin(team_ids)]
+        regular_data = prepare_data(games.reset_index(drop=True))
+        regular_data = regular_data.loc[regular_data['T1_TeamID'].isin(team_ids)].reset_index(drop=True)
+        return {name: func(regular_data)[0] for name, func in SEASON_BLOCKS.items()}
+
+    def season_blocks(self):
+        """T1_ frames of the season-wide blocks, from all of the season's games."""
+        regular_data = prepare_data(self.results)
+        return {name: func(regular_data)[0] for name, func in SEASON_WIDE_BLOCKS.items()}
+
+    def team_ids(self):
+        """Sorted TeamIDs of every team with a game this season."""
+        return np.union1d(self.results['WTeamID'].to_numpy(), self.results['LTeamID'].to_numpy()).astype(np.int64)
+
+    def save(self, path):
+        """Saves the season and its rows as .npz."""
+        columns = list(self.results.columns)
+        np.savez(path, season=self.season, columns=np.array(columns),
+                 **{f"column_{k}": self.results[c].to_numpy(dtype=str if c == 'WLoc' else None)
+                    for k, c in enumerate(columns)})
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as f:
+            columns = f['columns'].tolist()
+            results = pd.DataFrame({c: f[f"column_{k}"] for k, c in enumerate(columns)})
+            if 'WLoc' in results:
+                results['WLoc'] = results['WLoc'].astype(object)
+            return cls(int(f['season']), results)
+
+
+def update_store(store, state, new_results):
+    """Folds a day's raw results into the state and replaces the rows of the
+    teams that played in the store.
+
+    Returns
+    -------
+    team_ids : the teams whose rows changed
+    """
+    team_ids = state.update(new_results)
+    if len(team_ids) == 0:
+        return team_ids
+    seasons = np.full(len(team_ids), state.season)
+    for name, frame in state.team_blocks(team_ids).items():
+        store.replace_rows(FEATURE_BLOCKS.index(name), seasons, team_ids, frame)
+    season_teams = state.team_ids()
+    for name, frame in state.season_blocks().items():
+        store.replace_rows(FEATURE_BLOCKS.index(name), np.full(len(season_teams), state.season),
+                           season_teams, frame)
+    logger.info(f"Updated {len(team_ids)} teams for season {state.season}")
+    return team_ids
+
+
+def _regular_results(data_dir, cache):
+    return cache.source(data_dir / "external" / "MRegularSeasonDetailedResults.csv", reader=read_table).load()
+
+
+def seed(season, data_dir, cache):
+    """Full build of the store, and the state of a season from the results file.
+
+    Returns
+    -------
+    store, state, meta : meta is build_features.store_meta of the build
+    """
+    steps = feature_steps(data_dir, data_dir / "raw" / "kenpom.csv", cache)
+    store = build_feature_store(steps)
+    return store, SeasonState(season, _regular_results(data_dir, cache)), store_meta(steps, season)
+
+
+def rebuild(state, data_dir, cache):
+    """Full build of the store with the state's rows as its season's results."""
+    steps = feature_steps(data_dir, data_dir / "raw" / "kenpom.csv", cache)
+    results = _regular_results(data_dir, cache)
+    results = pd.concat([results.loc[results['Season'] != state.season], state.results], ignore_index=True)
+    regular_data = prepare_data(results)
+    frames = {name: func(regular_data) for name, func in {**SEASON_BLOCKS, **SEASON_WIDE_BLOCKS}.items()}
+    frames.update({name: steps[name].load() for name in FEATURE_BLOCKS if name not in frames})
+    return TeamFeatureStore.from_frames([frames[name] for name in FEATURE_BLOCKS])
+
+
+def check(store, state, data_dir, cache):
+    """True if the store equals a full rebuild exactly."""
+    matches = store.equals(rebuild(state, data_dir, cache))
+    if matches:
+        logger.info("The feature store equals a full rebuild")
+    else:
+        logger.error("The feature store differs from a full rebuild")
+    return matches
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Keeps the team feature store current during a season.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    seed_parser = commands.add_parser("seed", help="full build of the store and the season state")
+    seed_parser.add_argument("season", type=int)
+    update_parser = commands.add_parser("update", help="folds new results into the store")
+    update_parser.add_argument("path", help="csv of new raw (W/L) results")
+    update_parser.add_argument("--check", action="store_true", help="compare to a full rebuild afterwards")
+    commands.add_parser("check", help="compare the store to a full rebuild")
+    args = parser.parse_args(argv)
+
+    data_dir = Path().resolve() / "data"
+    cache = ArtifactCache(data_dir / "interim" / "cache")
+    store_path = data_dir / "processed" / "team_features.npz"
+    state_path = data_dir / "interim" / "season_results.npz"
+
+    if args.command == "seed":
+        store, state, meta = seed(args.season, data_dir, cache)
+    else:
+        store, state = TeamFeatureStore.load(store_path), SeasonState.load(state_path)
+        meta = TeamFeatureStore.read_meta(store_path)
+    if args.command == "update":
+        update_store(store, state, read_table(Path(args.path).resolve()))
+    if args.command != "check":
+        store.save(store_path, meta)
+        state.save(state_path)
+    if (args.command == "check" or getattr(args, "check", False)) and not check(store, state, data_dir, cache):
+        raise SystemExit(1)
+    return store
+
+
+if __name__ == "__main__":
+    log_fmt = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    logging.basicConfig(level=logging.INFO, format=log_fmt)
+    main()
@@ -0,0 +1,264 @@
+"""Opponent-adjusted efficiency and tempo ratings from the game results.
+
+A built-in replacement for the scraped kenpom AdjO/AdjD/AdjEM/AdjT columns,
+computed from the regular season rows of prepare_data only, as of any day,
+so it neither needs the network and name join nor leaks the tournament.
+
+For every game both teams' offensive ratings (points per 100 possessions)
+are modelled as
+
+    OffRtg(team vs opp) = mu + off[team] + def[opp] + home * location
+
+and the game's possessions as ``tau + pace[team] + pace[opp]``. Both are
+ridge regularized least squares problems over a sparse game x team design
+matrix. They are solved through their normal equations (a few hundred
+unknowns per season) with Jacobi-preconditioned conjugate gradients. When a
+season is rated as of several days, each day starts from the previous
+day's solution and only needs a few iterations.
+
+Ratings are for a neutral court: AdjOE = mu + off, AdjDE = mu + def (points
+allowed per 100 possessions, lower is better), AdjEffMargin = AdjOE - AdjDE
+and AdjTempo = tau + pace.
+"""
+import logging
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+logger = logging.getLogger(__name__)
+
+RIDGE = 2.0
+RATING_COLUMNS = ['AdjOE', 'AdjDE', 'AdjEffMargin', 'AdjTempo']
+
+
+def conjugate_gradient(N, b, x0=None, tol=1e-6, maxiter=None):
+    """Solves N x = b for a sparse symmetric positive definite N.
+
+    Jacobi preconditioned; stops when ||b - N x|| <= tol ||b||.
+
+    Returns
+    -------
+    x, number of iterations
+    """
+    x = np.zeros(len(b)) if x0 is None else np.array(x0, dtype=np.float64)
+    inv_diag = 1.0 / N.diagonal()
+    r = b - N @ x
+    z = inv_diag * r
+    p = z.copy()
+    rz = r @ z
+    stop = tol * max(np.linalg.norm(b), 1e-300)
+    maxiter = 10 * len(b) if maxiter is None else maxiter
+    for it in range(maxiter):
+        if np.linalg.norm(r) <= stop:
+            return x, it
+        Np = N @ p
+        alpha = rz / (p @ Np)
+        x += alpha * p
+        r -= alpha * Np
+        z = inv_diag * r
+        rz, rz_old = r @ z, rz
+        p = z + (rz / rz_old) * p
+    return x, maxiter
+
+
+def season_games(regular_data):
+    """One row per game from the doubled prepare_data rows (the winner's view).
+
+    The winner's row has the true location (1 home, -1 away, 0 neutral); the
+    loser's view is at -location.
+
+    Returns
+    -------
+    dict of arrays sorted by Season and DayNum: Season, DayNum, W, L
+    (TeamIDs), location, Margin (points), W_OffRtg, L_OffRtg, Pos
+    """
+    won = regular_data['T1_PointDiff'].to_numpy() > 0
+    games = regular_data.loc[won]
+    order = np.lexsort((games['DayNum'].to_numpy(), games['Season'].to_numpy()))
+    return {
+        'Season': games['Season'].to_numpy().astype(np.int64)[order],
+        'DayNum': games['DayNum'].to_numpy().astype(np.int64)[order],
+        'W': games['T1_TeamID'].to_numpy().astype(np.int64)[order],
+        'L': games['T2_TeamID'].to_numpy().astype(np.int64)[order],
+        'location': games['location'].to_numpy().astype(np.float64)[order],
+        'Margin': games['T1_PointDiff'].to_numpy(dtype=np.float64)[order],
+        'W_OffRtg': games['T1_OffRtg'].to_numpy(dtype=np.float64)[order],
+        'L_OffRtg': games['T2_OffRtg'].to_numpy(dtype=np.float64)[order],
+        'Pos': games['Pos'].to_numpy(dtype=np.float64)[order],
+    }
+
+
+class _NormalEquations:
+    """Ridge normal equations of a growing prefix of observations.
+
+    Every observation (row of the design matrix) adds the outer product of
+    its few non-zeros to N = A'A and its value to A'y. The sparsity pattern
+    of N over the whole season is fixed up front, so extending the prefix
+    only adds the new observations' products to the stored values and to
+    the running A'y and A'1.
+
+    Parameters
+    ----------
+    cols, vals : (n_obs, width) column indices and values of the non-zeros
+    y : (n_obs,) observed values, NaN for observations to leave out
+    n_unknowns : number of columns of the design matrix
+    ridge : diagonal penalty
+    """
+
+    def __init__(self, cols, vals, y, n_unknowns, ridge):
+        n = n_unknowns
+        valid = np.isfinite(y)
+        vals = np.where(valid[:, None], vals, 0.0)
+        width = cols.shape[1]
+        keys = (np.repeat(cols, width, axis=1) * n + np.tile(cols, (1, width))).ravel()
+        diagonal = np.arange(n) * (n + 1)
+        pattern, position = np.unique(np.concatenate([keys, diagonal]), return_inverse=True)
+        self.position = position[:len(keys)]
+        self.products = (vals[:, :, None] * vals[:, None, :]).ravel()
+        self.indices = pattern % n
+        self.indptr = np.concatenate([[0], np.cumsum(np.bincount(pattern // n, minlength=n))])
+        self.ridge = np.zeros(len(pattern))
+        self.ridge[np.searchsorted(pattern, diagonal)] = ridge
+
+        self.obs_cols, self.obs_vals = cols, vals
+        self.y = np.where(valid, y, 0.0)
+        self.valid = valid
+        self.n = n
+        self.x = None
+        self.reset()
+
+    def reset(self):
+        self.k = 0
+        self.data = np.zeros(len(self.indices))
+        self.Aty = np.zeros(self.n)
+        self.At1 = np.zeros(self.n)
+        self.sum_y = 0.0
+        self.count = 0
+
+    def solve(self, k):
+        """Ridge solution for the first k observations, warm started from the last one.
+
+        The observations are centered on their mean first, which is returned.
+        """
+        if k < self.k:
+            self.reset()
+        width = self.obs_cols.shape[1]
+        products = slice(self.k * width ** 2, k * width ** 2)
+        self.data += np.bincount(self.position[products], self.products[products],
+                                 minlength=len(self.data))
+        new = slice(self.k, k)
+        cols = self.obs_cols[new].ravel()
+        vals = self.obs_vals[new]
+        self.Aty += np.bincount(cols, (vals * self.y[new, None]).ravel(), minlength=self.n)
+        self.At1 += np.bincount(cols, vals.ravel(), minlength=self.n)
+        self.sum_y += self.y[new].sum()
+        self.count += self.valid[new].sum()
+        self.k = k
+
+        N = sparse.csr_matrix((self.data + self.ridge, self.indices, self.indptr), shape=(self.n, self.n))
+        center = self.sum_y / max(self.count, 1)
+        self.x, iterations = conjugate_gradient(N, self.Aty - center * self.At1, self.x)
+        return center, self.x, iterations
+
+
+class SeasonRatings:
+    """Rating systems of one season, solvable as of any day.
+
+    Solving for increasing days reuses the previous normal equations and
+    solution; an earlier day starts over.
+
+    Parameters
+    ----------
+    games : season_games arrays of a single season
+    ridge : penalty on every rating, in games: a team with few games is
+        pulled towards the average
+    """
+
+    def __init__(self, games, ridge=RIDGE):
+        self.days = games['DayNum']
+        self.team_ids, idx = np.unique(np.concatenate([games['W'], games['L']]), return_inverse=True)
+        n, m = len(self.team_ids), len(self.days)
+        w, l = idx[:m], idx[m:]
+
+        # offense: observations 2g (winner's offense) and 2g+1 (loser's),
+        # unknowns off[0:n], def[n:2n], home
+        cols = np.column_stack([np.column_stack([w, l]).ravel(),
+                                n + np.column_stack([l, w]).ravel(),
+                                np.full(2 * m, 2 * n)])
+        loc = np.column_stack([games['location'], -games['location']]).ravel()
+        vals = np.column_stack([np.ones(2 * m), np.ones(2 * m), loc])
+        y = np.column_stack([games['W_OffRtg'], games['L_OffRtg']]).ravel()
+        self.offense = _NormalEquations(cols, vals, y, 2 * n + 1, ridge)
+
+        # tempo: one observation per game, pace[w] + pace[l]
+        self.tempo = _NormalEquations(np.column_stack([w, l]), np.ones((m, 2)), games['Pos'], n, ridge)
+        self.iterations = 0
+
+    def solve(self, asof):
+        """Ratings from the games before day asof.
+
+        Returns
+        -------
+        DataFrame with TeamID and RATING_COLUMNS for the teams that played
+        """
+        k = np.searchsorted(self.days, asof)
+        n = len(self.team_ids)
+        mu, x_off, it_off = self.offense.solve(2 * k)
+        tau, x_pace, it_pace = self.tempo.solve(k)
+        self.iterations += it_off + it_pace
+
+        played = np.bincount(self.tempo.obs_cols[:k].ravel(), minlength=n) > 0
+        off = mu + x_off[:n]
+        dfn = mu + x_off[n:2 * n]
+        out = pd.DataFrame({
+            'TeamID': self.team_ids,
+            'AdjOE': off,
+            'AdjDE': dfn,
+            'AdjEffMargin': off - dfn,
+            'AdjTempo': tau + x_pace,
+        })
+        return out.loc[played].reset_index(drop=True)
+
+
+def ratings_history(regular_data, asof_days=(133,), ridge=RIDGE):
+    """Ratings of every team-season as of each day in asof_days.
+
+    Consecutive days of a season are warm started from each other.
+
+    Parameters
+    ----------
+    regular_data : output of prepare_data
+    asof_days : DayNums; only games before the day are used
+
+    Returns
+    -------
+    DataFrame with Season, DayNum (the as-of day), TeamID and RATING_COLUMNS
+    """
+    games = season_games(regular_data)
+    bounds = np.flatnonzero(np.diff(games['Season'])) + 1
+    starts = np.concatenate([[0], bounds])
+    stops = np.concatenate([bounds, [len(games['Season'])]])
+    frames = []
+    iterations = 0
+    for start, stop in zip(starts, stops):
+        season = SeasonRatings({k: v[start:stop] for k, v in games.items()}, ridge)
+        for asof in sorted(asof_days):
+            ratings = season.solve(asof)
+            ratings.insert(0, 'Season', games['Season'][start])
+            ratings.insert(1, 'DayNum', asof)
+            frames.append(ratings)
+        iterations += season.iterations
+    logger.debug(f"Rated {len(starts)} seasons x {len(asof_days)} days in {iterations} CG iterations")
+    return pd.concat(frames, ignore_index=True)
+
+
+def efficiency_ratings(regular_data, asof=133, ridge=RIDGE):
+    """Adjusted efficiency and tempo per team-season as of a day (default:
+    the end of the regular season), as T1_/T2_ frames like clean_kp_data.
+    """
+    logger.info("Calculating efficiency ratings")
+    ratings = ratings_history(regular_data, [asof], ridge).drop(columns='DayNum')
+    T1 = ratings.rename(columns={c: "T1_" + c for c in ratings.columns if c != 'Season'})
+    T2 = ratings.rename(columns={c: "T2_" + c for c in ratings.columns if c != 'Season'})
+    return T1, T2
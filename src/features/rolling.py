@@ -0,0 +1,170 @@
+"""As-of rolling window features built on per-team cumulative sums.
+
+Game rows (the doubled T1/T2 table from prepare_data) are sorted once by
+(Season, TeamID, DayNum). With per-column cumulative sums and a dense
+(team-season, day) -> row position table, the sum over any window ending at
+any as-of day is two lookups and a subtraction, whatever the window.
+
+Windows are written as strings:
+
+- ``"14d"`` : games in the 14 days before the as-of day
+- ``"5g"`` : the last 5 games before the as-of day
+- ``"season"`` : every game of the season before the as-of day
+
+The as-of day itself is excluded, so features for a game on DayNum d only
+use games played before d.
+"""
+import re
+
+import numpy as np
+import pandas as pd
+
+from src.features.aggregates import sorted_columns, team_segments
+
+
+def _stat_name(col):
+    """T1_PointDiff -> PointDiff, T2_FGM -> opponent_FGM."""
+    if col.startswith("T1_"):
+        return col[3:]
+    if col.startswith("T2_"):
+        return "opponent_" + col[3:]
+    return col
+
+
+def parse_window(window):
+    """Returns (kind, size) for "14d", "5g" or "season"."""
+    if window == "season":
+        return "season", None
+    match = re.fullmatch(r"(\d+)([dg])", window)
+    if match is None:
+        raise ValueError(f"Unknown window: {window}")
+    return {"d": "days", "g": "games"}[match.group(2)], int(match.group(1))
+
+
+class RollingWindows:
+    """Window sums and means of game stats per team, as of any day.
+
+    Parameters
+    ----------
+    regular_data : output of prepare_data
+    stats : columns to aggregate. "win_ratio" is the T1 win indicator.
+    """
+
+    def __init__(self, regular_data, stats=("win_ratio", "T1_PointDiff")):
+        self.stats = list(stats)
+        self.names = [_stat_name(c) for c in self.stats]
+
+        data = regular_data
+        if "win_ratio" in self.stats:
+            data = data.assign(win_ratio=(data["T1_PointDiff"].to_numpy() > 0).astype(np.float64))
+
+        seasons = data["Season"].to_numpy().astype(np.int64)
+        team_ids = data["T1_TeamID"].to_numpy().astype(np.int64)
+        days = data["DayNum"].to_numpy().astype(np.int64)
+        order, self.starts, counts = team_segments(seasons, team_ids, days)
+        n_segments = len(self.starts)
+        segment_of_row = np.repeat(np.arange(n_segments), counts)
+
+        # dense (season, team) -> segment lookup:
+        self.seg_season = seasons[order][self.starts]
+        self.seg_team = team_ids[order][self.starts]
+        self.season0, self.team0 = self.seg_season.min(), self.seg_team.min()
+        self.lookup = np.full((self.seg_season.max() - self.season0 + 1,
+                               self.seg_team.max() - self.team0 + 1), -1, dtype=np.int64)
+        self.lookup[self.seg_season - self.season0, self.seg_team - self.team0] = np.arange(n_segments)
+
+        # before[seg, d] = rows of the segment with DayNum < d:
+        self.max_day = days.max() + 1
+        before = np.zeros((n_segments, self.max_day + 1), dtype=np.int64)
+        np.add.at(before, (segment_of_row, days[order] + 1), 1)
+        self.before = np.cumsum(before, axis=1)
+
+        # cumulative sums with a leading zero row, NaNs counted separately:
+        values = sorted_columns(data, self.stats, order)
+        valid = ~np.isnan(values)
+        zero = np.zeros((1, len(self.stats)))
+        self.csum = np.concatenate([zero, np.cumsum(np.where(valid, values, 0.0), axis=0)])
+        self.cvalid = np.concatenate([zero, np.cumsum(valid, axis=0)])
+
+    def _segments(self, seasons, team_ids):
+        seasons = np.asarray(seasons, dtype=np.int64) - self.season0
+        team_ids = np.asarray(team_ids, dtype=np.int64) - self.team0
+        inside = (seasons >= 0) & (seasons < self.lookup.shape[0]) & \
+                 (team_ids >= 0) & (team_ids < self.lookup.shape[1])
+        seg = np.full(seasons.shape, -1, dtype=np.int64)
+        seg[inside] = self.lookup[seasons[inside], team_ids[inside]]
+        return seg
+
+    def window_sums(self, seasons, team_ids, asof, window):
+        """Sums and non-NaN counts of each stat over a window.
+
+        Parameters
+        ----------
+        seasons, team_ids, asof : arrays (or scalars for asof) of the queries
+        window : "14d", "5g" or "season"
+
+        Returns
+        -------
+        sums : (n_queries, n_stats) array
+        counts : (n_queries, n_stats) array, 0 where the team has no games
+        """
+        kind, size = parse_window(window)
+        seg = self._segments(seasons, team_ids)
+        found = seg >= 0
+        seg = np.where(found, seg, 0)
+        asof = np.broadcast_to(np.asarray(asof, dtype=np.int64), seg.shape)
+
+        start = self.starts[seg]
+        end = start + self.before[seg, np.clip(asof, 0, self.max_day)]
+        if kind == "days":
+            begin = start + self.before[seg, np.clip(asof - size, 0, self.max_day)]
+        elif kind == "games":
+            begin = np.maximum(start, end - size)
+        else:
+            begin = start
+        end = np.where(found, end, begin)
+
+        sums = self.csum[end] - self.csum[begin]
+        counts = self.cvalid[end] - self.cvalid[begin]
+        return sums, counts
+
+    def window_means(self, seasons, team_ids, asof, window):
+        """Means of each stat over a window, NaN where there are no games."""
+        sums, counts = self.window_sums(seasons, team_ids, asof, window)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(counts > 0, sums / counts, np.nan)
+
+    def team_features(self, asof, windows, prefix="T1_"):
+        """Window means for every team-season as of one day.
+
+        Columns are named <prefix><stat>_<window>, e.g. T1_win_ratio_14d.
+        A `games_<window>` count column is added per window.
+        """
+        out = pd.DataFrame({"Season": self.seg_season,
+                            prefix + "TeamID": self.seg_team})
+        for window in windows:
+            sums, counts = self.window_sums(self.seg_season, self.seg_team, asof, window)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                means = np.where(counts > 0, sums / counts, np.nan)
+            for j, name in enumerate(self.names):
+                out[f"{prefix}{name}_{window}"] = means[:, j]
+            out[f"{prefix}games_{window}"] = counts.max(axis=1, initial=0).astype(np.int64)
+        return out
+
+    def game_features(self, games, windows):
+        """T1_/T2_ window means for each game as of that game's DayNum.
+
+        Parameters
+        ----------
+        games : DataFrame with Season, DayNum, T1_TeamID and T2_TeamID
+        windows : list of window strings
+        """
+        out = {}
+        for prefix in ["T1_", "T2_"]:
+            for window in windows:
+                means = self.window_means(games["Season"].to_numpy(),
+                                          games[prefix + "TeamID"].to_numpy(),
+                                          games["DayNum"].to_numpy(), window)
+                for j, name in enumerate(self.names):
+                    out[f"{prefix}{name}_{window}"] = means[:, j]
+        return pd.DataFrame(out, index=games.index)
@@ -0,0 +1,245 @@
+"""Season-sharded, out-of-core build of tourney_data.
+
+The game files are streamed in chunks and split by Season into Feather
+partitions (``data/interim/partitions/<table>/Season=<season>/part-*.feather``).
+Every season is then built on its own in a process pool: prepare_data
+(advanced stats), calc_season_statistics, win_ratio_14_days,
+calc_seed_diff and efficiency_ratings on that season's rows only, attached to the season's
+tourney games. The outputs are written as partitions too
+(``data/interim/features/<table>/Season=<season>.feather`` and
+``data/processed/tourney_data/Season=<season>.feather``), so memory is
+bounded by one chunk in the split and by one season per worker in the
+build, whatever the length of the history.
+
+All feature functions only look at rows of one (Season, TeamID), or of
+one Season for the ratings, so the sharded build gives the same
+tourney_data as build_features.main.
+
+    python -m src.features.sharded --jobs 4
+"""
+import argparse
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import re
+import shutil
+
+import pandas as pd
+
+from src import instrument
+from src.data.storage import compact_dtypes, read_feather, read_table, write_processed, write_table
+from src.features.build_features import (attach_features, calc_season_statistics, calc_seed_diff,
+                                         clean_kp_data, FEATURE_BLOCKS, prepare_data, win_ratio_14_days)
+from src.features.ratings import efficiency_ratings
+
+logger = logging.getLogger(__name__)
+
+CHUNK_ROWS = 200000
+# T1_ columns of clean_kp_data, for seasons without kenpom rows:
+KP_COLUMNS = ['T1_Rk', 'T1_AdjEM', 'T1_AdjO', 'T1_AdjD', 'T1_AdjT', 'T1_Luck',
+              'T1_Strength of Schedule_AdjEM', 'T1_Strength of Schedule_OppO',
+              'T1_Strength of Schedule_OppD', 'T1_NCSOS_AdjEM']
+
+
+def partition_csv(csv_path, out_dir, chunksize=CHUNK_ROWS, **read_kwargs):
+    """Splits a csv by Season into Feather partitions, one chunk at a time.
+
+    Each chunk adds a ``part-<chunk>.feather`` to the ``Season=<season>``
+    folders of the seasons it holds; out_dir is cleared first.
+
+    Returns
+    -------
+    sorted list of seasons
+    """
+    out_dir = Path(out_dir)
+    if out_dir.exists():
+        shutil.rmtree(out_dir)
+    seasons = set()
+    with instrument.stage("partition_csv", table=Path(csv_path).stem) as rec:
+        for k, chunk in enumerate(pd.read_csv(csv_path, chunksize=chunksize, **read_kwargs)):
+            rec.add(rows_in=len(chunk))
+            for season, rows in chunk.groupby('Season', sort=False):
+                write_table(rows, out_dir / f"Season={season}" / f"part-{k:05d}.feather")
+                seasons.add(int(season))
+        rec.set(bytes_read=instrument.file_size(csv_path))
+    return sorted(seasons)
+
+
+def write_partitions(df, out_dir, compact=False):
+    """Writes a frame as one ``Season=<season>.feather`` per season (out_dir is cleared)."""
+    out_dir = Path(out_dir)
+    if out_dir.exists():
+        shutil.rmtree(out_dir)
+    out_dir.mkdir(parents=True)
+    for season, rows in df.groupby('Season', sort=True):
+        write_table(rows, out_dir / f"Season={season}.feather", compact=compact)
+    return out_dir
+
+
+def season_path(table_dir, season):
+    """Partition of a season: the Season=<season> folder or file, None if missing."""
+    for path in (Path(table_dir) / f"Season={season}", Path(table_dir) / f"Season={season}.feather"):
+        if path.exists():
+            return path
+    return None
+
+
+def read_season(table_dir, season, columns=None):
+    """All rows of a season from a partitioned table, None if it has none.
+
+    Chunks are read in part order, which keeps the row order of the csv.
+    """
+    path = season_path(table_dir, season)
+    if path is None:
+        return None
+    if path.is_dir():
+        parts = [read_feather(p, columns=columns, memory_map=False) for p in sorted(path.glob("part-*.feather"))]
+        # a season split over chunks can have different compact dtypes per chunk:
+        return compact_dtypes(pd.concat(parts, ignore_index=True))
+    return read_feather(path, columns=columns, memory_map=False)
+
+
+def read_partitions(table_dir, seasons=None, columns=None):
+    """A partitioned table, all seasons (or the given ones) in season order."""
+    table_dir = Path(table_dir)
+    if seasons is None:
+        seasons = sorted(int(re.search(r"Season=(\d+)", p.name).group(1))
+                         for p in table_dir.glob("Season=*"))
+    frames = [read_season(table_dir, s, columns) for s in seasons]
+    return pd.concat([f for f in frames if f is not None], ignore_index=True)
+
+
+def _empty_pair(T1_columns):
+    """T1_/T2_ frames without rows, for a block a season has no data for."""
+    T1 = pd.DataFrame(columns=T1_columns)
+    T2 = T1.rename(columns=lambda c: c.replace("T1_", "T2_"))
+    return T1, T2
+
+
+def _season_pair(parts_dir, name, season, T1_columns):
+    T1 = read_season(parts_dir / f"{name}_T1", season)
+    if T1 is None:
+        return _empty_pair(T1_columns)
+    return T1, read_season(parts_dir / f"{name}_T2", season)
+
+
+def build_season(season, parts_dir, features_dir, out_dir):
+    """Builds the features and tourney_data of one season from its partitions.
+
+    Parameters
+    ----------
+    season : int
+    parts_dir : folder of the partitioned inputs (regular, tourney, seeds,
+        kp_T1, kp_T2)
+    features_dir : where the season's team feature partitions are written
+    out_dir : where the season's tourney_data partition is written
+
+    Returns
+    -------
+    (season, regular season rows, tourney rows)
+    """
+    parts_dir, features_dir = Path(parts_dir), Path(features_dir)
+    with instrument.stage("build_season", season=season) as rec:
+        regular = read_season(parts_dir / "regular", season)
+        regular_data = prepare_data(regular)
+        del regular
+        blocks = {
+            "season_stats": calc_season_statistics(regular_data),
+            "win_ratio": win_ratio_14_days(regular_data),
+            "ratings": efficiency_ratings(regular_data),
+        }
+        del regular_data
+        seeds = read_season(parts_dir / "seeds", season)
+        blocks["seeds"] = calc_seed_diff(seeds) if seeds is not None \
+            else _empty_pair(['Season', 'T1_seed', 'T1_TeamID'])
+        blocks["kp"] = _season_pair(parts_dir, "kp", season, ['Season', 'T1_TeamID'] + KP_COLUMNS)
+
+        for name, (T1, T2) in blocks.items():
+            if len(T1):
+                write_table(T1, features_dir / f"{name}_T1" / f"Season={season}.feather", compact=False)
+                write_table(T2, features_dir / f"{name}_T2" / f"Season={season}.feather", compact=False)
+
+        n_regular = len(blocks["season_stats"][0])
+        tourney = read_season(parts_dir / "tourney", season)
+        n_tourney = 0
+        if tourney is not None:
+            frames = [f for name in FEATURE_BLOCKS for f in blocks[name]]
+            tourney_data = attach_features(prepare_data(tourney), *frames)
+            # full precision, the combined tourney_data is written by write_processed:
+            write_table(tourney_data, Path(out_dir) / f"Season={season}.feather", compact=False)
+            n_tourney = len(tourney_data)
+        rec.set(rows_out=n_tourney)
+    return season, n_regular, n_tourney
+
+
+def build(data_dir, n_jobs=None, chunksize=CHUNK_ROWS):
+    """Sharded build of data/processed/tourney_data.
+
+    Writes the season partitions and, since tourney_data is small, the
+    combined data/processed/tourney_data.feather and .csv that the models read.
+
+    Parameters
+    ----------
+    data_dir : Path to the data folder
+    n_jobs : worker processes, default one per CPU; 1 builds in-process
+    chunksize : csv rows read at a time
+    """
+    data_dir = Path(data_dir)
+    external = data_dir / "external"
+    parts_dir = data_dir / "interim" / "partitions"
+    features_dir = data_dir / "interim" / "features"
+    out_dir = data_dir / "processed" / "tourney_data"
+
+    # split the game files by season:
+    seasons = partition_csv(external / "MRegularSeasonDetailedResults.csv", parts_dir / "regular", chunksize)
+    partition_csv(external / "MNCAATourneyDetailedResults.csv", parts_dir / "tourney", chunksize)
+    partition_csv(external / "MNCAATourneySeeds.csv", parts_dir / "seeds", chunksize)
+
+    # kenpom is a few thousand rows, and the name index is shared, so it is
+    # cleaned once and split afterwards:
+    with instrument.stage("clean_kp_data"):
+        kp_T1, kp_T2 = clean_kp_data(read_table(data_dir / "raw" / "kenpom.csv"),
+                                     read_table(external / "MTeamSpellings.csv", encoding="ISO-8859-1"),
+                                     read_table(external / "MTeams.csv"),
+                                     index_path=data_dir / "interim" / "team_names.json")
+    write_partitions(kp_T1, parts_dir / "kp_T1")
+    write_partitions(kp_T2, parts_dir / "kp_T2")
+
+    for path in (features_dir, out_dir):
+        if path.exists():
+            shutil.rmtree(path)
+    out_dir.mkdir(parents=True)
+
+    if n_jobs is None or n_jobs < 1:
+        n_jobs = os.cpu_count() or 1
+    n_jobs = min(n_jobs, len(seasons))
+    args = [seasons, [parts_dir] * len(seasons), [features_dir] * len(seasons), [out_dir] * len(seasons)]
+    if n_jobs == 1:
+        results = list(map(build_season, *args))
+    else:
+        with ProcessPoolExecutor(n_jobs) as pool:
+            results = list(pool.map(build_season, *args))
+    for season, n_regular, n_tourney in results:
+        logger.debug(f"Season {season}: {n_regular} teams, {n_tourney} tourney rows")
+
+    built = [season for season, _, n_tourney in results if n_tourney]
+    tourney_data = read_partitions(out_dir, built)
+    write_processed(tourney_data, data_dir / "processed" / "tourney_data")
+    tourney_data.to_csv(data_dir / "processed" / "tourney_data.csv", index=False)
+    logger.info(f"Built {len(built)} seasons, {len(tourney_data)} tourney rows")
+    return tourney_data
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Season-sharded build of tourney_data.")
+    parser.add_argument("--jobs", type=int, default=None, help="worker processes")
+    parser.add_argument("--chunksize", type=int, default=CHUNK_ROWS, help="csv rows read at a time")
+    args = parser.parse_args(argv)
+    return build(Path().resolve() / "data", n_jobs=args.jobs, chunksize=args.chunksize)
+
+
+if __name__ == "__main__":
+    log_fmt = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    logging.basicConfig(level=logging.INFO, format=log_fmt)
+    main()
@@ -0,0 +1,295 @@
+"""Opt-in per-stage instrumentation of the data pipeline.
+
+Code marks its stages with
+
+    with instrument.stage("prepare_data") as rec:
+        out = prepare_data(df)
+        rec.set(rows_in=len(df), rows_out=len(out))
+
+and a run is traced with
+
+    with instrument.tracing("reports/trace.json"):
+        build_features.main()
+
+Each stage records wall time, CPU time, the process peak RSS when it ended
+and how much the stage raised it, rows in/out and bytes read/written, plus
+any extra attributes. Stages nest (a stage's parent is the innermost open
+stage of its thread), so the summary table can be read as a tree. The trace
+is written as JSON and the summary is logged.
+
+Stages run in worker processes are traced there and merged into the
+parent's trace: the worker wraps its task in ``tracing(summary=False)``,
+returns ``trace.export()`` with the result, and the parent passes it to
+``merge``, which hangs the worker's stages under the parent's open stage.
+
+Without an active trace ``stage`` returns a shared no-op recorder, so
+instrumented code costs one global lookup per stage.
+"""
+from contextlib import contextmanager
+import json
+import logging
+from pathlib import Path
+import sys
+import threading
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+_trace = None
+
+
+def peak_rss():
+    """Peak resident set size of the process in bytes, None where unknown."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS:
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def rows(value):
+    """Row count of a DataFrame or a tuple of DataFrames, None otherwise."""
+    if isinstance(value, tuple):
+        counts = [rows(v) for v in value]
+        return None if None in counts else sum(counts)
+    return len(value) if hasattr(value, "columns") else None
+
+
+def file_size(path):
+    path = Path(path)
+    return path.stat().st_size if path.exists() else 0
+
+
+class _NullRecord:
+    """Recorder used when tracing is off; every method does nothing."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **values):
+        pass
+
+    def add(self, **values):
+        pass
+
+
+_NULL = _NullRecord()
+
+
+class StageRecord:
+    """Measurements of one stage, filled in by the ``with`` block."""
+
+    def __init__(self, trace, name, attrs, parent=None):
+        self.trace = trace
+        self.name = name
+        self.values = {"rows_in": None, "rows_out": None, "bytes_read": 0, "bytes_written": 0}
+        self.values.update(attrs)
+        self._parent = parent
+        self.parent = None
+        self.depth = 0
+
+    def set(self, **values):
+        """Sets measurements or attributes, e.g. rows_in=len(df)."""
+        self.values.update(values)
+
+    def add(self, **values):
+        """Adds to counters, e.g. bytes_read=n; None counts as 0."""
+        for key, value in values.items():
+            if value is not None:
+                self.values[key] = (self.values.get(key) or 0) + value
+
+    def __enter__(self):
+        stack = self.trace._stack()
+        parent = self._parent if isinstance(self._parent, StageRecord) else (stack[-1] if stack else None)
+        if parent is not None:
+            self.parent = parent.id
+            self.depth = parent.depth + 1
+        self.id = self.trace._next_id()
+        stack.append(self)
+        # a stage on a worker thread shares the process CPU clock with the
+        # other workers, so it is charged its own thread's CPU time:
+        self._main = threading.current_thread() is threading.main_thread()
+        self._cpu_clock = time.process_time if self._main else time.thread_time
+        self._rss0 = peak_rss()
+        self._start = time.perf_counter()
+        self._cpu0 = self._cpu_clock()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        wall = time.perf_counter() - self._start
+        cpu = self._cpu_clock() - self._cpu0
+        rss = peak_rss()
+        self.trace._stack().pop()
+        self.trace._add({
+            "id": self.id,
+            "parent": self.parent,
+            "depth": self.depth,
+            "stage": self.name,
+            "thread": threading.current_thread().name,
+            "start": self._start - self.trace.start,
+            "wall": wall,
+            "cpu": cpu,
+            "peak_rss": rss,
+            "rss_growth": None if rss is None else rss - self._rss0,
+            "error": None if exc_type is None else exc_type.__name__,
+            **self.values,
+        })
+        return False
+
+
+class Trace:
+    """Stage records of one run."""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.records = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._ids = 0
+
+    def _stack(self):
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        return self._local.stack
+
+    def _next_id(self):
+        with self._lock:
+            self._ids += 1
+            return self._ids
+
+    def _add(self, record):
+        with self._lock:
+            self.records.append(record)
+
+    def export(self):
+        """The records and the trace's start, picklable for a parent process's merge."""
+        with self._lock:
+            return {"start": self.start, "records": list(self.records)}
+
+    def merge(self, exported, parent=None):
+        """Adds the records of another trace (from export) under parent.
+
+        Start times are moved onto this trace's clock (perf_counter is
+        system-wide, so this holds across processes) and ids renumbered.
+        """
+        offset = exported["start"] - self.start
+        ids = {None: None if parent is None else parent.id}
+        depth = 0 if parent is None else parent.depth + 1
+        # parents start before their children, so their new ids are known first:
+        for record in sorted(exported["records"], key=lambda r: r["start"]):
+            ids[record["id"]] = self._next_id()
+            self._add(dict(record, id=ids[record["id"]], parent=ids[record["parent"]],
+                           depth=record["depth"] + depth, start=record["start"] + offset))
+
+    def ordered(self):
+        """Records in start order."""
+        return sorted(self.records, key=lambda r: r["start"])
+
+    def write(self, path):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps({"wall": time.perf_counter() - self.start,
+                                    "stages": self.ordered()}, indent=1, default=str))
+        return path
+
+    def summary(self, max_depth=None):
+        """Fixed width table of the stages, children indented under parents."""
+        lines = [f"{'stage':<36}{'wall s':>9}{'cpu s':>9}{'peak MiB':>10}{'rows in':>10}"
+                 f"{'rows out':>10}{'read MiB':>10}{'write MiB':>10}"]
+
+        def cell(value, scale=1, decimals=1):
+            return f"{'-':>10}" if value is None else f"{value / scale:10.{decimals}f}"
+
+        children = {}
+        for r in self.ordered():
+            children.setdefault(r["parent"], []).append(r)
+
+        def walk(parent, depth):
+            for r in children.get(parent, []):
+                if max_depth is not None and depth > max_depth:
+                    continue
+                name = "  " * depth + r["stage"]
+                if "season" in r:
+                    name += f" {r['season']}"
+                lines.append(f"{name[:36]:<36}{r['wall']:9.3f}{r['cpu']:9.3f}"
+                             f"{cell(r['peak_rss'], 2**20)}{cell(r['rows_in'], 1, 0)}"
+                             f"{cell(r['rows_out'], 1, 0)}{cell(r['bytes_read'], 2**20, 2)}"
+                             f"{cell(r['bytes_written'], 2**20, 2)}")
+                walk(r["id"], depth + 1)
+
+        walk(None, 0)
+        return "\n".join(lines)
+
+
+def enabled():
+    return _trace is not None
+
+
+def current():
+    """Innermost open stage of this thread (a no-op recorder if there is none)."""
+    trace = _trace
+    if trace is None or not trace._stack():
+        return _NULL
+    return trace._stack()[-1]
+
+
+def stage(name, parent=None, **attrs):
+    """Context manager recording a stage; a no-op unless tracing is on.
+
+    Parameters
+    ----------
+    name : stage name
+    parent : record from current(), for stages run on worker threads
+        (by default the parent is the innermost open stage of the thread)
+    attrs : extra attributes stored with the record, e.g. season=2021
+    """
+    trace = _trace
+    if trace is None:
+        return _NULL
+    return StageRecord(trace, name, attrs, parent)
+
+
+def merge(exported, parent=None):
+    """Adds the stages of a worker process's trace to the active trace.
+
+    Parameters
+    ----------
+    exported : Trace.export() of the worker, None does nothing
+    parent : record the worker's stages go under, default the innermost
+        open stage of this thread
+    """
+    trace = _trace
+    if trace is None or exported is None:
+        return
+    parent = current() if parent is None else parent
+    trace.merge(exported, parent if isinstance(parent, StageRecord) else None)
+
+
+@contextmanager
+def tracing(path=None, summary=True):
+    """Traces the stages run inside the block.
+
+    Writes the JSON trace to path (if given) and logs the summary table
+    (unless summary is False, e.g. in a worker whose trace is merged).
+    Yields the Trace.
+    """
+    global _trace
+    previous, _trace = _trace, Trace()
+    trace = _trace
+    try:
+        yield trace
+    finally:
+        _trace = previous
+        if path is not None:
+            trace.write(path)
+            logger.info(f"Wrote pipeline trace to {path}")
+        if summary:
+            logger.info("Pipeline stages:\n" + trace.summary())
@@ -0,0 +1,141 @@
+"""Compact NumPy model artifacts.
+
+A trained model is stored as one ``.npz`` file: for every linear base model
+its scaler statistics, coefficients, intercept and feature columns, the
+same for the meta model of an ensemble, and the per-team feature vectors
+of the TeamFeatureStore that the features are built from. Loading is a
+single ``np.load`` and predicting is a few matrix products, so neither
+scikit-learn nor pandas is imported.
+
+Artifacts are written by predict_model.export_artifact.
+"""
+import numpy as np
+
+# how a model feature is built from the two teams' vectors:
+T1, T2, DIFF = 0, 1, 2
+
+_MODEL_KEYS = ["mean", "scale", "coef", "intercept", "columns"]
+
+
+def pipeline_arrays(pipe, mode, columns):
+    """Scaler statistics and coefficients of a fitted StandardScaler + linear pipeline.
+
+    Parameters
+    ----------
+    pipe : fitted Pipeline([('scaler', StandardScaler()), ('estimator', linear model)])
+    mode : "cls" (logistic, sigmoid of the linear score) or "reg" (clipped score)
+    columns : positions of the pipeline's input features in the artifact features
+    """
+    scaler, estimator = pipe.named_steps["scaler"], pipe.named_steps["estimator"]
+    if not hasattr(estimator, "coef_"):
+        raise TypeError(f"{estimator.__class__.__name__} is not a linear model")
+    scale = getattr(scaler, "scale_", None)
+    n = len(columns)
+    return {
+        "mean": np.asarray(scaler.mean_, dtype=np.float64),
+        "scale": np.ones(n) if scale is None else np.asarray(scale, dtype=np.float64),
+        "coef": np.asarray(estimator.coef_, dtype=np.float64).ravel(),
+        "intercept": np.float64(np.ravel(estimator.intercept_)[0]),
+        "columns": np.asarray(columns, dtype=np.int64),
+        "mode": mode,
+    }
+
+
+def write_artifact(path, features, base_models, meta, sources, team_vectors, season0, team0):
+    """Writes an artifact.
+
+    Parameters
+    ----------
+    path : output .npz file
+    features : model feature names; base model columns index into them
+    base_models : list of (name, pipeline_arrays dict)
+    meta : pipeline_arrays dict of the meta model (columns index the base
+        models), or None for a single model
+    sources : (side, col_a, col_b) int arrays, one entry per feature. side
+        is T1, T2 or DIFF (T1 col_a - T2 col_b)
+    team_vectors : (n_seasons, n_teams, n_columns) array, NaN where missing
+    season0, team0 : season and TeamID of row/column 0 of team_vectors
+    """
+    arrays = {
+        "features": np.asarray(features, dtype=str),
+        "names": np.asarray([name for name, _ in base_models], dtype=str),
+        "modes": np.asarray([m["mode"] for _, m in base_models], dtype=str),
+        "sources": np.vstack(sources).astype(np.int64),
+        "team_vectors": np.asarray(team_vectors, dtype=np.float64),
+        "origin": np.array([season0, team0], dtype=np.int64),
+    }
+    for i, (_, model) in enumerate(base_models):
+        for key in _MODEL_KEYS:
+            arrays[f"base{i}_{key}"] = model[key]
+    if meta is not None:
+        arrays["meta_mode"] = np.asarray(meta["mode"])
+        for key in _MODEL_KEYS:
+            arrays[f"meta_{key}"] = meta[key]
+    np.savez(path, **arrays)
+    return path
+
+
+def _predict(model, X):
+    z = ((X[:, model["columns"]] - model["mean"]) / model["scale"]) @ model["coef"] + model["intercept"]
+    if model["mode"] == "cls":
+        return 1.0 / (1.0 + np.exp(-z))
+    return np.clip(z, 0, 1)
+
+
+class ModelArtifact:
+    """A loaded artifact: P(T1 beats T2) for batches of matchups."""
+
+    def __init__(self, arrays):
+        self.features = [str(f) for f in arrays["features"]]
+        self.names = [str(n) for n in arrays["names"]]
+        self.base_models = []
+        for i, mode in enumerate(arrays["modes"]):
+            model = {key: arrays[f"base{i}_{key}"] for key in _MODEL_KEYS}
+            model["mode"] = str(mode)
+            self.base_models.append(model)
+        self.meta = None
+        if "meta_mode" in arrays:
+            self.meta = {key: arrays[f"meta_{key}"] for key in _MODEL_KEYS}
+            self.meta["mode"] = str(arrays["meta_mode"])
+        self.side, self.col_a, self.col_b = arrays["sources"]
+        self.team_vectors = arrays["team_vectors"]
+        self.season0, self.team0 = (int(v) for v in arrays["origin"])
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as f:
+            return cls({key: f[key] for key in f.files})
+
+    def predict_features(self, X):
+        """Predictions for a (n, n_features) matrix in self.features order."""
+        X = np.asarray(X, dtype=np.float64)
+        preds = np.column_stack([_predict(m, X) for m in self.base_models])
+        if self.meta is None:
+            return preds[:, 0]
+        return _predict(self.meta, preds)
+
+    def pair_features(self, seasons, T1_ids, T2_ids):
+        """Feature matrix of matchups, NaN for unknown team-seasons."""
+        s = np.asarray(seasons, dtype=np.int64) - self.season0
+        a = np.asarray(T1_ids, dtype=np.int64) - self.team0
+        b = np.asarray(T2_ids, dtype=np.int64) - self.team0
+        n_seasons, n_teams, _ = self.team_vectors.shape
+        known = (s >= 0) & (s < n_seasons) & (a >= 0) & (a < n_teams) & (b >= 0) & (b < n_teams)
+        s, a, b = np.where(known, s, 0), np.where(known, a, 0), np.where(known, b, 0)
+
+        T1_vectors = self.team_vectors[s, a]
+        T2_vectors = self.team_vectors[s, b]
+        X = np.where(self.side == T1, T1_vectors[:, self.col_a], T2_vectors[:, self.col_a])
+        diff = self.side == DIFF
+        X[:, diff] = T1_vectors[:, self.col_a[diff]] - T2_vectors[:, self.col_b[diff]]
+        X[~known] = np.nan
+        return X
+
+    def predict_pairs(self, seasons, T1_ids, T2_ids):
+        """P(T1 beats T2) per matchup, NaN where a feature is missing."""
+        return self.predict_features(self.pair_features(seasons, T1_ids, T2_ids))
+
+    def predict_ids(self, ids):
+        """P(T1 beats T2) for submission IDs like ``2021_1101_1104``."""
+        parts = np.array([i.split("_") for i in ids], dtype=np.int64).reshape(-1, 3)
+        return self.predict_pairs(parts[:, 0], parts[:, 1], parts[:, 2])
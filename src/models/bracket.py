@@ -0,0 +1,242 @@
+"""Monte Carlo tournament simulation from an ``ID,Pred`` submission.
+
+The submission is loaded into a dense team x team matrix P with P[i, j] the
+probability that team i beats team j. The bracket is built from
+MNCAATourneySeeds.csv: four regions (W, X, Y, Z) seeded 1-16, paired in the
+usual order (1-16, 8-9, 5-12, 4-13, 6-11, 3-14, 7-10, 2-15), W plays X and
+Y plays Z in the national semifinals, and two teams sharing a seed (W16a,
+W16b) meet in a play-in game first.
+
+A batch of brackets is a (64, n_sims) array of team indices. Each round
+compares the even and odd rows against one uniform draw per game and
+halves the array, so one batch costs six vectorized steps plus the
+play-ins. Batches are spread over worker processes, each with its own
+random stream.
+
+Round 0 is the play-in (won by every team without one), rounds 1-6 are
+the round of 64 to the final. Slots use the Kaggle names: R1W1 is the W
+region's 1-16 game, R2W1 the game its winner plays next, R5WX and R5YZ
+the semifinals and R6CH the final.
+"""
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from src.data.storage import read_table
+
+logger = logging.getLogger(__name__)
+
+REGIONS = "WXYZ"
+BRACKET_SEEDS = [1, 16, 8, 9, 5, 12, 4, 13, 6, 11, 3, 14, 7, 10, 2, 15]
+ROUND_POINTS = (10, 20, 40, 80, 160, 320)
+BATCH_SIZE = 100000
+
+
+def tournament_field(seeds):
+    """Bracket positions of a season's seeded teams.
+
+    Parameters
+    ----------
+    seeds : MNCAATourneySeeds rows of one season (Seed, TeamID)
+
+    Returns
+    -------
+    team_ids : (n_teams,) TeamIDs, the index order of the probability matrix
+    first, second : (64,) team index at each bracket position; second is the
+        play-in opponent or -1
+    """
+    team_ids = np.sort(seeds["TeamID"].to_numpy().astype(np.int64))
+    index = {t: i for i, t in enumerate(team_ids)}
+    by_seed = {}
+    for seed, team in zip(seeds["Seed"], seeds["TeamID"]):
+        by_seed.setdefault(seed[:3], []).append((seed, index[team]))
+
+    first = np.empty(64, dtype=np.int64)
+    second = np.full(64, -1, dtype=np.int64)
+    for r, region in enumerate(REGIONS):
+        for k, seed in enumerate(BRACKET_SEEDS):
+            teams = sorted(by_seed.get(f"{region}{seed:02d}", []))
+            if not teams or len(teams) > 2:
+                raise ValueError(f"Expected 1 or 2 teams for seed {region}{seed:02d}, got {len(teams)}")
+            first[16 * r + k] = teams[0][1]
+            if len(teams) == 2:
+                second[16 * r + k] = teams[1][1]
+    return team_ids, first, second
+
+
+def slot_names():
+    """Kaggle slot name of every game, per round, in simulation order."""
+    names = []
+    seeds = np.array(BRACKET_SEEDS * 4)
+    regions = np.repeat(list(REGIONS), 16)
+    for rnd in range(1, 5):
+        width = 2 ** rnd
+        names.append([f"R{rnd}{regions[g * width]}{seeds[g * width:(g + 1) * width].min()}"
+                      for g in range(64 // width)])
+    names.append(["R5WX", "R5YZ"])
+    names.append(["R6CH"])
+    return names
+
+
+def probability_matrix(submission, season, team_ids):
+    """Dense P[i, j] = P(team_ids[i] beats team_ids[j]) from ID,Pred rows."""
+    parts = submission["ID"].str.split("_", expand=True).astype(np.int64).to_numpy()
+    rows = parts[:, 0] == season
+    pred = submission["Pred"].to_numpy(dtype=np.float64)[rows]
+    T1, T2 = (np.searchsorted(team_ids, parts[rows, k]) for k in (1, 2))
+    known = (T1 < len(team_ids)) & (T2 < len(team_ids))
+    T1, T2, pred = T1[known], T2[known], pred[known]
+    known = (team_ids[T1] == parts[rows, 1][known]) & (team_ids[T2] == parts[rows, 2][known])
+    T1, T2, pred = T1[known], T2[known], pred[known]
+
+    P = np.full((len(team_ids), len(team_ids)), np.nan)
+    P[T1, T2] = pred
+    P[T2, T1] = 1.0 - pred
+    np.fill_diagonal(P, 0.5)
+    missing = np.isnan(P).sum() // 2
+    if missing:
+        raise ValueError(f"Submission has no prediction for {missing} pairs of season {season}")
+    return P
+
+
+def _simulate_batch(P, first, second, n_sims, rng, picks=None):
+    # (games, n_sims) layout keeps each round's pairs contiguous; float32
+    # draws and probabilities halve the memory traffic:
+    n_teams = len(P)
+    P_flat = P.astype(np.float32).ravel()
+    counts = np.zeros((7, n_teams), dtype=np.int64)
+    scores = np.zeros(n_sims)
+
+    field = np.repeat(first.astype(np.int32)[:, None], n_sims, axis=1)
+    playin = np.flatnonzero(second >= 0)
+    if len(playin):
+        a = field[playin]
+        b = second[playin].astype(np.int32)[:, None]
+        field[playin] = np.where(rng.random(a.shape, dtype=np.float32) < P_flat.take(a * n_teams + b), a, b)
+    counts[0] = np.bincount(field.ravel(), minlength=n_teams)
+
+    for rnd in range(1, 7):
+        a, b = field[0::2], field[1::2]
+        field = np.where(rng.random(a.shape, dtype=np.float32) < P_flat.take(a * n_teams + b), a, b)
+        counts[rnd] = np.bincount(field.ravel(), minlength=n_teams)
+        if picks is not None:
+            scores += ROUND_POINTS[rnd - 1] * (field == picks[rnd - 1][:, None]).sum(axis=0)
+    return counts, scores.sum(), (scores ** 2).sum()
+
+
+def _simulate_shard(P, first, second, n_sims, seed, picks, batch_size):
+    rng = np.random.default_rng(seed)
+    counts = np.zeros((7, len(P)), dtype=np.int64)
+    score_sum = score_sq = 0.0
+    for start in range(0, n_sims, batch_size):
+        c, s, sq = _simulate_batch(P, first, second, min(batch_size, n_sims - start), rng, picks)
+        counts += c
+        score_sum += s
+        score_sq += sq
+    return counts, score_sum, score_sq
+
+
+def picks_array(picks, team_ids):
+    """Team index picked in every game, per round, from {slot: TeamID}."""
+    index = {t: i for i, t in enumerate(team_ids)}
+    return [np.array([index.get(picks.get(slot), -1) for slot in names])
+            for names in slot_names()]
+
+
+def simulate(P, first, second, n_sims=1000000, picks=None, n_jobs=None, seed=0,
+             batch_size=BATCH_SIZE):
+    """Simulates whole tournaments.
+
+    Parameters
+    ----------
+    P : (n_teams, n_teams) win probability matrix
+    first, second : bracket positions from tournament_field
+    n_sims : number of tournaments
+    picks : optional pool bracket from picks_array, scored with ROUND_POINTS
+    n_jobs : worker processes, default one per CPU
+    seed : seed of the random streams
+
+    Returns
+    -------
+    advancement : (7, n_teams) probability of winning the game of each round
+        (round 0 = play-in)
+    score : (mean, std) of the pool bracket's score, None without picks
+    """
+    if n_jobs is None or n_jobs < 1:
+        n_jobs = os.cpu_count() or 1
+    n_jobs = max(min(n_jobs, -(-n_sims // batch_size)), 1)
+    shard_sims = [n_sims // n_jobs + (k < n_sims % n_jobs) for k in range(n_jobs)]
+    seeds = np.random.SeedSequence(seed).spawn(n_jobs)
+    args = [[P] * n_jobs, [first] * n_jobs, [second] * n_jobs, shard_sims, seeds,
+            [picks] * n_jobs, [batch_size] * n_jobs]
+
+    if n_jobs == 1:
+        results = list(map(_simulate_shard, *args))
+    else:
+        with ProcessPoolExecutor(n_jobs) as pool:
+            results = list(pool.map(_simulate_shard, *args))
+
+    counts = sum(r[0] for r in results)
+    advancement = counts / n_sims
+    if picks is None:
+        return advancement, None
+    mean = sum(r[1] for r in results) / n_sims
+    var = sum(r[2] for r in results) / n_sims - mean ** 2
+    return advancement, (mean, np.sqrt(max(var, 0.0)))
+
+
+def advancement_table(advancement, team_ids, seeds):
+    """Advancement probabilities per team, best title odds first."""
+    seed_of = dict(zip(seeds["TeamID"], seeds["Seed"]))
+    table = pd.DataFrame(advancement.T, columns=[f"R{r}" for r in range(7)])
+    table.insert(0, "TeamID", team_ids)
+    table.insert(1, "Seed", [seed_of[t] for t in team_ids])
+    return table.sort_values(["R6", "R5", "R4"], ascending=False, ignore_index=True)
+
+
+def chalk_picks(P, first, second, team_ids):
+    """Pool bracket that always picks the team more likely to win the game."""
+    field = np.where((second >= 0) & (P[np.maximum(second, 0), first] > 0.5), second, first)
+    picks = {}
+    for names in slot_names():
+        a, b = field[0::2], field[1::2]
+        field = np.where(P[a, b] >= 0.5, a, b)
+        picks.update(zip(names, team_ids[field]))
+    return picks
+
+
+def main(submission_path=None, season=2021, n_sims=1000000, picks=None):
+    """Simulates a season's tournament from a submission file.
+
+    Writes ``<submission>_advancement.csv`` next to the submission and logs
+    the expected score of picks ({slot: TeamID}, default the chalk bracket).
+    """
+    proj_dir = Path().resolve()
+    if submission_path is None:
+        submission_path = proj_dir / "models" / "logistic_ensemble.csv"
+    submission_path = Path(submission_path)
+
+    seeds = read_table(proj_dir / "data" / "external" / "MNCAATourneySeeds.csv")
+    seeds = seeds.loc[seeds["Season"] == season]
+    team_ids, first, second = tournament_field(seeds)
+    P = probability_matrix(pd.read_csv(submission_path), season, team_ids)
+    if picks is None:
+        picks = chalk_picks(P, first, second, team_ids)
+
+    advancement, (mean, std) = simulate(P, first, second, n_sims, picks_array(picks, team_ids))
+    logger.info(f"Pool bracket expected score {mean:.1f} (std {std:.1f}) over {n_sims} tournaments")
+
+    table = advancement_table(advancement, team_ids, seeds)
+    out_path = submission_path.with_name(submission_path.stem + "_advancement.csv")
+    table.to_csv(out_path, index=False)
+    return table
+
+
+if __name__ == "__main__":
+    log_fmt = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    logging.basicConfig(level=logging.INFO, format=log_fmt)
+    main()
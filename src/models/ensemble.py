@@ -0,0 +1,193 @@
+"""Stacked ensemble over season-grouped out-of-fold predictions.
+
+Each base model (estimator, mode and feature list) gets leave-one-season-out
+out-of-fold predictions from train_model.cross_validate. These are cached
+in the ArtifactCache under a key made from the model config, the code
+version and the hash of the training data, so adding a base model or
+re-tuning the meta layer only computes what is missing. The meta model is
+fitted on the stacked out-of-fold predictions rather than on in-sample
+ones. For the submission, the base models are refitted on all games and
+the pairs are scored through predict_model.write_submission.
+"""
+import logging
+from collections import namedtuple
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from sklearn.linear_model import LogisticRegression
+
+from src.data.storage import read_processed
+from src.features.build_features import current_feature_store, feature_steps
+from src.features.cache import ArtifactCache
+from src.models.predict_model import check_features, export_artifact, tourney_teams, write_submission
+from src.models.train_model import cross_validate, fit_pipeline, rfe_cv, training_arrays
+
+logger = logging.getLogger(__name__)
+
+BaseModel = namedtuple("BaseModel", ["name", "estimator", "mode", "features"])
+
+
+def feature_sets(store):
+    """The notebooks' feature lists, read off the feature store blocks.
+
+    Returns
+    -------
+    dict with "all", "boxscore" (season means and 14 day win ratio),
+    "kenpom" (kenpom ratings without the rank) and "ratings" (the native
+    efficiency ratings)
+    """
+    (_, stats_T1, stats_T2), (_, wr_T1, wr_T2), (_, kp_T1, kp_T2), _, (_, ra_T1, ra_T2) = store.blocks
+    boxscore = stats_T1 + stats_T2 + wr_T1 + wr_T2
+    kenpom = [c for c in kp_T1 + kp_T2 if not c.endswith("_Rk")]
+    ratings = ra_T1 + ra_T2
+    return {"all": boxscore + kenpom + ratings, "boxscore": boxscore, "kenpom": kenpom, "ratings": ratings}
+
+
+def oof_predictions(tourney_data, features, estimator, mode):
+    """Out-of-fold predictions of one base model.
+
+    Returns
+    -------
+    DataFrame with row (position in tourney_data), Season, target and pred
+    for the games where all features are present
+    """
+    features = list(features)
+    X, y, groups = training_arrays(tourney_data, features)
+    _, oof = cross_validate(X, y, groups, estimator, mode)
+    rows = np.flatnonzero(tourney_data[features].notna().all(axis=1).to_numpy())
+    return pd.DataFrame({"row": rows, "Season": groups, "target": y, "pred": oof})
+
+
+def rfe_selection(tourney_data, features, n_features_to_select):
+    """Features kept by rfe_cv, as a one column frame so it can be cached."""
+    selected, _, _ = rfe_cv(tourney_data, features, n_features_to_select)
+    return pd.DataFrame({"feature": selected})
+
+
+class StackingEnsemble:
+    """Meta model over the out-of-fold predictions of base models.
+
+    Parameters
+    ----------
+    base_models : list of BaseModel
+    meta_estimator : unfitted classifier, fitted with a StandardScaler like
+        the base models
+    cache : ArtifactCache holding the out-of-fold predictions
+    """
+
+    def __init__(self, base_models, meta_estimator, cache):
+        self.base_models = list(base_models)
+        self.meta_estimator = meta_estimator
+        self.cache = cache
+
+    @property
+    def features(self):
+        """Union of the base model features, in first-seen order."""
+        return list(dict.fromkeys(f for m in self.base_models for f in m.features))
+
+    def oof(self, data):
+        """Stacked out-of-fold predictions on the games all base models cover.
+
+        Parameters
+        ----------
+        data : Artifact of the training games (e.g. cache.source of the
+            processed tourney data)
+
+        Returns
+        -------
+        DataFrame with row, Season, target and one column per base model
+        """
+        stacked = None
+        for m in self.base_models:
+            preds = self.cache.step(oof_predictions, data, features=tuple(m.features),
+                                    estimator=m.estimator, mode=m.mode).load()
+            preds = preds.rename(columns={"pred": m.name})
+            stacked = preds if stacked is None else \
+                stacked.merge(preds[["row", m.name]], on="row", how="inner")
+        return stacked
+
+    def fit(self, data):
+        """Fits the meta model on the out-of-fold predictions and refits the
+        base models on all their games.
+
+        Returns
+        -------
+        scores : Series of the meta model's leave-one-season-out log loss
+        """
+        stacked = self.oof(data)
+        names = [m.name for m in self.base_models]
+        X_meta = stacked[names].to_numpy(dtype=np.float64)
+        y = stacked["target"].to_numpy()
+        groups = stacked["Season"].to_numpy()
+        scores, _ = cross_validate(X_meta, y, groups, self.meta_estimator, "cls", n_jobs=1)
+        logger.info(f"Ensemble CV Loss : {scores.mean():.3f}")
+
+        tourney_data = data.load()
+        self.base_fits_ = []
+        for m in self.base_models:
+            X, y_base, _ = training_arrays(tourney_data, m.features)
+            self.base_fits_.append(fit_pipeline(m.estimator, X, y_base))
+        self.meta_fit_ = fit_pipeline(self.meta_estimator, X_meta, y)
+        return scores
+
+    def base_predictions(self, X):
+        """(n, n_base_models) predictions of the refitted base models."""
+        X = pd.DataFrame(X, columns=self.features) if not isinstance(X, pd.DataFrame) else X
+        preds = np.empty((len(X), len(self.base_models)))
+        for k, (m, pipe) in enumerate(zip(self.base_models, self.base_fits_)):
+            Xm = X[list(m.features)].to_numpy(dtype=np.float64)
+            if m.mode == "reg":
+                preds[:, k] = np.clip(pipe.predict(Xm), 0, 1)
+            else:
+                preds[:, k] = pipe.predict_proba(Xm)[:, 1]
+        return preds
+
+    def predict_proba(self, X):
+        """Meta model probabilities for a frame holding self.features."""
+        return self.meta_fit_.predict_proba(self.base_predictions(X))
+
+
+def default_ensemble(store, data, cache):
+    """The logistic ensemble of the notebooks: boxscore, kenpom and RFE
+    base models, plus one on the native efficiency ratings, each a
+    LogisticRegression(max_iter=300)."""
+    sets = feature_sets(store)
+    rfe = cache.step(rfe_selection, data, features=tuple(sets["all"]),
+                     n_features_to_select=8).load()["feature"].tolist()
+    base_models = [
+        BaseModel("boxscore", LogisticRegression(max_iter=300), "cls", sets["boxscore"]),
+        BaseModel("kenpom", LogisticRegression(max_iter=300), "cls", sets["kenpom"]),
+        BaseModel("rfe", LogisticRegression(max_iter=300), "cls", rfe),
+        BaseModel("ratings", LogisticRegression(max_iter=300), "cls", sets["ratings"]),
+    ]
+    return StackingEnsemble(base_models, LogisticRegression(max_iter=300), cache)
+
+
+def main(season=2021, path=None, cache=None):
+    """Fits the default ensemble and writes models/logistic_ensemble.csv and
+    its artifact models/logistic_ensemble.npz."""
+    proj_dir = Path().resolve()
+    data_dir = proj_dir / "data"
+    if cache is None:
+        cache = ArtifactCache(data_dir / "interim" / "cache")
+    if path is None:
+        path = proj_dir / "models" / "logistic_ensemble.csv"
+
+    store = current_feature_store(data_dir, feature_steps(data_dir, data_dir / "raw" / "kenpom.csv", cache),
+                                  season)
+    data = cache.source(data_dir / "processed" / "tourney_data.feather", reader=read_processed)
+    team_ids = tourney_teams(data_dir, season)
+
+    ensemble = default_ensemble(store, data, cache)
+    # nothing is fitted or written if a tournament team lacks a feature:
+    check_features(store, ensemble.features, season, team_ids)
+    ensemble.fit(data)
+    export_artifact(ensemble, ensemble.features, store, Path(path).with_suffix(".npz"))
+    return write_submission(ensemble, ensemble.features, store, season, team_ids, path)
+
+
+if __name__ == "__main__":
+    log_fmt = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    logging.basicConfig(level=logging.INFO, format=log_fmt)
+    main()
@@ -0,0 +1,258 @@
+"""Scores any number of ``ID,Pred`` submissions against the tournament results.
+
+The submissions are loaded into one prediction matrix, a row per
+(Season, T1, T2) pair with T1 < T2 and a column per submission, so every
+metric is computed for all of them at once: log loss per season and per
+round, calibration bins and bootstrap confidence intervals.
+
+The bootstrap draws each resample as a vector of game counts, so the
+resampled log losses of every submission are a single matrix product
+(resamples x games) @ (games x submissions). All submissions share the
+same resamples, which gives paired intervals for the difference to the
+best one. Rounds follow bracket.py: 0 is the play-in, 1-6 the round of 64
+to the final.
+
+    python -m src.models.evaluate models/*.csv
+"""
+import argparse
+import logging
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from src.data.storage import read_table
+
+logger = logging.getLogger(__name__)
+
+EPS = 1e-15
+N_RESAMPLES = 10000
+CHUNK_RESAMPLES = 500
+
+
+def _pair_keys(seasons, T1, T2):
+    return (np.asarray(seasons, dtype=np.int64) * 10000 + T1) * 10000 + T2
+
+
+def parse_ids(ids):
+    """Season, T1 and T2 of ``SSSS_TTTT_TTTT`` IDs, as int64 arrays.
+
+    IDs of that fixed width are decoded as bytes, anything else is split.
+    """
+    ids = np.asarray(ids, dtype=str)
+    if len(ids) and np.all(np.char.str_len(ids) == 14):
+        digits = np.frombuffer(ids.astype("S14").tobytes(), dtype=np.uint8).reshape(-1, 14).astype(np.int64) - 48
+        places = np.array([1000, 100, 10, 1])
+        return digits[:, 0:4] @ places, digits[:, 5:9] @ places, digits[:, 10:14] @ places
+    parts = pd.Series(ids).str.split("_", expand=True).astype(np.int64).to_numpy()
+    return parts[:, 0], parts[:, 1], parts[:, 2]
+
+
+def prediction_matrix(paths):
+    """One column of predictions per submission, aligned on (Season, T1, T2).
+
+    Pairs missing from a submission are NaN.
+
+    Returns
+    -------
+    DataFrame indexed by Season, T1, T2 with a column per submission (file stem)
+    """
+    columns = {}
+    for path in paths:
+        path = Path(path)
+        submission = pd.read_csv(path)
+        keys = _pair_keys(*parse_ids(submission["ID"].to_numpy()))
+        columns[path.stem] = pd.Series(submission["Pred"].to_numpy(dtype=np.float64), index=keys)
+    matrix = pd.DataFrame(columns).sort_index()
+    keys = matrix.index.to_numpy()
+    matrix.index = pd.MultiIndex.from_arrays([keys // 10 ** 8, keys // 10 ** 4 % 10 ** 4, keys % 10 ** 4],
+                                             names=["Season", "T1", "T2"])
+    return matrix
+
+
+def tourney_outcomes(results, seeds):
+    """Tournament games as Kaggle pairs.
+
+    Parameters
+    ----------
+    results : MNCAATourneyDetailedResults (or compact) rows
+    seeds : MNCAATourneySeeds rows, for the rounds
+
+    Returns
+    -------
+    DataFrame with Season, T1, T2 (T1 < T2), Won (T1 won) and Round
+    """
+    games = results.sort_values(["Season", "DayNum"], kind="mergesort")
+    season = games["Season"].to_numpy().astype(np.int64)
+    W = games["WTeamID"].to_numpy().astype(np.int64)
+    L = games["LTeamID"].to_numpy().astype(np.int64)
+
+    # the round is the number of earlier games of a team, less its play-in;
+    # a play-in game is one between two teams with a lettered seed (W16a):
+    n = len(games)
+    teams = pd.DataFrame({"Season": np.concatenate([season, season]), "TeamID": np.concatenate([W, L])})
+    played = teams.groupby(["Season", "TeamID"]).cumcount().to_numpy()[:n]
+    lettered = seeds.loc[seeds["Seed"].str.len() > 3]
+    play_in_keys = set(zip(lettered["Season"].astype(np.int64), lettered["TeamID"].astype(np.int64)))
+    W_play_in = np.array([key in play_in_keys for key in zip(season.tolist(), W.tolist())], dtype=bool)
+    L_play_in = np.array([key in play_in_keys for key in zip(season.tolist(), L.tolist())], dtype=bool)
+    play_in_game = W_play_in & L_play_in & (played == 0)
+    rounds = np.where(play_in_game, 0, played + 1 - W_play_in)
+
+    return pd.DataFrame({
+        "Season": season,
+        "T1": np.minimum(W, L),
+        "T2": np.maximum(W, L),
+        "Won": (W < L).astype(np.int8),
+        "Round": rounds,
+    })
+
+
+def log_loss_matrix(P, won):
+    """(games, submissions) log loss of every prediction."""
+    P = np.clip(P, EPS, 1 - EPS)
+    won = won[:, None].astype(bool)
+    return -np.log(np.where(won, P, 1 - P))
+
+
+def grouped_log_loss(losses, groups, names):
+    """Mean log loss per group (rows) and submission (columns), plus the game count."""
+    labels, codes = np.unique(groups, return_inverse=True)
+    sums = np.zeros((len(labels), losses.shape[1]))
+    np.add.at(sums, codes, losses)
+    counts = np.bincount(codes, minlength=len(labels))
+    out = pd.DataFrame(sums / counts[:, None], columns=names)
+    out.insert(0, "games", counts)
+    out.index = labels
+    return out
+
+
+def calibration(P, won, names, bins=10):
+    """Predictions binned on [0, 1] against the observed win rate.
+
+    Returns
+    -------
+    long DataFrame with submission, bin, lower, upper, games, mean_pred and
+    win_rate
+    """
+    edges = np.linspace(0, 1, bins + 1)
+    codes = np.clip(np.searchsorted(edges, P, side="right") - 1, 0, bins - 1)
+    frames = []
+    for k, name in enumerate(names):
+        counts = np.bincount(codes[:, k], minlength=bins)
+        preds = np.bincount(codes[:, k], P[:, k], minlength=bins)
+        wins = np.bincount(codes[:, k], won, minlength=bins)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            frames.append(pd.DataFrame({"submission": name, "bin": np.arange(bins),
+                                        "lower": edges[:-1], "upper": edges[1:], "games": counts,
+                                        "mean_pred": preds / counts, "win_rate": wins / counts}))
+    return pd.concat(frames, ignore_index=True)
+
+
+def bootstrap_log_loss(losses, n_resamples=N_RESAMPLES, seed=0, chunk=CHUNK_RESAMPLES):
+    """Mean log loss of every submission over bootstrap resamples of the games.
+
+    Each chunk of resamples is a (chunk, games) matrix of draw counts, so the
+    resampled means are one matrix product per chunk.
+
+    Returns
+    -------
+    (n_resamples, submissions) array
+    """
+    rng = np.random.default_rng(seed)
+    n = len(losses)
+    out = np.empty((n_resamples, losses.shape[1]))
+    for start in range(0, n_resamples, chunk):
+        size = min(chunk, n_resamples - start)
+        draws = rng.integers(0, n, size=(size, n)) + n * np.arange(size)[:, None]
+        counts = np.bincount(draws.ravel(), minlength=size * n).reshape(size, n)
+        out[start:start + size] = counts @ losses / n
+    return out
+
+
+def evaluate(matrix, outcomes, n_resamples=N_RESAMPLES, bins=10, alpha=0.05, seed=0):
+    """Scores the submissions of a prediction matrix on the games they all predict.
+
+    Parameters
+    ----------
+    matrix : from prediction_matrix
+    outcomes : from tourney_outcomes
+    n_resamples : bootstrap resamples
+    bins : calibration bins
+    alpha : the confidence intervals are 1 - alpha
+
+    Returns
+    -------
+    dict of DataFrames: summary (one row per submission, best first, with
+    the log loss, its interval and the interval of the difference to the
+    best submission), by_season, by_round and calibration
+    """
+    keys = _pair_keys(outcomes["Season"], outcomes["T1"], outcomes["T2"])
+    matrix_keys = _pair_keys(*(matrix.index.get_level_values(k) for k in ("Season", "T1", "T2")))
+    P = pd.DataFrame(matrix.to_numpy(), index=matrix_keys, columns=matrix.columns).reindex(keys)
+    covered = P.notna().all(axis=1).to_numpy()
+    if not covered.any():
+        raise ValueError("No tournament game is predicted by every submission")
+    if not covered.all():
+        logger.warning(f"Scoring the {covered.sum()} of {len(covered)} games predicted by every submission")
+    names = list(matrix.columns)
+    P = P.to_numpy()[covered]
+    outcomes = outcomes.loc[covered]
+    won = outcomes["Won"].to_numpy()
+
+    losses = log_loss_matrix(P, won)
+    resampled = bootstrap_log_loss(losses, n_resamples, seed)
+    mean = losses.mean(axis=0)
+    best = np.argmin(mean)
+    lower, upper = 100 * alpha / 2, 100 * (1 - alpha / 2)
+    differences = resampled - resampled[:, [best]]
+    summary = pd.DataFrame({
+        "submission": names,
+        "games": len(losses),
+        "log_loss": mean,
+        "ci_lower": np.percentile(resampled, lower, axis=0),
+        "ci_upper": np.percentile(resampled, upper, axis=0),
+        "diff_to_best": mean - mean[best],
+        "diff_ci_lower": np.percentile(differences, lower, axis=0),
+        "diff_ci_upper": np.percentile(differences, upper, axis=0),
+        "brier": ((P - won[:, None]) ** 2).mean(axis=0),
+        "accuracy": ((P > 0.5) == won[:, None].astype(bool)).mean(axis=0),
+    }).sort_values("log_loss").reset_index(drop=True)
+
+    by_season = grouped_log_loss(losses, outcomes["Season"].to_numpy(), names).rename_axis("Season")
+    by_round = grouped_log_loss(losses, outcomes["Round"].to_numpy(), names).rename_axis("Round")
+    return {
+        "summary": summary,
+        "by_season": by_season.reset_index(),
+        "by_round": by_round.reset_index(),
+        "calibration": calibration(P, won, names, bins),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Scores ID,Pred submissions against the tournament results.")
+    parser.add_argument("paths", nargs="*", help="submission files, default models/*.csv")
+    parser.add_argument("--resamples", type=int, default=N_RESAMPLES, help="bootstrap resamples")
+    parser.add_argument("--bins", type=int, default=10, help="calibration bins")
+    args = parser.parse_args(argv)
+
+    proj_dir = Path().resolve()
+    paths = args.paths or sorted((proj_dir / "models").glob("*.csv"))
+    external = proj_dir / "data" / "external"
+    outcomes = tourney_outcomes(read_table(external / "MNCAATourneyDetailedResults.csv"),
+                                read_table(external / "MNCAATourneySeeds.csv"))
+    report = evaluate(prediction_matrix(paths), outcomes, n_resamples=args.resamples, bins=args.bins)
+
+    out_dir = proj_dir / "reports" / "evaluation"
+    out_dir.mkdir(parents=True, exist_ok=True)
+    for name, table in report.items():
+        table.to_csv(out_dir / f"{name}.csv", index=False)
+    logger.info(f"Scored {len(paths)} submissions, wrote {out_dir}\n"
+                + report["summary"].to_string(index=False, float_format="{:.4f}".format))
+    return report
+
+
+if __name__ == "__main__":
+    log_fmt = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    logging.basicConfig(level=logging.INFO, format=log_fmt)
+    main()
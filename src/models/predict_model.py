@@ -0,0 +1,210 @@
+"""All-pairs matchup features and streamed submission files.
+
+A submission needs P(T1 beats T2) for every T1 < T2 pair of a season's
+tournament teams. Instead of building a frame of all pairs and merging
+features onto it (build_features.build_test_data), each team's feature
+vector is gathered once from the TeamFeatureStore and the pair matrix is
+assembled in chunks of pairs, scored, and appended to the ``ID,Pred`` file.
+Memory is bounded by the chunk size, not by the number of pairs.
+"""
+import logging
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from src.data.storage import read_table
+from src.features.build_features import current_feature_store, feature_steps
+from src.features.cache import ArtifactCache
+from src.models import artifact
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 20000
+
+
+def _feature_sources(store, features):
+    """Where each model feature comes from: ("T1"/"T2", store column) or derived."""
+    T1_index, T2_index = {}, {}
+    for cols, T1_cols, T2_cols in store.blocks:
+        for k, (T1_col, T2_col) in enumerate(zip(T1_cols, T2_cols)):
+            T1_index[T1_col] = cols.start + k
+            T2_index[T2_col] = cols.start + k
+
+    sources = []
+    for f in features:
+        if f in T1_index:
+            sources.append(("T1", T1_index[f]))
+        elif f in T2_index:
+            sources.append(("T2", T2_index[f]))
+        elif f == "SeedDiff":
+            sources.append(("SeedDiff", (T1_index["T1_seed"], T2_index["T2_seed"])))
+        else:
+            raise KeyError(f"Feature {f} is not in the feature store")
+    return sources
+
+
+def pair_features(team_vectors, sources, T1_rows, T2_rows):
+    """Feature matrix of a chunk of pairs from the per-team vectors.
+
+    Parameters
+    ----------
+    team_vectors : (n_teams, n_store_features) array from TeamFeatureStore.gather
+    sources : from _feature_sources
+    T1_rows, T2_rows : team rows of each pair
+    """
+    T1 = team_vectors[T1_rows]
+    T2 = team_vectors[T2_rows]
+    X = np.empty((len(T1_rows), len(sources)))
+    for k, (side, col) in enumerate(sources):
+        if side == "T1":
+            X[:, k] = T1[:, col]
+        elif side == "T2":
+            X[:, k] = T2[:, col]
+        else:
+            X[:, k] = T1[:, col[0]] - T2[:, col[1]]
+    return X
+
+
+def missing_features(team_vectors, sources, features, team_ids):
+    """Model features that are NaN for each team.
+
+    Returns
+    -------
+    dict {TeamID: [feature names]}, empty when nothing is missing
+    """
+    missing = np.zeros((len(team_ids), len(sources)), dtype=bool)
+    for k, (side, col) in enumerate(sources):
+        for c in (col if side == "SeedDiff" else (col,)):
+            missing[:, k] |= np.isnan(team_vectors[:, c])
+    return {int(team): [f for f, m in zip(features, row) if m]
+            for team, row in zip(team_ids, missing) if row.any()}
+
+
+def check_features(store, features, season, team_ids):
+    """Raises a ValueError naming the teams and features the store lacks.
+
+    A submission needs a prediction for every pair, so missing features are
+    an error rather than imputed; fill the store (e.g. the kenpom table) first.
+    """
+    team_ids = np.unique(np.asarray(team_ids, dtype=np.int64))
+    team_vectors = store.gather(np.full(len(team_ids), season), team_ids)
+    missing = missing_features(team_vectors, _feature_sources(store, features), list(features), team_ids)
+    if missing:
+        details = "; ".join(f"{team}: {', '.join(names)}" for team, names in missing.items())
+        raise ValueError(f"Missing features for {len(missing)} teams of season {season}: {details}")
+
+
+def predict_pairs(model, X, features):
+    """P(T1 wins): predict_proba for classifiers, clipped predict for regressors."""
+    X = pd.DataFrame(X, columns=features)
+    if hasattr(model, "predict_proba"):
+        return model.predict_proba(X)[:, 1]
+    return np.clip(model.predict(X), 0, 1)
+
+
+def write_submission(model, features, store, season, team_ids, path, chunk_size=CHUNK_SIZE):
+    """Scores every T1 < T2 pair of team_ids and streams ``ID,Pred`` to path.
+
+    Parameters
+    ----------
+    model : fitted estimator/pipeline taking `features` columns
+    features : model feature names (store columns and/or SeedDiff)
+    store : TeamFeatureStore
+    season : int
+    team_ids : tournament teams of the season
+    path : output csv
+    chunk_size : pairs built and scored at a time
+
+    Raises
+    ------
+    ValueError, before anything is written, if a team lacks a model feature
+    (see check_features)
+    """
+    check_features(store, features, season, team_ids)
+    team_ids = np.unique(np.asarray(team_ids, dtype=np.int64))
+    team_vectors = store.gather(np.full(len(team_ids), season), team_ids)
+    sources = _feature_sources(store, features)
+    T1_rows, T2_rows = np.triu_indices(len(team_ids), k=1)
+    logger.info(f"Scoring {len(T1_rows)} pairs for season {season}")
+
+    with open(path, "w", newline="") as f:
+        f.write("ID,Pred\n")
+        for start in range(0, len(T1_rows), chunk_size):
+            i = T1_rows[start:start + chunk_size]
+            j = T2_rows[start:start + chunk_size]
+            preds = predict_pairs(model, pair_features(team_vectors, sources, i, j), features)
+            ids = [f"{season}_{a}_{b}" for a, b in zip(team_ids[i], team_ids[j])]
+            pd.DataFrame({"ID": ids, "Pred": preds}).to_csv(f, header=False, index=False)
+    return path
+
+
+def export_artifact(model, features, store, path):
+    """Saves a fitted model and the team vectors it needs as a ModelArtifact.
+
+    Parameters
+    ----------
+    model : a fitted StandardScaler + linear model pipeline, or a fitted
+        ensemble.StackingEnsemble of such pipelines
+    features : model feature names (store columns and/or SeedDiff)
+    store : TeamFeatureStore
+    path : output .npz file
+
+    Missing features are not imputed, as in write_submission: the team
+    vectors keep their NaNs and the artifact predicts NaN for a pair with a
+    missing feature. Run check_features first for the teams that must be
+    covered.
+    """
+    sources = _feature_sources(store, features)
+    store_cols = sorted({c for side, col in sources
+                         for c in (col if side == "SeedDiff" else (col,))})
+    compact = {c: k for k, c in enumerate(store_cols)}
+    side = [{"T1": artifact.T1, "T2": artifact.T2, "SeedDiff": artifact.DIFF}[s] for s, _ in sources]
+    col_a = [compact[col[0] if s == "SeedDiff" else col] for s, col in sources]
+    col_b = [compact[col[1] if s == "SeedDiff" else col] for s, col in sources]
+
+    # every (season, team) of the store, only the columns the model uses:
+    n_seasons, n_teams, _ = store.values.shape
+    seasons = np.repeat(np.arange(n_seasons) + store.season0, n_teams)
+    team_ids = np.tile(np.arange(n_teams) + store.team0, n_seasons)
+    team_vectors = store.gather(seasons, team_ids)[:, store_cols].reshape(n_seasons, n_teams, -1)
+
+    features = list(features)
+    if hasattr(model, "base_fits_"):
+        base_models = [(m.name, artifact.pipeline_arrays(pipe, m.mode, [features.index(f) for f in m.features]))
+                       for m, pipe in zip(model.base_models, model.base_fits_)]
+        meta = artifact.pipeline_arrays(model.meta_fit_, "cls", range(len(base_models)))
+    else:
+        mode = "cls" if hasattr(model, "predict_proba") else "reg"
+        base_models = [("model", artifact.pipeline_arrays(model, mode, range(len(features))))]
+        meta = None
+
+    logger.info(f"Writing model artifact to {path}")
+    return artifact.write_artifact(path, features, base_models, meta, (side, col_a, col_b),
+                                   team_vectors, store.season0, store.team0)
+
+
+def tourney_teams(data_dir, season):
+    """TeamIDs seeded in the tournament of a season."""
+    seeds = read_table(Path(data_dir) / "external" / "MNCAATourneySeeds.csv")
+    return seeds.loc[seeds["Season"] == season, "TeamID"].to_numpy()
+
+
+def main(model, features, season, path, cache=None):
+    """Writes the submission for a season's tournament teams.
+
+    Parameters
+    ----------
+    model : fitted estimator/pipeline taking `features` columns
+    features : model feature names
+    season : int
+    path : output csv, e.g. models/logistic_ensemble.csv
+    """
+    proj_dir = Path().resolve()
+    data_dir = proj_dir / "data"
+    if cache is None:
+        cache = ArtifactCache(data_dir / "interim" / "cache")
+
+    store = current_feature_store(data_dir, feature_steps(data_dir, data_dir / "raw" / "kenpom.csv", cache),
+                                  season)
+    return write_submission(model, features, store, season, tourney_teams(data_dir, season), path)
@@ -0,0 +1,117 @@
+"""Local prediction server for a model artifact.
+
+Keeps a ModelArtifact (model and team vectors) in memory and answers batch
+P(T1 beats T2) queries over HTTP or from the command line:
+
+    python -m src.models.serve models/logistic_ensemble.npz --port 8000
+
+    POST /predict  {"ID": ["2021_1101_1104", ...]}
+               or  {"Season": [...], "T1_TeamID": [...], "T2_TeamID": [...]}
+    ->             {"ID": [...], "Pred": [...]}   (null where a team is unknown)
+
+    python -m src.models.serve models/logistic_ensemble.npz --ids ids.txt
+
+reads one ID per line (``-`` for stdin) and writes ``ID,Pred`` to stdout.
+"""
+import argparse
+import json
+import logging
+import sys
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from src.models.artifact import ModelArtifact
+
+logger = logging.getLogger(__name__)
+
+
+def answer(model, query):
+    """Predictions for a decoded JSON query, see the module docstring."""
+    if "ID" in query:
+        ids = list(query["ID"])
+        preds = model.predict_ids(ids)
+    else:
+        seasons = np.asarray(query["Season"], dtype=np.int64)
+        T1_ids = np.asarray(query["T1_TeamID"], dtype=np.int64)
+        T2_ids = np.asarray(query["T2_TeamID"], dtype=np.int64)
+        seasons = np.broadcast_to(seasons, T1_ids.shape)
+        preds = model.predict_pairs(seasons, T1_ids, T2_ids)
+        ids = [f"{s}_{a}_{b}" for s, a, b in zip(seasons, T1_ids, T2_ids)]
+    return {"ID": ids, "Pred": [None if np.isnan(p) else float(p) for p in preds]}
+
+
+def make_handler(model):
+    class PredictionHandler(BaseHTTPRequestHandler):
+        def _send(self, status, body):
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path == "/health":
+                self._send(200, {"features": len(model.features), "models": model.names})
+            else:
+                self._send(404, {"error": "not found"})
+
+        def do_POST(self):
+            if self.path != "/predict":
+                self._send(404, {"error": "not found"})
+                return
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+                self._send(200, answer(model, json.loads(self.rfile.read(length))))
+            except (KeyError, ValueError, TypeError) as e:
+                self._send(400, {"error": str(e)})
+
+        def log_message(self, format, *args):
+            logger.debug(format % args)
+
+    return PredictionHandler
+
+
+def serve(artifact_path, host="127.0.0.1", port=8000):
+    model = ModelArtifact.load(artifact_path)
+    server = ThreadingHTTPServer((host, port), make_handler(model))
+    logger.info(f"Serving {artifact_path} on http://{host}:{server.server_port}")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+
+def predict_file(artifact_path, ids_path, out=sys.stdout):
+    """Writes ``ID,Pred`` for the IDs in a file (one per line, ``-`` for stdin)."""
+    model = ModelArtifact.load(artifact_path)
+    f = sys.stdin if ids_path == "-" else open(ids_path)
+    try:
+        ids = [line.strip() for line in f if line.strip() and line.strip() != "ID"]
+    finally:
+        if f is not sys.stdin:
+            f.close()
+    preds = model.predict_ids(ids)
+    out.write("ID,Pred\n")
+    out.writelines(f"{i},{p}\n" for i, p in zip(ids, preds))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("artifact", help="model artifact (.npz)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--ids", help="predict the IDs in this file (- for stdin) and exit")
+    args = parser.parse_args(argv)
+
+    if args.ids:
+        predict_file(args.artifact, args.ids)
+    else:
+        serve(args.artifact, args.host, args.port)
+
+
+if __name__ == "__main__":
+    log_fmt = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    logging.basicConfig(level=logging.INFO, format=log_fmt)
+    main()
@@ -0,0 +1,685 @@
+"""Leave-one-season-out cross-validation on a process pool.
+
+The notebooks' ``reg_cv_train`` evaluates the folds one after another. Here
+every fold is a task for a process pool. The feature matrix, target and
+season groups are put in shared memory once, and each worker attaches to
+them at start-up, so a task only pickles the estimator and the fold's
+season, never the data. Each fold fits ``StandardScaler`` + estimator on
+every other season and predicts the held-out one.
+
+Like ``reg_cv_train``, ``mode="reg"`` clips ``predict`` to [0, 1] and
+``mode="cls"`` uses ``predict_proba``; the target is ``T1_PointDiff > 0``.
+
+``successive_halving`` tunes hyperparameters on the same folds: sampled
+configurations are scored on a few seasons, the best third go on to three
+times as many, and so on until the survivors have seen every season. Each
+(configuration, season) score is appended to a JSON lines trial log, so an
+interrupted search resumes where it stopped.
+"""
+import hashlib
+import json
+import logging
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from sklearn.base import clone
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.linear_model import ElasticNet, LogisticRegression
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler
+
+logger = logging.getLogger(__name__)
+
+
+def training_arrays(tourney_data, features):
+    """Feature matrix, target and season groups of the complete rows.
+
+    Rows with a missing value in any of the features are dropped.
+
+    Returns
+    -------
+    X : (n_games, n_features) float64 array, C-contiguous
+    y : (n_games,) int64 array, 1 where T1 won
+    groups : (n_games,) int64 array of seasons
+    """
+    X = tourney_data[list(features)].to_numpy(dtype=np.float64)
+    complete = ~np.isnan(X).any(axis=1)
+    y = (tourney_data["T1_PointDiff"].to_numpy() > 0).astype(np.int64)
+    groups = tourney_data["Season"].to_numpy().astype(np.int64)
+    return np.ascontiguousarray(X[complete]), y[complete], groups[complete]
+
+
+class SharedArrays:
+    """Named numpy arrays copied into shared memory blocks.
+
+    Use as a context manager in the parent process; the blocks are freed on
+    exit. ``spec`` is what workers pass to ``attach``.
+    """
+
+    def __init__(self, **arrays):
+        self.blocks = []
+        self.spec = {}
+        for name, array in arrays.items():
+            array = np.ascontiguousarray(array)
+            block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+            np.ndarray(array.shape, array.dtype, buffer=block.buf)[...] = array
+            self.blocks.append(block)
+            self.spec[name] = (block.name, array.shape, array.dtype.str)
+
+    @staticmethod
+    def attach(spec):
+        """Maps the blocks of a spec into this process.
+
+        Returns
+        -------
+        blocks : SharedMemory handles, keep them alive while the arrays are used
+        arrays : dict of read-only arrays
+        """
+        blocks, arrays = [], {}
+        for name, (block_name, shape, dtype) in spec.items():
+            block = shared_memory.SharedMemory(name=block_name)
+            array = np.ndarray(shape, np.dtype(dtype), buffer=block.buf)
+            array.flags.writeable = False
+            blocks.append(block)
+            arrays[name] = array
+        return blocks, arrays
+
+    def close(self):
+        for block in self.blocks:
+            block.close()
+            block.unlink()
+        self.blocks = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# per-worker views of the shared arrays, set by _init_worker:
+_shared = {}
+
+
+def _init_worker(spec):
+    blocks, arrays = SharedArrays.attach(spec)
+    _shared["blocks"] = blocks
+    _shared.update(arrays)
+
+
+def log_loss(y, pred, eps=1e-15):
+    """Binary log loss, with predictions clipped to [eps, 1 - eps] like sklearn.
+
+    pred may hold several prediction vectors in its leading axes; the mean
+    is taken over the last one.
+    """
+    pred = np.clip(pred, eps, 1 - eps)
+    return -np.mean(np.where(y == 1, np.log(pred), np.log1p(-pred)), axis=-1)
+
+
+def fit_pipeline(estimator, X_train, y_train):
+    """StandardScaler + a clone of estimator, fitted."""
+    pipe = Pipeline([
+        ('scaler', StandardScaler()),
+        ('estimator', clone(estimator))
+    ])
+    return pipe.fit(X_train, y_train)
+
+
+def fit_predict(estimator, mode, X_train, y_train, X_val):
+    """Fits StandardScaler + a clone of estimator and predicts P(T1 wins)."""
+    pipe = fit_pipeline(estimator, X_train, y_train)
+    if mode == "reg":
+        return np.clip(pipe.predict(X_val), 0, 1)
+    return pipe.predict_proba(X_val)[:, 1]
+
+
+def _run_fold(estimator, mode, season):
+    X, y, groups = _shared["X"], _shared["y"], _shared["groups"]
+    val = groups == season
+    return fit_predict(estimator, mode, X[~val], y[~val], X[val])
+
+
+def _pool_size(n_jobs, n_tasks):
+    if n_jobs is None or n_jobs < 1:
+        n_jobs = os.cpu_count() or 1
+    return max(min(n_jobs, n_tasks), 1)
+
+
+def _imap_tasks(func, task_args, arrays, n_jobs):
+    """Runs func over the task arguments with arrays as the worker's _shared.
+
+    task_args is a list of argument lists, one per parameter of func.
+    Results are yielded in task order as they become available.
+    """
+    n_jobs = _pool_size(n_jobs, len(task_args[0]))
+    if n_jobs == 1:
+        _shared.update(arrays)
+        try:
+            yield from map(func, *task_args)
+        finally:
+            _shared.clear()
+        return
+
+    with SharedArrays(**arrays) as shared, \
+            ProcessPoolExecutor(n_jobs, initializer=_init_worker,
+                                initargs=(shared.spec,)) as pool:
+        yield from pool.map(func, *task_args)
+
+
+def _map_tasks(func, task_args, arrays, n_jobs):
+    """List of the results of _imap_tasks."""
+    return list(_imap_tasks(func, task_args, arrays, n_jobs))
+
+
+def cross_validate(X, y, groups, estimator, mode="reg", n_jobs=None):
+    """Leave-one-season-out CV of a StandardScaler + estimator pipeline.
+
+    Parameters
+    ----------
+    X, y, groups : from training_arrays
+    estimator : unfitted sklearn estimator (cloned per fold)
+    mode : "reg" (clipped predict) or "cls" (predict_proba)
+    n_jobs : worker processes, default one per CPU. 1 runs in-process.
+
+    Returns
+    -------
+    scores : Series of log loss indexed by Season
+    oof : (n_games,) out-of-fold predictions
+    """
+    seasons = np.unique(groups)
+    oof = np.empty(len(y))
+    preds = _map_tasks(_run_fold, [[estimator] * len(seasons), [mode] * len(seasons), seasons],
+                       dict(X=X, y=y, groups=groups), n_jobs)
+
+    scores = {}
+    for season, pred in zip(seasons, preds):
+        val = groups == season
+        oof[val] = pred
+        scores[season] = log_loss(y[val], pred)
+
+    scores = pd.Series(scores, name="log_loss")
+    scores.index.name = "Season"
+    logger.info(f"Local CV Loss : {scores.mean():.3f}  -----  {estimator.__class__.__name__}")
+    return scores, oof
+
+
+def cv_train(tourney_data, features, estimator, mode="reg", n_jobs=None):
+    """cross_validate on the complete rows of tourney_data.
+
+    Returns
+    -------
+    scores : Series of log loss indexed by Season
+    oof : Series of out-of-fold predictions indexed like the complete rows
+    """
+    X, y, groups = training_arrays(tourney_data, features)
+    complete = tourney_data[list(features)].notna().all(axis=1)
+    scores, oof = cross_validate(X, y, groups, estimator, mode, n_jobs)
+    return scores, pd.Series(oof, index=tourney_data.index[complete.to_numpy()], name="pred")
+
+
+def fold_scaler(X_train):
+    """StandardScaler statistics of a fold's training rows: (mean, scale)."""
+    mean = X_train.mean(axis=0)
+    scale = X_train.std(axis=0)
+    scale[scale == 0.0] = 1.0
+    return mean, scale
+
+
+def _model_names(estimators):
+    names, seen = [], {}
+    for estimator, _ in estimators:
+        name = estimator.__class__.__name__
+        seen[name] = seen.get(name, 0) + 1
+        names.append(name if seen[name] == 1 else f"{name}_{seen[name]}")
+    return names
+
+
+def _run_sweep_fold(season, estimators, column_sets):
+    """Scales the fold once and fits every estimator x feature set on it."""
+    X, y, groups = _shared["X"], _shared["y"], _shared["groups"]
+    val = groups == season
+    mean, scale = fold_scaler(X[~val])
+    X_train = (X[~val] - mean) / scale
+    X_val = (X[val] - mean) / scale
+    y_train = y[~val]
+
+    preds = []
+    for estimator, mode in estimators:
+        for cols in column_sets:
+            model = clone(estimator).fit(X_train[:, cols], y_train)
+            if mode == "reg":
+                preds.append(np.clip(model.predict(X_val[:, cols]), 0, 1))
+            else:
+                preds.append(model.predict_proba(X_val[:, cols])[:, 1])
+    return preds
+
+
+def cv_sweep(tourney_data, estimators, feature_sets, n_jobs=None):
+    """Leave-one-season-out CV of every estimator on every feature set.
+
+    Each fold's split and scaler statistics are computed once over the union
+    of all feature sets; every estimator x feature set pair is then fitted on
+    a column subset of that one scaled matrix. Column-wise scaling makes this
+    the same as a StandardScaler pipeline per pair.
+
+    Parameters
+    ----------
+    tourney_data : DataFrame with the features, Season and T1_PointDiff
+    estimators : list of (unfitted estimator, mode), as in the notebooks' bulk trial
+    feature_sets : dict of name -> feature list
+    n_jobs : worker processes (one task per fold), default one per CPU
+
+    Returns
+    -------
+    scores : DataFrame of log loss, index (model, features), columns Season
+    oof : DataFrame of out-of-fold predictions, one column per (model, features)
+
+    Rows missing any feature of the union are dropped for every pair, so all
+    pairs are scored on the same games.
+    """
+    features = list(dict.fromkeys(f for fs in feature_sets.values() for f in fs))
+    position = {f: k for k, f in enumerate(features)}
+    column_sets = [np.array([position[f] for f in fs]) for fs in feature_sets.values()]
+
+    X, y, groups = training_arrays(tourney_data, features)
+    seasons = np.unique(groups)
+    n = len(seasons)
+    fold_preds = _map_tasks(_run_sweep_fold, [seasons, [estimators] * n, [column_sets] * n],
+                            dict(X=X, y=y, groups=groups), n_jobs)
+
+    pairs = pd.MultiIndex.from_product([_model_names(estimators), list(feature_sets)],
+                                       names=["model", "features"])
+    oof = np.empty((len(y), len(pairs)))
+    scores = np.empty((len(pairs), n))
+    for j, (season, preds) in enumerate(zip(seasons, fold_preds)):
+        val = groups == season
+        for k, pred in enumerate(preds):
+            oof[val, k] = pred
+            scores[k, j] = log_loss(y[val], pred)
+
+    complete = tourney_data[features].notna().all(axis=1).to_numpy()
+    scores = pd.DataFrame(scores, index=pairs, columns=pd.Index(seasons, name="Season"))
+    oof = pd.DataFrame(oof, index=tourney_data.index[complete], columns=pairs)
+    for (model, fs), loss in scores.mean(axis=1).items():
+        logger.info(f"Local CV Loss : {loss:.3f}  -----  {model} / {fs}")
+    return scores, oof
+
+
+def gram_stats(X, y, groups):
+    """Per-season sufficient statistics of a linear fit.
+
+    X is shifted by its overall column means first so that centering the
+    Gram matrix later does not lose precision.
+
+    Returns
+    -------
+    stats : dict of per-season arrays, n (S,), sx (S, F), sy (S,),
+        XtX (S, F, F) and Xty (S, F), plus seasons (S,) and shift (F,)
+    """
+    seasons = np.unique(groups)
+    shift = X.mean(axis=0)
+    Xc = X - shift
+    S, F = len(seasons), X.shape[1]
+    stats = dict(seasons=seasons, shift=shift, n=np.empty(S), sx=np.empty((S, F)),
+                 sy=np.empty(S), XtX=np.empty((S, F, F)), Xty=np.empty((S, F)))
+    for k, season in enumerate(seasons):
+        rows = groups == season
+        Xs, ys = Xc[rows], y[rows].astype(np.float64)
+        stats["n"][k] = rows.sum()
+        stats["sx"][k] = Xs.sum(axis=0)
+        stats["sy"][k] = ys.sum()
+        stats["XtX"][k] = Xs.T @ Xs
+        stats["Xty"][k] = Xs.T @ ys
+    return stats
+
+
+def centered_gram(n, sx, sy, XtX, Xty):
+    """Gram system of a fit with intercept: (G, b, x mean, y mean)."""
+    x_mean, y_mean = sx / n, sy / n
+    G = XtX - n * np.outer(x_mean, x_mean)
+    b = Xty - n * x_mean * y_mean
+    return G, b, x_mean, y_mean
+
+
+def solve_gram(G, b, positive=True, x0=None, tol=1e-10):
+    """Least squares coefficients from the normal equations G x = b.
+
+    With positive=True this is Lawson-Hanson NNLS on the Gram matrix, the
+    same problem LinearRegression(positive=True) solves. x0, a feasible
+    (non-negative) earlier solution, warm-starts the active set. A ridge of
+    tol times the mean diagonal keeps the subproblems well posed when
+    features are exact combinations of others (AdjEM = AdjO - AdjD).
+    """
+    if not positive:
+        return np.linalg.lstsq(G, b, rcond=None)[0]
+
+    n = len(b)
+    G = G + tol * max(np.trace(G) / max(n, 1), 1.0) * np.eye(n)
+    x = np.zeros(n) if x0 is None else np.maximum(x0, 0.0)
+    passive = x > 0
+    threshold = tol * max(1.0, np.abs(b).max(initial=0.0))
+    for _ in range(3 * n + 10):
+        # shrink the passive set until its unconstrained solution is feasible:
+        while passive.any():
+            z = np.zeros(n)
+            z[passive] = np.linalg.solve(G[np.ix_(passive, passive)], b[passive])
+            if (z[passive] > 0).all():
+                x = z
+                break
+            neg = passive & (z <= 0)
+            alpha = np.min(x[neg] / (x[neg] - z[neg]))
+            x = x + alpha * (z - x)
+            passive &= x > tol
+            x[~passive] = 0.0
+
+        w = b - G @ x
+        candidates = ~passive & (w > threshold)
+        if not candidates.any():
+            break
+        passive[np.argmax(np.where(candidates, w, -np.inf))] = True
+    return x
+
+
+def elimination_path(G, b, n_keep=1, positive=True):
+    """Recursive feature elimination on a Gram system, one feature per step.
+
+    Like sklearn's RFE with step=1, the feature with the smallest absolute
+    coefficient is dropped at each step. Dropping a feature only deletes its
+    row and column of G; the next fit is warm-started from the current one.
+
+    Returns
+    -------
+    subsets : list of kept column index arrays, from all columns down to n_keep
+    dropped : column dropped after each subset (len(subsets) - 1 entries)
+    """
+    kept = np.arange(len(b))
+    coef = solve_gram(G, b, positive)
+    subsets, dropped = [kept], []
+    while len(kept) > n_keep:
+        k = np.argmin(np.abs(coef))
+        dropped.append(kept[k])
+        refit = coef[k] != 0 or not positive
+        kept = np.delete(kept, k)
+        coef = np.delete(coef, k)
+        subsets.append(kept)
+        # dropping a zero coefficient leaves the others optimal:
+        if refit:
+            coef = solve_gram(G[np.ix_(kept, kept)], b[kept], positive, coef)
+    return subsets, dropped
+
+
+def _run_rfe_fold(season, positive):
+    """Runs the elimination on all other seasons and fits every subset of
+    that path, predicts season.
+    """
+    k = np.searchsorted(_shared["seasons"], season)
+    train = {name: _shared[name].sum(axis=0) - _shared[name][k]
+             for name in ["n", "sx", "sy", "XtX", "Xty"]}
+    G, b, x_mean, y_mean = centered_gram(**train)
+    subsets, _ = elimination_path(G, b, 1, positive)
+    X_val = _shared["X"][_shared["groups"] == season] - _shared["shift"]
+
+    preds, coef, previous = [], None, None
+    for kept in subsets:
+        if coef is None:
+            coef = solve_gram(G[np.ix_(kept, kept)], b[kept], positive)
+        else:
+            still_kept = np.isin(previous, kept)
+            refit = (coef[~still_kept] != 0).any() or not positive
+            coef = coef[still_kept]
+            if refit:
+                coef = solve_gram(G[np.ix_(kept, kept)], b[kept], positive, coef)
+        intercept = y_mean - x_mean[kept] @ coef
+        preds.append(np.clip(X_val[:, kept] @ coef + intercept, 0, 1))
+        previous = kept
+    return preds
+
+
+def rfe_cv(tourney_data, features, n_features_to_select=None, positive=True, n_jobs=None):
+    """Recursive feature elimination for linear models, scored under grouped CV.
+
+    Each subset size is scored with leave-one-season-out CV, as RFECV
+    does: every fold runs the elimination, as RFE(LinearRegression(
+    positive=positive), step=1) would, on the other seasons only, and scores
+    each subset of its own path on the held-out season (one pool task per
+    fold, reusing per-season Gram statistics, clipped predictions as in mode
+    "reg"). The selected features are the subset of the chosen size on the
+    path of all complete rows.
+
+    Parameters
+    ----------
+    tourney_data : DataFrame with the features, Season and T1_PointDiff
+    features : candidate features
+    n_features_to_select : size of the returned subset. Default: the size
+        with the lowest mean CV loss.
+    positive : non-negative coefficients
+
+    Returns
+    -------
+    selected : list of selected features
+    path : DataFrame with n_features and the feature dropped at that size
+    cv_loss : DataFrame of log loss, index n_features, columns Season
+    """
+    features = list(features)
+    if n_features_to_select is not None and not 1 <= n_features_to_select <= len(features):
+        raise ValueError(f"n_features_to_select must be between 1 and {len(features)}, "
+                         f"got {n_features_to_select}")
+    X, y, groups = training_arrays(tourney_data, features)
+    stats = gram_stats(X, y, groups)
+
+    seasons = stats["seasons"]
+    fold_preds = _map_tasks(_run_rfe_fold, [seasons, [positive] * len(seasons)],
+                            dict(X=X, y=y, groups=groups, **stats), n_jobs)
+
+    # the held-out season must not steer its fold's path, but the final
+    # subset comes from the path of all seasons:
+    G, b, _, _ = centered_gram(*[stats[name].sum(axis=0) for name in ["n", "sx", "sy", "XtX", "Xty"]])
+    subsets, dropped = elimination_path(G, b, 1, positive)
+
+    sizes = pd.Index([len(kept) for kept in subsets], name="n_features")
+    cv_loss = pd.DataFrame(
+        np.column_stack([log_loss(y[groups == season], np.array(preds))
+                         for season, preds in zip(seasons, fold_preds)]),
+        index=sizes, columns=pd.Index(seasons, name="Season"))
+    path = pd.DataFrame({"n_features": sizes[:-1], "dropped": [features[j] for j in dropped]})
+
+    # subsets (and the rows of cv_loss) go from all features down to one:
+    mean_loss = cv_loss.mean(axis=1).to_numpy()
+    if n_features_to_select is None:
+        position = int(np.argmin(mean_loss))
+    else:
+        position = len(features) - n_features_to_select
+    selected = [features[j] for j in subsets[position]]
+    logger.info(f"RFE selected {len(selected)} features, CV loss {mean_loss[position]:.3f}")
+    return selected, path, cv_loss
+
+
+# parameter -> ("int", low, high), ("uniform", low, high), ("log", low, high)
+# or ("choice", values), per estimator:
+SEARCH_SPACES = {
+    "RandomForestClassifier": {
+        "n_estimators": ("int", 20, 300),
+        "max_depth": ("choice", [3, 5, 8, 12, None]),
+        "min_samples_leaf": ("int", 1, 50),
+        "max_features": ("uniform", 0.1, 1.0),
+    },
+    "LogisticRegression": {
+        "C": ("log", 1e-3, 1e2),
+        "penalty": ("choice", ["l1", "l2"]),
+    },
+    "ElasticNet": {
+        "alpha": ("log", 1e-4, 1.0),
+        "l1_ratio": ("uniform", 0.0, 1.0),
+    },
+}
+# estimator class, mode and fixed parameters of every search space:
+SEARCH_ESTIMATORS = {
+    "RandomForestClassifier": (RandomForestClassifier, "cls", {"random_state": 1, "n_jobs": 1}),
+    "LogisticRegression": (LogisticRegression, "cls", {"solver": "liblinear", "max_iter": 300, "random_state": 1}),
+    "ElasticNet": (ElasticNet, "reg", {}),
+}
+
+
+def _draw(rng, spec):
+    kind = spec[0]
+    if kind == "int":
+        return int(rng.integers(spec[1], spec[2] + 1))
+    if kind == "uniform":
+        return float(rng.uniform(spec[1], spec[2]))
+    if kind == "log":
+        return float(np.exp(rng.uniform(np.log(spec[1]), np.log(spec[2]))))
+    if kind == "choice":
+        return spec[1][rng.integers(len(spec[1]))]
+    raise ValueError(f"Unknown parameter distribution {kind}")
+
+
+def sample_configs(n_configs, spaces=SEARCH_SPACES, seed=0):
+    """Random configurations, the estimator of each drawn uniformly from spaces.
+
+    Returns
+    -------
+    list of {"model": estimator name, "params": {parameter: value}}
+    """
+    rng = np.random.default_rng(seed)
+    names = list(spaces)
+    configs = []
+    for _ in range(n_configs):
+        name = names[rng.integers(len(names))]
+        configs.append({"model": name,
+                        "params": {p: _draw(rng, spec) for p, spec in spaces[name].items()}})
+    return configs
+
+
+def make_estimator(config):
+    """Unfitted estimator and mode of a configuration."""
+    cls, mode, fixed = SEARCH_ESTIMATORS[config["model"]]
+    return cls(**fixed, **config["params"]), mode
+
+
+def trial_key(config):
+    return hashlib.sha256(json.dumps(config, sort_keys=True).encode()).hexdigest()[:16]
+
+
+class TrialLog:
+    """Scores of (trial, season) folds, appended to a JSON lines file.
+
+    Lines of other training data (another data key) are ignored, so one
+    file can hold several searches.
+
+    Parameters
+    ----------
+    path : log file, None keeps the scores in memory only
+    data_key : hash of the training arrays
+    """
+
+    def __init__(self, path, data_key):
+        self.path = None if path is None else Path(path)
+        self.data_key = data_key
+        self.scores = {}
+        if self.path is not None and self.path.exists():
+            with open(self.path) as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    entry = json.loads(line)
+                    if entry["data"] == data_key:
+                        self.scores[(entry["trial"], entry["season"])] = entry["log_loss"]
+
+    def add(self, trial, config, season, loss):
+        self.scores[(trial, int(season))] = loss
+        if self.path is None:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "a") as f:
+            f.write(json.dumps({"data": self.data_key, "trial": trial, "config": config,
+                                "season": int(season), "log_loss": loss}) + "\n")
+
+
+def _score_fold(estimator, mode, season):
+    y, groups = _shared["y"], _shared["groups"]
+    return float(log_loss(y[groups == season], _run_fold(estimator, mode, season)))
+
+
+def fold_budgets(n_seasons, min_folds=1, eta=3):
+    """Number of folds of every rung: min_folds, times eta each rung, up to all seasons."""
+    budgets = []
+    n_folds = max(min_folds, 1)
+    while n_folds < n_seasons:
+        budgets.append(n_folds)
+        n_folds *= eta
+    return budgets + [n_seasons]
+
+
+def successive_halving(X, y, groups, configs, log_path=None, eta=3, min_folds=1, n_jobs=None):
+    """Successive halving of configurations over leave-one-season-out folds.
+
+    Every rung scores the surviving configurations on the first folds of
+    fold_budgets (the most recent seasons first, so a rung reuses the folds
+    of the one before) and keeps the best 1 / eta of them by mean log loss.
+    The (configuration, season) fits of a rung run in parallel on the pool
+    of cross_validate; scores already in the trial log are not refitted.
+
+    Parameters
+    ----------
+    X, y, groups : from training_arrays
+    configs : from sample_configs
+    log_path : JSON lines trial log, resumed from if it exists
+    eta : reduction factor between rungs
+    min_folds : folds of the first rung
+    n_jobs : worker processes, default one per CPU. 1 runs in-process.
+
+    Returns
+    -------
+    DataFrame with trial, model, params, rung (last rung reached), folds and
+    log_loss (mean over its folds), the survivors of the last rung first
+    """
+    data_key = hashlib.sha256(b"".join(np.ascontiguousarray(a).tobytes() for a in (X, y, groups))).hexdigest()
+    log = TrialLog(log_path, data_key)
+    seasons = np.unique(groups)[::-1]
+    trials = {trial_key(config): config for config in configs}
+    alive = list(trials)
+    results = {}
+    arrays = dict(X=X, y=y, groups=groups)
+
+    budgets = fold_budgets(len(seasons), min_folds, eta)
+    for rung, n_folds in enumerate(budgets):
+        folds = seasons[:n_folds]
+        todo = [(trial, season) for trial in alive for season in folds
+                if (trial, int(season)) not in log.scores]
+        if todo:
+            estimators, modes = zip(*[make_estimator(trials[trial]) for trial, _ in todo])
+            scores = _imap_tasks(_score_fold, [estimators, modes, [season for _, season in todo]],
+                                 arrays, n_jobs)
+            for (trial, season), loss in zip(todo, scores):
+                log.add(trial, trials[trial], season, loss)
+
+        losses = {trial: np.mean([log.scores[(trial, int(s))] for s in folds]) for trial in alive}
+        for trial in alive:
+            results[trial] = (rung, n_folds, losses[trial])
+        logger.info(f"Rung {rung}: {len(alive)} configurations on {n_folds} folds "
+                    f"({len(todo)} fits), best loss {min(losses.values()):.4f}")
+        if rung < len(budgets) - 1:
+            alive = sorted(alive, key=losses.get)[:max(1, math.ceil(len(alive) / eta))]
+
+    out = pd.DataFrame([{"trial": trial, "model": trials[trial]["model"],
+                         "params": json.dumps(trials[trial]["params"], sort_keys=True),
+                         "rung": rung, "folds": n_folds, "log_loss": loss}
+                        for trial, (rung, n_folds, loss) in results.items()])
+    out = out.sort_values(["rung", "log_loss"], ascending=[False, True]).reset_index(drop=True)
+    best = out.iloc[0]
+    logger.info(f"Best configuration: {best['model']} {best['params']}, CV loss {best['log_loss']:.4f}")
+    return out
+
+
+def search(tourney_data, features, n_configs=200, spaces=SEARCH_SPACES, log_path=None, eta=3,
+           min_folds=1, n_jobs=None, seed=0):
+    """successive_halving of n_configs sampled configurations on the complete rows of tourney_data."""
+    X, y, groups = training_arrays(tourney_data, features)
+    configs = sample_configs(n_configs, spaces, seed)
+    return successive_halving(X, y, groups, configs, log_path, eta, min_folds, n_jobs)
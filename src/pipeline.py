@@ -0,0 +1,325 @@
+"""Dependency-aware runner for the data pipeline (scraping to tourney_data).
+
+Every stage declares the files it reads and writes. A stage is a plain
+function of DataFrames (the feature functions themselves): its inputs are
+loaded from the input files, its result is written to the output files
+(a tuple goes to one file each). Stages depend on each other through
+those files, which makes the pipeline a DAG:
+
+    MRegularSeasonDetailedResults.csv -> prepare_regular -> season_stats
+                                                         -> win_ratio
+                                                         -> efficiency_ratings
+    MNCAATourneyDetailedResults.csv   -> prepare_tourney
+    kenpom.csv (scrape_kenpom)        -> clean_kp, kenpom_names_report
+    MNCAATourneySeeds.csv             -> seed_diff
+    all of the above                  -> tourney_data
+
+Only tables that tourney_data uses are stages by default. Optional stages
+(OPTIONAL_STAGES) write tables no model reads yet, e.g. the Elo ratings of
+src.features.elo, and only run when asked for:
+
+    python makefile.py --with elo
+
+A stage is skipped when the hash of its code (see cache.code_version), its
+parameters and the contents of its inputs equals the one recorded after its
+last successful run and its outputs are untouched. Inputs are hashed once
+and memoized on (size, mtime), so a run without changes only stats files.
+Because inputs are compared by content, a stage whose rerun produced the
+same file does not invalidate the stages below it.
+
+Stages whose inputs are ready run concurrently on a process pool, so the
+kenpom, regular season, tourney and seed branches proceed in parallel.
+Under instrument.tracing a worker traces its stage and sends the records
+back, so the trace holds every stage under one "pipeline" stage whichever
+process ran it.
+
+    python makefile.py                     # run what is out of date
+    python makefile.py --force clean_kp    # rerun a stage even if nothing changed
+"""
+import argparse
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+import json
+import logging
+import os
+from pathlib import Path
+
+import pandas as pd
+from pyarrow import feather
+
+from src import instrument
+from src.data import make_dataset
+from src.data.storage import compact_dtypes, read_feather, write_table
+from src.features import build_features, elo, ratings
+from src.features.cache import code_version, content_hash, file_digest
+
+logger = logging.getLogger(__name__)
+
+
+# A pipeline step:
+# name : unique stage name
+# func : called with one DataFrame per input file plus params
+# inputs : files read, in func's argument order
+# outputs : files written; a tuple result is written one table per file, a
+#     single table to every output (e.g. feather and csv)
+# params : keyword arguments of func, part of the stage's hash
+# compact : write feather outputs with compact dtypes (storage.compact_dtypes);
+#     outputs in a "processed" folder keep float64 floats like storage.write_processed
+# always_run : run even when nothing changed (e.g. scraping a live season)
+Stage = namedtuple("Stage", ["name", "func", "inputs", "outputs", "params", "compact", "always_run"],
+                   defaults=(None, False, False))
+
+# stages left out of the default DAG because nothing downstream reads them:
+OPTIONAL_STAGES = ("elo",)
+
+
+def read_input(path):
+    """Loads a stage input: Feather as is, csv with the compact dtypes of storage.read_table."""
+    path = Path(path)
+    if path.suffix == ".feather":
+        return read_feather(path)
+    # the Kaggle spellings file is not utf-8:
+    encoding = "ISO-8859-1" if "Spellings" in path.name else None
+    return compact_dtypes(pd.read_csv(path, encoding=encoding))
+
+
+def write_outputs(value, paths, compact=False):
+    tables = value if isinstance(value, tuple) else (value,) * len(paths)
+    if len(tables) != len(paths):
+        raise ValueError(f"{len(tables)} tables for {len(paths)} outputs")
+    for df, path in zip(tables, paths):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if path.suffix == ".csv":
+            df.to_csv(path, index=False)
+        elif compact:
+            write_table(df, path, float32=path.parent.name != "processed")
+        else:
+            feather.write_feather(df, path)
+
+
+def execute(stage, traced=False):
+    """Runs a stage: reads its inputs, calls func, writes its outputs.
+
+    With traced (in a worker process while the parent traces) the stage is
+    traced in the worker and its records are returned for instrument.merge;
+    otherwise returns None.
+    """
+    if traced:
+        with instrument.tracing(summary=False) as trace:
+            execute(stage)
+        return trace.export()
+    with instrument.stage(stage.name) as rec:
+        frames = [read_input(path) for path in stage.inputs]
+        value = stage.func(*frames, **(stage.params or {}))
+        write_outputs(value, stage.outputs, stage.compact)
+        rec.set(rows_in=sum(len(f) for f in frames), rows_out=instrument.rows(value))
+    return None
+
+
+def pipeline_stages(proj_dir=None, optional=()):
+    """The stages of makefile.py, from scraping kenpom to data/processed/tourney_data.
+
+    Parameters
+    ----------
+    proj_dir : project folder, default the working directory
+    optional : names from OPTIONAL_STAGES to add
+    """
+    unknown = set(optional) - set(OPTIONAL_STAGES)
+    if unknown:
+        raise ValueError(f"Unknown optional stages: {sorted(unknown)}")
+    proj_dir = Path().resolve() if proj_dir is None else Path(proj_dir)
+    data_dir = proj_dir / "data"
+    external = data_dir / "external"
+    raw = data_dir / "raw"
+    interim = data_dir / "interim"
+    out = interim / "pipeline"
+
+    def pair(name):
+        return [out / f"{name}_T1.feather", out / f"{name}_T2.feather"]
+
+    regular = out / "regular_data.feather"
+    tourney = out / "tourney_prepared.feather"
+    kp_csv = raw / "kenpom.csv"
+    teams = external / "MTeams.csv"
+    spellings = external / "MTeamSpellings.csv"
+    seasons = list(make_dataset.KP_SEASONS)
+    extra = {
+        "elo": Stage("elo", elo.elo_ratings, [regular], pair("elo")),
+    }
+    return [
+        Stage("scrape_kenpom", make_dataset.kp_data, [], [kp_csv],
+              params={"seasons": seasons, "cache_dir": str(raw / "kenpom_cache")},
+              always_run=not all(make_dataset._season_finished(s) for s in seasons)),
+        Stage("kenpom_names_report", make_dataset.kenpom_names_report, [kp_csv, teams, spellings],
+              [interim / "kenpom_names_report.csv"]),
+        Stage("clean_kp", build_features.clean_kp_data, [kp_csv, spellings, teams], pair("kp"),
+              params={"index_path": str(interim / "team_names.json")}),
+        Stage("prepare_regular", build_features.prepare_data,
+              [external / "MRegularSeasonDetailedResults.csv"], [regular]),
+        Stage("prepare_tourney", build_features.prepare_data,
+              [external / "MNCAATourneyDetailedResults.csv"], [tourney]),
+        Stage("seed_diff", build_features.calc_seed_diff,
+              [external / "MNCAATourneySeeds.csv"], pair("seeds")),
+        Stage("season_stats", build_features.calc_season_statistics, [regular], pair("season_stats")),
+        Stage("win_ratio", build_features.win_ratio_14_days, [regular], pair("win_ratio")),
+        Stage("efficiency_ratings", ratings.efficiency_ratings, [regular], pair("ratings")),
+        Stage("tourney_data", build_features.attach_features,
+              [tourney] + pair("season_stats") + pair("win_ratio") + pair("kp") + pair("seeds")
+              + pair("ratings"),
+              [data_dir / "processed" / "tourney_data.feather",
+               data_dir / "processed" / "tourney_data.csv"],
+              compact=True),
+    ] + [extra[name] for name in OPTIONAL_STAGES if name in optional]
+
+
+class PipelineState:
+    """Hashes of the last successful run of every stage, kept as JSON.
+
+    Parameters
+    ----------
+    path : state file
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        data = json.loads(self.path.read_text()) if self.path.exists() else {}
+        self.digests = data.get("digests", {})
+        self.stages = data.get("stages", {})
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.path.write_text(json.dumps({"digests": self.digests, "stages": self.stages}, indent=1))
+
+    def file_digest(self, path):
+        """sha256 of a file, memoized on (size, mtime) in the state file."""
+        return file_digest(path, self.digests)
+
+    def stage_key(self, stage):
+        return content_hash(stage.name, code_version(stage.func), sorted((stage.params or {}).items()),
+                            stage.compact, *[self.file_digest(path) for path in stage.inputs])
+
+    def outputs_stamp(self, stage):
+        return [self.file_digest(path) for path in stage.outputs]
+
+    def up_to_date(self, stage):
+        entry = self.stages.get(stage.name)
+        if entry is None or stage.always_run:
+            return False
+        if not all(Path(path).exists() for path in stage.outputs):
+            return False
+        return entry == [self.stage_key(stage), self.outputs_stamp(stage)]
+
+    def record(self, stage):
+        self.stages[stage.name] = [self.stage_key(stage), self.outputs_stamp(stage)]
+
+
+def _dependencies(stages):
+    """{stage name: names of the stages producing its inputs}."""
+    producer = {}
+    for stage in stages:
+        for path in stage.outputs:
+            producer[str(Path(path).resolve())] = stage.name
+    return {stage.name: {producer[str(Path(p).resolve())] for p in stage.inputs
+                         if str(Path(p).resolve()) in producer}
+            for stage in stages}
+
+
+def run(stages, state_path, force=(), n_jobs=None):
+    """Runs the out of date stages, independent ones in parallel.
+
+    Parameters
+    ----------
+    stages : list of Stage
+    state_path : JSON file with the hashes of the last run
+    force : stage names rerun regardless of their hashes (the stages below
+        them rerun if their outputs change)
+    n_jobs : worker processes, default one per CPU; 1 runs in-process
+
+    Returns
+    -------
+    dict of stage name -> "ran" or "skipped"
+    """
+    names = [stage.name for stage in stages]
+    if len(set(names)) != len(names):
+        raise ValueError("Stage names must be unique")
+    unknown = set(force) - set(names)
+    if unknown:
+        raise ValueError(f"Unknown stages: {sorted(unknown)}")
+
+    state = PipelineState(state_path)
+    deps = _dependencies(stages)
+    by_name = {stage.name: stage for stage in stages}
+    if n_jobs is None or n_jobs < 1:
+        n_jobs = os.cpu_count() or 1
+
+    status = {}
+    running = {}
+    pool = ProcessPoolExecutor(n_jobs) if n_jobs > 1 else None
+    # workers trace their stage when this process traces:
+    traced = pool is not None and instrument.enabled()
+    try:
+        with instrument.stage("pipeline", n_jobs=n_jobs) as rec:
+            while len(status) < len(stages):
+                # skip or submit every stage whose upstream stages are done:
+                progress = False
+                for name in names:
+                    if name in status or name in running or not deps[name] <= status.keys():
+                        continue
+                    stage = by_name[name]
+                    if name not in force and state.up_to_date(stage):
+                        logger.info(f"{name}: up to date")
+                        status[name] = "skipped"
+                        progress = True
+                    elif pool is None:
+                        logger.info(f"{name}: running")
+                        execute(stage)
+                        state.record(stage)
+                        state.save()
+                        status[name] = "ran"
+                        progress = True
+                    else:
+                        logger.info(f"{name}: running")
+                        running[name] = pool.submit(execute, stage, traced)
+                if progress:
+                    continue
+                if not running:
+                    raise RuntimeError(f"Unresolvable stages: {sorted(set(names) - status.keys())}")
+
+                done, _ = wait(running.values(), return_when=FIRST_COMPLETED)
+                for name in [n for n, future in running.items() if future in done]:
+                    instrument.merge(running.pop(name).result(), rec)
+                    state.record(by_name[name])
+                    state.save()
+                    status[name] = "ran"
+            rec.set(ran=sum(s == "ran" for s in status.values()),
+                    skipped=sum(s == "skipped" for s in status.values()))
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+        state.save()
+    return status
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Builds data/processed/tourney_data, "
+                                                 "rerunning only the stages that changed.")
+    parser.add_argument("--force", nargs="*", default=[], help="stages to rerun")
+    parser.add_argument("--jobs", type=int, default=None, help="worker processes")
+    parser.add_argument("--with", dest="optional", nargs="*", default=[], choices=OPTIONAL_STAGES,
+                        help="optional stages to run as well")
+    args = parser.parse_args(argv)
+
+    proj_dir = Path().resolve()
+    stages = pipeline_stages(proj_dir, args.optional)
+    status = run(stages, proj_dir / "data" / "interim" / "pipeline_state.json",
+                 force=args.force, n_jobs=args.jobs)
+    ran = [name for name, s in status.items() if s == "ran"]
+    logger.info(f"Ran {len(ran)} of {len(status)} stages: {', '.join(ran) or 'none'}")
+    return status
+
+
+if __name__ == "__main__":
+    log_fmt = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    logging.basicConfig(level=logging.INFO, format=log_fmt)
+    main()
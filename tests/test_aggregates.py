@@ -0,0 +1,55 @@
+"""Segment reductions against pandas groupby."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.features.aggregates import segment_aggregate, sorted_columns, team_segments
+
+COLUMNS = ["Score", "FGA", "OffRtg"]
+
+
+def _games(n=200, seed=0):
+    rng = np.random.default_rng(seed)
+    games = pd.DataFrame({
+        "Season": rng.choice([2019, 2020], size=n),
+        "TeamID": rng.choice([1101, 1102, 1103, 1104, 1105], size=n),
+        "DayNum": rng.permutation(n),
+        "Score": rng.integers(40, 100, size=n).astype(np.float64),
+        "FGA": rng.normal(55, 8, size=n),
+        "OffRtg": rng.normal(100, 12, size=n),
+    })
+    # NaNs are skipped, like in pandas:
+    games.loc[rng.choice(n, 20, replace=False), "OffRtg"] = np.nan
+    return games
+
+
+def _aggregate(games, func):
+    order, starts, counts = team_segments(games["Season"].to_numpy(), games["TeamID"].to_numpy(),
+                                          games["DayNum"].to_numpy())
+    out = segment_aggregate(sorted_columns(games, COLUMNS, order), starts, counts, func)
+    index = pd.MultiIndex.from_arrays([games["Season"].to_numpy()[order][starts],
+                                       games["TeamID"].to_numpy()[order][starts]],
+                                      names=["Season", "TeamID"])
+    return pd.DataFrame(out, index=index, columns=COLUMNS)
+
+
+@pytest.mark.parametrize("func", ["mean", "std", "median", "min", "max"])
+def test_segment_aggregate_matches_groupby(func):
+    games = _games()
+    expected = games.groupby(["Season", "TeamID"])[COLUMNS].agg(func)
+    pd.testing.assert_frame_equal(_aggregate(games, func), expected, rtol=1e-12)
+
+
+def test_last_n_and_ewm_match_pandas():
+    games = _games().sort_values(["Season", "TeamID", "DayNum"])
+    grouped = games.groupby(["Season", "TeamID"])[COLUMNS]
+    pd.testing.assert_frame_equal(_aggregate(games, "last5"), grouped.apply(lambda g: g.tail(5).mean()),
+                                  rtol=1e-12)
+    pd.testing.assert_frame_equal(_aggregate(games, "ewm4"),
+                                  grouped.apply(lambda g: g.ewm(span=4).mean().iloc[-1]),
+                                  rtol=1e-12)
+
+
+def test_unknown_aggregate_is_rejected():
+    with pytest.raises(ValueError, match="Unknown aggregate"):
+        _aggregate(_games(), "mode")
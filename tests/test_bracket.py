@@ -0,0 +1,76 @@
+"""Tournament simulation against exact advancement probabilities."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.models.bracket import REGIONS, simulate, tournament_field
+
+# two play-in games, 68 teams:
+PLAYINS = {"W16", "Y11"}
+
+
+def _seeds():
+    seeds, team = [], 1000
+    for region in REGIONS:
+        for seed in range(1, 17):
+            name = f"{region}{seed:02d}"
+            for suffix in ("a", "b") if name in PLAYINS else ("",):
+                seeds.append((name + suffix, team))
+                team += 1
+    return pd.DataFrame(seeds, columns=["Seed", "TeamID"])
+
+
+def _probabilities(strength):
+    """Bradley-Terry matrix P[i, j] = s_i / (s_i + s_j)."""
+    return strength[:, None] / (strength[:, None] + strength[None, :])
+
+
+def exact_advancement(P, first, second):
+    """Advancement probabilities by enumerating the winners of every game.
+
+    Each game's winner distribution follows from its two feeders':
+    P(i wins) = P(i reaches it) * sum_j P(j reaches it) P[i, j].
+    """
+    n = len(P)
+    field = np.zeros((64, n))
+    field[np.arange(64), first] = 1.0
+    playin = second >= 0
+    field[playin] *= P[first[playin], second[playin]][:, None]
+    field[np.flatnonzero(playin), second[playin]] = P[second[playin], first[playin]]
+    advancement = [field.sum(axis=0)]
+    for _ in range(6):
+        a, b = field[0::2], field[1::2]
+        field = a * (b @ P.T) + b * (a @ P.T)
+        advancement.append(field.sum(axis=0))
+    return np.array(advancement)
+
+
+def test_deterministic_games_match_enumeration():
+    team_ids, first, second = tournament_field(_seeds())
+    # the lower TeamID always wins:
+    order = np.arange(len(team_ids))
+    P = (order[:, None] < order[None, :]).astype(np.float64)
+    np.fill_diagonal(P, 0.5)
+    advancement, _ = simulate(P, first, second, n_sims=1000, n_jobs=1)
+    np.testing.assert_array_equal(advancement, exact_advancement(P, first, second))
+
+
+def test_simulation_matches_enumeration():
+    team_ids, first, second = tournament_field(_seeds())
+    P = _probabilities(np.random.default_rng(0).lognormal(sigma=1.0, size=len(team_ids)))
+    advancement, _ = simulate(P, first, second, n_sims=50000, n_jobs=1, seed=1)
+    exact = exact_advancement(P, first, second)
+
+    np.testing.assert_allclose(exact.sum(axis=1), [64, 32, 16, 8, 4, 2, 1])
+    np.testing.assert_allclose(advancement.sum(axis=1), [64, 32, 16, 8, 4, 2, 1])
+    np.testing.assert_allclose(advancement, exact, atol=0.01)
+
+    again, _ = simulate(P, first, second, n_sims=50000, n_jobs=1, seed=1)
+    np.testing.assert_array_equal(again, advancement)
+
+
+def test_shared_seed_without_a_playin_is_rejected():
+    seeds = _seeds()
+    seeds = seeds.loc[seeds["Seed"] != "W05"]
+    with pytest.raises(ValueError, match="seed W05"):
+        tournament_field(seeds)
@@ -0,0 +1,51 @@
+"""Step keys follow the code and module level data a function uses."""
+import importlib.util
+import linecache
+import textwrap
+
+from src.features import build_features
+from src.features.cache import ArtifactCache, code_version
+
+MODULE = '''
+import pandas as pd
+
+SCALE = 2
+
+REGISTRY = [
+    ("double", lambda x: x * SCALE),
+    ("square", lambda x: x ** 2),
+]
+
+
+def unrelated():
+    return 1
+
+
+def apply(df):
+    return pd.DataFrame({name: func(df["x"]) for name, func in REGISTRY})
+'''
+
+
+def _step_key(tmp_path, source, version):
+    path = tmp_path / f"registry_v{version}.py"
+    path.write_text(textwrap.dedent(source))
+    linecache.checkcache(str(path))
+    spec = importlib.util.spec_from_file_location("registry", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return ArtifactCache(tmp_path / "cache").step(module.apply).key
+
+
+def test_editing_a_registry_entry_changes_the_key(tmp_path):
+    key = _step_key(tmp_path, MODULE, 0)
+    assert _step_key(tmp_path, MODULE, 1) == key
+    assert _step_key(tmp_path, MODULE.replace("x ** 2", "x ** 3"), 2) != key
+    assert _step_key(tmp_path, MODULE.replace("SCALE = 2", "SCALE = 3"), 3) != key
+    assert _step_key(tmp_path, MODULE.replace("return 1", "return 2"), 4) == key
+
+
+def test_advanced_stats_registry_is_part_of_prepare_data(monkeypatch):
+    version = code_version(build_features.prepare_data)
+    (name, expr, _), *rest = build_features.ADVANCED_STATS
+    monkeypatch.setattr(build_features, "ADVANCED_STATS", [(name, expr, None)] + rest)
+    assert code_version(build_features.prepare_data) != version
@@ -0,0 +1,25 @@
+"""Batching of the Elo replay."""
+import numpy as np
+
+from src.features.elo import _schedule
+
+
+def _games(rows):
+    season, day, W, L = (np.array(col) for col in zip(*rows))
+    return {'Season': season, 'DayNum': day, 'W': W, 'L': L}
+
+
+def test_schedule_keeps_each_teams_order():
+    # on day 10, 2 plays 1 and then 3, and 3 then plays 4: a chain of three batches.
+    games = _games([(2021, 10, 1, 2), (2021, 10, 2, 3), (2021, 10, 4, 3), (2021, 10, 5, 6),
+                    (2021, 11, 3, 1), (2021, 11, 2, 4), (2022, 10, 1, 2)])
+    order, starts = _schedule(games)
+    batches = [order[a:b].tolist() for a, b in zip(starts[:-1], starts[1:])]
+    assert batches == [[0, 3], [1], [2], [4, 5], [6]]
+
+
+def test_schedule_empty():
+    empty = np.empty(0, dtype=np.int64)
+    order, starts = _schedule({'Season': empty, 'DayNum': empty, 'W': empty, 'L': empty})
+    assert len(order) == 0
+    assert starts.tolist() == [0, 0]
@@ -0,0 +1,68 @@
+"""Submission scores against sklearn's metrics and the bootstrap's reproducibility."""
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.metrics import brier_score_loss, log_loss
+
+from src.models.evaluate import bootstrap_log_loss, evaluate, log_loss_matrix, prediction_matrix
+
+
+def _outcomes(n_games=300, seed=0):
+    rng = np.random.default_rng(seed)
+    T1 = rng.choice(np.arange(1101, 1400), size=n_games)
+    return pd.DataFrame({
+        "Season": np.repeat([2018, 2019, 2021], n_games // 3),
+        "T1": T1,
+        "T2": T1 + rng.integers(1, 50, size=n_games),
+        "Won": rng.integers(0, 2, size=n_games).astype(np.int8),
+        "Round": rng.integers(0, 7, size=n_games),
+    })
+
+
+def _submissions(tmp_path, outcomes, seed=0):
+    rng = np.random.default_rng(seed)
+    ids = [f"{s}_{a}_{b}" for s, a, b in outcomes[["Season", "T1", "T2"]].itertuples(index=False)]
+    skill = {"sharp": 2.0, "flat": 0.0, "noisy": 0.5}
+    paths = []
+    for name, k in skill.items():
+        signal = k * (2 * outcomes["Won"].to_numpy() - 1) + rng.normal(size=len(ids))
+        pd.DataFrame({"ID": ids, "Pred": 1 / (1 + np.exp(-signal))}).to_csv(tmp_path / f"{name}.csv", index=False)
+        paths.append(tmp_path / f"{name}.csv")
+    return paths
+
+
+def test_point_estimates_match_sklearn(tmp_path):
+    outcomes = _outcomes()
+    matrix = prediction_matrix(_submissions(tmp_path, outcomes))
+    summary = evaluate(matrix, outcomes, n_resamples=500)["summary"].set_index("submission")
+
+    won = outcomes["Won"].to_numpy()
+    keys = pd.MultiIndex.from_frame(outcomes[["Season", "T1", "T2"]])
+    for name in matrix.columns:
+        pred = matrix[name].reindex(keys).to_numpy()
+        assert summary.loc[name, "log_loss"] == pytest.approx(log_loss(won, pred), rel=1e-12)
+        assert summary.loc[name, "brier"] == pytest.approx(brier_score_loss(won, pred), rel=1e-12)
+    assert (summary["ci_lower"] <= summary["log_loss"]).all()
+    assert (summary["log_loss"] <= summary["ci_upper"]).all()
+    assert (summary["diff_ci_lower"] <= summary["diff_to_best"]).all()
+    assert (summary["diff_to_best"] <= summary["diff_ci_upper"]).all()
+    assert summary.index[0] == "sharp"
+
+
+def test_bootstrap_is_reproducible(tmp_path):
+    outcomes = _outcomes()
+    matrix = prediction_matrix(_submissions(tmp_path, outcomes))
+    first = evaluate(matrix, outcomes, n_resamples=500, seed=3)["summary"]
+    pd.testing.assert_frame_equal(evaluate(matrix, outcomes, n_resamples=500, seed=3)["summary"], first)
+    assert not evaluate(matrix, outcomes, n_resamples=500, seed=4)["summary"].equals(first)
+
+
+def test_bootstrap_counts_equal_explicit_resamples():
+    rng = np.random.default_rng(0)
+    losses = log_loss_matrix(rng.uniform(size=(50, 2)), rng.integers(0, 2, size=50))
+    resampled = bootstrap_log_loss(losses, n_resamples=7, seed=5, chunk=3)
+
+    rng = np.random.default_rng(5)
+    explicit = np.concatenate([losses[rng.integers(0, 50, size=(size, 50))].mean(axis=1)
+                               for size in (3, 3, 1)])
+    np.testing.assert_allclose(resampled, explicit, rtol=1e-12)
@@ -0,0 +1,47 @@
+"""In-season updates of the feature store against a full rebuild."""
+import pandas as pd
+
+from benchmarks.synthetic import write_project
+from src.features import incremental
+from src.features.build_features import build_feature_store, current_feature_store, feature_steps
+from src.features.cache import ArtifactCache
+
+
+def test_updates_equal_full_rebuild(tmp_path, monkeypatch):
+    write_project(tmp_path, n_seasons=3, n_teams=40, games_per_team=16)
+    monkeypatch.chdir(tmp_path)
+    data_dir = tmp_path / "data"
+    results_path = data_dir / "external" / "MRegularSeasonDetailedResults.csv"
+    results = pd.read_csv(results_path)
+    season = results['Season'].max()
+    later = (results['Season'] == season) & (results['DayNum'] >= 110)
+    results.loc[~later].to_csv(results_path, index=False)
+    days = [(110, 125), (125, 133)]
+    for k, (first, last) in enumerate(days):
+        rows = results.loc[later & results['DayNum'].between(first, last - 1)]
+        rows.to_csv(tmp_path / f"day_{k}.csv", index=False)
+
+    seeded = incremental.main(["seed", str(season)])
+    for k in range(len(days)):
+        store = incremental.main(["update", str(tmp_path / f"day_{k}.csv"), "--check"])
+    assert not store.equals(seeded)
+
+    # the models read the updated store:
+    cache = ArtifactCache(data_dir / "interim" / "cache")
+    steps = feature_steps(data_dir, data_dir / "raw" / "kenpom.csv", cache)
+    loaded = current_feature_store(data_dir, steps, season)
+    assert loaded.equals(store)
+    state = incremental.SeasonState.load(data_dir / "interim" / "season_results.npz")
+    assert len(state.results) == (results['Season'] == season).sum()
+    assert incremental.check(loaded, state, data_dir, cache)
+
+    # the seeded store misses the new days:
+    assert not incremental.check(seeded, state, data_dir, cache)
+
+    # ... but not for another season, or once the results file has changed:
+    full_build = build_feature_store(steps)
+    assert current_feature_store(data_dir, steps, season - 1).equals(full_build)
+    results.loc[~later | (results['DayNum'] < 125)].to_csv(results_path, index=False)
+    steps = feature_steps(data_dir, data_dir / "raw" / "kenpom.csv", cache)
+    rebuilt = current_feature_store(data_dir, steps, season)
+    assert rebuilt.equals(build_feature_store(steps)) and not rebuilt.equals(store)
@@ -0,0 +1,87 @@
+"""Offline tests of the kenpom scraper against a saved season page."""
+import hashlib
+import json
+from pathlib import Path
+import shutil
+
+import pytest
+
+from src.data import make_dataset
+
+FIXTURE = Path(__file__).parent / "fixtures" / "kenpom_2021.html"
+
+COLUMNS = ['Rk', 'Team', 'Conf', 'W-L', 'AdjEM', 'AdjO', 'AdjD', 'AdjT', 'Luck',
+           'Strength of Schedule_AdjEM', 'Strength of Schedule_OppO',
+           'Strength of Schedule_OppD', 'NCSOS_AdjEM']
+
+
+class FakeResponse:
+    def __init__(self, status_code, content=b"", etag=None):
+        self.status_code = status_code
+        self.content = content
+        self.headers = {"ETag": etag} if etag else {}
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(self.status_code)
+
+
+class FakeSession:
+    """Serves the fixture with an ETag and answers 304 to a matching If-None-Match."""
+
+    def __init__(self, content, etag='"abc"'):
+        self.content = content
+        self.etag = etag
+        self.requests = []
+
+    def get(self, url, headers=None):
+        self.requests.append((url, dict(headers or {})))
+        if (headers or {}).get("If-None-Match") == self.etag:
+            return FakeResponse(304)
+        return FakeResponse(200, self.content, self.etag)
+
+
+def test_parse_kp_table_fixture():
+    kp = make_dataset.parse_kp_table(FIXTURE.read_bytes())
+    assert list(kp.columns) == COLUMNS
+    # the repeated header rows of the second tbody are skipped:
+    assert kp["Rk"].tolist() == ["1", "2", "3", "4"]
+    assert kp["Team"].tolist() == ["Gonzaga 1", "Baylor 1", "Michigan St.", "Texas Southern 16"]
+    # rank cells (td-right) are not taken as values:
+    assert kp.loc[0, "AdjD"] == "89.4"
+    assert kp.loc[0, "Strength of Schedule_OppD"] == "103.9"
+    assert kp.loc[3, "NCSOS_AdjEM"] == "-1.7"
+
+
+def test_offline_reads_cache_only(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        make_dataset.fetch_kp_season(2021, cache_dir=tmp_path, offline=True)
+
+    shutil.copy(FIXTURE, tmp_path / "2021.html")
+    (tmp_path / "2021.json").write_text(json.dumps({"etag": None, "sha256": None}))
+    kp = make_dataset.scrape_kp_season(2021, cache_dir=tmp_path, offline=True)
+    assert len(kp) == 4
+    assert (kp["Season"] == 2021).all()
+
+
+def test_cache_round_trip(tmp_path, monkeypatch):
+    content = FIXTURE.read_bytes()
+    session = FakeSession(content)
+    monkeypatch.setattr(make_dataset, "_session", lambda: session)
+    # a season that is still being played is revalidated:
+    monkeypatch.setattr(make_dataset, "_season_finished", lambda season: False)
+
+    assert make_dataset.fetch_kp_season(2021, cache_dir=tmp_path) == content
+    assert (tmp_path / "2021.html").read_bytes() == content
+    meta = json.loads((tmp_path / "2021.json").read_text())
+    assert meta == {"etag": '"abc"', "sha256": hashlib.sha256(content).hexdigest()}
+    assert "If-None-Match" not in session.requests[0][1]
+
+    # second fetch sends the ETag, gets a 304 and is served from the cache:
+    assert make_dataset.fetch_kp_season(2021, cache_dir=tmp_path) == content
+    assert session.requests[1][1] == {"If-None-Match": '"abc"'}
+
+    # a finished season does not touch the network:
+    monkeypatch.setattr(make_dataset, "_season_finished", lambda season: True)
+    assert make_dataset.fetch_kp_season(2021, cache_dir=tmp_path) == content
+    assert len(session.requests) == 2
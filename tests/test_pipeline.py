@@ -0,0 +1,76 @@
+"""Stage tracing across the pipeline's worker processes."""
+import pandas as pd
+import pytest
+
+from src import instrument
+from src.features.cache import ArtifactCache, file_digest
+from src.pipeline import PipelineState, Stage, _dependencies, pipeline_stages, run
+
+
+def double(df):
+    return df.assign(x=df["x"] * 2)
+
+
+def total(a, b):
+    return pd.DataFrame({"x": [a["x"].sum() + b["x"].sum()]})
+
+
+def _stages(root):
+    pd.DataFrame({"x": [1, 2, 3]}).to_csv(root / "input.csv", index=False)
+    return [
+        Stage("left", double, [root / "input.csv"], [root / "left.feather"]),
+        Stage("right", double, [root / "input.csv"], [root / "right.feather"]),
+        Stage("total", total, [root / "left.feather", root / "right.feather"], [root / "total.feather"]),
+    ]
+
+
+@pytest.mark.parametrize("n_jobs", [1, 2])
+def test_trace_holds_every_stage(tmp_path, n_jobs):
+    with instrument.tracing() as trace:
+        status = run(_stages(tmp_path), tmp_path / "state.json", n_jobs=n_jobs)
+    assert status == {"left": "ran", "right": "ran", "total": "ran"}
+
+    records = {r["stage"]: r for r in trace.records}
+    assert sorted(records) == ["left", "pipeline", "right", "total"]
+    root = records["pipeline"]
+    assert root["parent"] is None and root["ran"] == 3
+    for name in ["left", "right", "total"]:
+        assert records[name]["parent"] == root["id"]
+        assert records[name]["depth"] == 1
+        assert records[name]["rows_in"] == (3 if name != "total" else 6)
+        assert root["start"] <= records[name]["start"] <= root["start"] + root["wall"]
+    assert len({r["id"] for r in trace.records}) == 4
+    assert pd.read_feather(tmp_path / "total.feather")["x"].tolist() == [24]
+
+
+def test_unchanged_stages_are_skipped(tmp_path):
+    stages = _stages(tmp_path)
+    run(stages, tmp_path / "state.json", n_jobs=1)
+    assert set(run(stages, tmp_path / "state.json", n_jobs=1).values()) == {"skipped"}
+
+    # the state and the artifact cache share one digest memo format:
+    state = PipelineState(tmp_path / "state.json")
+    cache = ArtifactCache(tmp_path / "cache")
+    path = tmp_path / "input.csv"
+    assert state.file_digest(path) == cache.file_digest(path) == file_digest(path, {})
+    assert state.digests[str(path.resolve())] == cache._digests[str(path.resolve())]
+
+    pd.DataFrame({"x": [1, 2, 4]}).to_csv(path, index=False)
+    assert run(stages, tmp_path / "state.json", n_jobs=1) == {"left": "ran", "right": "ran", "total": "ran"}
+
+
+def test_ratings_feed_tourney_data(tmp_path):
+    stages = {stage.name: stage for stage in pipeline_stages(tmp_path)}
+    ratings_outputs = stages["efficiency_ratings"].outputs
+    assert [p.name for p in ratings_outputs] == ["ratings_T1.feather", "ratings_T2.feather"]
+    # in build_feature_store block order, after the seeds:
+    assert stages["tourney_data"].inputs[-2:] == ratings_outputs
+    assert _dependencies(list(stages.values()))["tourney_data"] >= {"efficiency_ratings", "seed_diff"}
+
+
+def test_elo_is_optional(tmp_path):
+    assert "elo" not in {stage.name for stage in pipeline_stages(tmp_path)}
+    stages = {stage.name: stage for stage in pipeline_stages(tmp_path, optional=["elo"])}
+    assert _dependencies(list(stages.values()))["elo"] == {"prepare_regular"}
+    with pytest.raises(ValueError, match="Unknown optional stages"):
+        pipeline_stages(tmp_path, optional=["glicko"])
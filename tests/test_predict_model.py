@@ -0,0 +1,60 @@
+"""Submission writing with missing team features."""
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.linear_model import LogisticRegression
+
+from src.features.feature_store import TeamFeatureStore
+from src.models.artifact import ModelArtifact
+from src.models.predict_model import check_features, export_artifact, write_submission
+from src.models.train_model import fit_pipeline
+
+FEATURES = ["T1_AdjEM", "T2_AdjEM", "SeedDiff"]
+
+
+def _store(adj_em):
+    teams = [1101, 1102, 1103]
+    kp = pd.DataFrame({"Season": 2021, "T1_TeamID": teams, "T1_AdjEM": adj_em})
+    seeds = pd.DataFrame({"Season": 2021, "T1_TeamID": teams, "T1_seed": [1, 8, 16]})
+    pairs = [(frame, frame.rename(columns=lambda c: c.replace("T1_", "T2_"))) for frame in (kp, seeds)]
+    return TeamFeatureStore.from_frames(pairs), teams
+
+
+def _model():
+    X = pd.DataFrame([[20.0, -5.0, -7], [-5.0, 20.0, 7]], columns=FEATURES)
+    return LogisticRegression().fit(X, [1, 0])
+
+
+def test_write_submission(tmp_path):
+    store, teams = _store([25.0, 10.0, -8.0])
+    path = write_submission(_model(), FEATURES, store, 2021, teams, tmp_path / "sub.csv", chunk_size=2)
+    submission = pd.read_csv(path)
+    assert submission["ID"].tolist() == ["2021_1101_1102", "2021_1101_1103", "2021_1102_1103"]
+    assert submission["Pred"].between(0, 1).all()
+
+
+def test_missing_features_fail_before_writing(tmp_path):
+    store, teams = _store([25.0, np.nan, -8.0])
+    path = tmp_path / "sub.csv"
+    with pytest.raises(ValueError, match=r"1102: T1_AdjEM, T2_AdjEM"):
+        write_submission(_model(), FEATURES, store, 2021, teams, path)
+    assert not path.exists()
+
+    # a team without a row in the store is missing too:
+    store, _ = _store([25.0, 10.0, -8.0])
+    with pytest.raises(ValueError, match=r"1104: T1_AdjEM, T2_AdjEM, SeedDiff"):
+        write_submission(_model(), FEATURES, store, 2021, teams + [1104], path)
+    assert not path.exists()
+
+
+def test_artifact_agrees_on_missing_features(tmp_path):
+    store, teams = _store([25.0, np.nan, -8.0])
+    X = pd.DataFrame([[20.0, -5.0, -7], [-5.0, 20.0, 7]], columns=FEATURES)
+    model = fit_pipeline(LogisticRegression(), X, [1, 0])
+    path = export_artifact(model, FEATURES, store, tmp_path / "model.npz")
+
+    preds = ModelArtifact.load(path).predict_pairs([2021] * 3, [1101, 1101, 1102], [1103, 1102, 1103])
+    assert not np.isnan(preds[0])
+    assert np.isnan(preds[1:]).all()
+    with pytest.raises(ValueError, match="1102"):
+        check_features(store, FEATURES, 2021, teams)
@@ -0,0 +1,28 @@
+"""The season-sharded build against build_features.main."""
+import pandas as pd
+
+from benchmarks.synthetic import write_project
+from src.data.storage import read_processed
+from src.features import build_features, sharded
+from src.features.cache import ArtifactCache
+
+KEYS = ["Season", "DayNum", "T1_TeamID", "T2_TeamID"]
+
+
+def test_season_partitions_equal_the_full_build(tmp_path, monkeypatch):
+    write_project(tmp_path, n_seasons=4, n_teams=40, games_per_team=16)
+    monkeypatch.chdir(tmp_path)
+    data_dir = tmp_path / "data"
+    build_features.main(ArtifactCache(data_dir / "interim" / "cache"))
+    full = read_processed(data_dir / "processed" / "tourney_data")
+
+    # small chunks, so the split writes several parts per season:
+    sharded.build(data_dir, n_jobs=2, chunksize=500)
+    assert len(list((data_dir / "interim" / "partitions" / "regular").glob("Season=*/part-*"))) > 4
+    parts = sharded.read_partitions(data_dir / "processed" / "tourney_data")
+
+    assert len(parts) == len(full) > 0
+    assert sorted(parts.columns) == sorted(full.columns)
+    full = full.sort_values(KEYS, ignore_index=True)
+    parts = parts[full.columns].sort_values(KEYS, ignore_index=True)
+    pd.testing.assert_frame_equal(parts, full, check_dtype=False, rtol=1e-6)
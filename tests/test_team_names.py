@@ -0,0 +1,58 @@
+"""Resolution of kenpom team names to Kaggle TeamIDs."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.data.team_names import TeamNameIndex, normalize
+
+TEAMS = pd.DataFrame({
+    "TeamID": [1181, 1277, 1163, 1410, 1165, 1388, 1419],
+    "TeamName": ["Duke", "Michigan St", "Connecticut", "TX Pan American", "Cal St Bakersfield",
+                 "St Mary's CA", "ULM"],
+})
+SPELLINGS = pd.DataFrame({
+    "TeamNameSpelling": ["michigan state", "texas rio grande valley", "cal state bakersfield",
+                         "saint mary's", "louisiana monroe", "a&m corpus chris"],
+    "TeamID": [1277, 1410, 1165, 1388, 1419, 1394],
+})
+
+
+@pytest.mark.parametrize("raw, normalized", [
+    ("Duke 1", "duke"),
+    ("Michigan St.", "michigan state"),
+    ("UT Rio Grande Valley", "texas rio grande valley"),
+    ("Cal St. Bakersfield", "cal state bakersfield"),
+    ("Texas A&M Corpus Chris", "a&m corpus chris"),
+    ("Saint Mary's*", "saint mary's"),
+    ("Louisiana-Monroe", "louisiana monroe"),
+])
+def test_normalize_kenpom_spellings(raw, normalized):
+    assert normalize(raw) == normalized
+
+
+def test_resolve_exact_fuzzy_and_missing():
+    index = TeamNameIndex.from_tables(TEAMS, SPELLINGS)
+    raw = ["Duke 1", "Michigan St.", "UT Rio Grande Valley", "Texas A&M Corpus Chris",
+           # the seed digit keeps the "st." rule from applying, so only the
+           # fuzzy match finds "michigan st":
+           "Michigan St. 2", "Connecticutt", "Nowhere Tech", "Duke 1"]
+    ids = index.resolve(raw)
+    np.testing.assert_array_equal(ids, [1181, 1277, 1410, 1394, 1277, 1163, np.nan, 1181])
+
+    assert index.resolved["Duke 1"] == [1181, "exact"]
+    assert index.resolved["Michigan St. 2"] == [1277, "fuzzy"]
+    assert index.unresolved() == ["Nowhere Tech"]
+    report = index.report()
+    assert report["Name"].tolist() == ["Michigan St. 2", "Connecticutt", "Nowhere Tech"]
+    assert report["Match"].tolist() == ["fuzzy", "fuzzy", "missing"]
+
+
+def test_saved_index_is_rebuilt_when_the_tables_change(tmp_path):
+    path = tmp_path / "team_names.json"
+    index = TeamNameIndex.load_or_build(TEAMS, SPELLINGS, path)
+    index.resolve(["Duke 1"])
+    index.save(path)
+    assert TeamNameIndex.load_or_build(TEAMS, SPELLINGS, path).resolved == {"Duke 1": [1181, "exact"]}
+
+    renamed = TEAMS.assign(TeamName=TEAMS["TeamName"].replace("Duke", "Duke Blue Devils"))
+    assert TeamNameIndex.load_or_build(renamed, SPELLINGS, path).resolved == {}
@@ -0,0 +1,102 @@
+"""Recursive feature elimination and the resumable configuration search."""
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.feature_selection import RFE
+from sklearn.linear_model import LinearRegression
+
+from src.models import train_model
+from src.models.train_model import (
+    SEARCH_SPACES, _score_fold, fold_budgets, log_loss, rfe_cv, sample_configs, successive_halving,
+    training_arrays)
+
+FEATURES = ["a", "b", "c", "d"]
+
+
+def _tourney_data(seed=0):
+    rng = np.random.default_rng(seed)
+    n = 400
+    data = pd.DataFrame(rng.normal(size=(n, len(FEATURES))), columns=FEATURES)
+    data["Season"] = np.repeat([2015, 2016, 2017, 2018], n // 4)
+    data["T1_PointDiff"] = 8 * data["a"] + 3 * data["b"] + rng.normal(scale=5, size=n)
+    return data
+
+
+@pytest.mark.parametrize("n_features", [1, 2, 4])
+def test_rfe_cv_subset_size(n_features):
+    selected, path, cv_loss = rfe_cv(_tourney_data(), FEATURES, n_features, n_jobs=1)
+    assert len(selected) == n_features
+    assert cv_loss.index.tolist() == [4, 3, 2, 1]
+    assert len(path) == 3
+
+
+def test_rfe_cv_default_is_lowest_loss():
+    selected, _, cv_loss = rfe_cv(_tourney_data(), FEATURES, n_jobs=1)
+    assert len(selected) == cv_loss.mean(axis=1).idxmin()
+    assert "a" in selected
+
+
+@pytest.mark.parametrize("n_features", [0, 5, -1])
+def test_rfe_cv_rejects_sizes_out_of_range(n_features):
+    with pytest.raises(ValueError, match="between 1 and 4"):
+        rfe_cv(_tourney_data(), FEATURES, n_features, n_jobs=1)
+
+
+def test_rfe_cv_folds_eliminate_without_the_held_out_season():
+    data = _tourney_data()
+    # c gives away the winner of 2018 only, so with 2018 in it the path keeps c longer:
+    held_out = data["Season"] == 2018
+    data.loc[held_out, "c"] = np.sign(data.loc[held_out, "T1_PointDiff"])
+    _, _, cv_loss = rfe_cv(data, FEATURES, n_jobs=1)
+    X, y, groups = training_arrays(data, FEATURES)
+    held_out = groups == 2018
+    for n_features in cv_loss.index:
+        rfe = RFE(LinearRegression(positive=True), n_features_to_select=n_features, step=1)
+        rfe.fit(X[~held_out], y[~held_out])
+        pred = np.clip(rfe.predict(X[held_out]), 0, 1)
+        assert cv_loss.loc[n_features, 2018] == pytest.approx(log_loss(y[held_out], pred), rel=1e-6)
+
+
+class _Interrupt(Exception):
+    pass
+
+
+def test_successive_halving_resumes_after_an_interrupted_rung(tmp_path, monkeypatch):
+    rng = np.random.default_rng(1)
+    n = 900
+    X = rng.normal(size=(n, 3))
+    y = (X[:, 0] + rng.normal(size=n) > 0).astype(np.int64)
+    groups = np.repeat(np.arange(2010, 2019), n // 9)
+    spaces = {name: SEARCH_SPACES[name] for name in ["LogisticRegression", "ElasticNet"]}
+    configs = sample_configs(9, spaces, seed=2)
+    assert fold_budgets(9) == [1, 3, 9]
+
+    fits = []
+
+    def counting(estimator, mode, season):
+        fits.append(season)
+        return _score_fold(estimator, mode, season)
+
+    monkeypatch.setattr(train_model, "_score_fold", counting)
+    full = successive_halving(X, y, groups, configs, n_jobs=1)
+    n_fits = len(fits)
+
+    def interrupting(estimator, mode, season):
+        # rung 0 fits every configuration on the latest season only:
+        if len(fits) == len(configs):
+            raise _Interrupt
+        return counting(estimator, mode, season)
+
+    log_path = tmp_path / "trials.jsonl"
+    fits.clear()
+    monkeypatch.setattr(train_model, "_score_fold", interrupting)
+    with pytest.raises(_Interrupt):
+        successive_halving(X, y, groups, configs, log_path, n_jobs=1)
+    assert len(log_path.read_text().splitlines()) == len(configs)
+
+    fits.clear()
+    monkeypatch.setattr(train_model, "_score_fold", counting)
+    resumed = successive_halving(X, y, groups, configs, log_path, n_jobs=1)
+    assert 2018 not in fits
+    assert len(fits) == n_fits - len(configs)
+    pd.testing.assert_frame_equal(resumed, full)